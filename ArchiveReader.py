@@ -0,0 +1,78 @@
+import hashlib
+import tarfile
+import zipfile
+from datetime import datetime
+
+
+class ArchiveReader:
+    """Streams XML members out of PMC bulk packages (tar, tar.gz, zip) without extracting them.
+
+    Tar archives are read strictly sequentially ("r|*"), so a .tar.gz on a share is pulled
+    once as a compressed stream and only one member is held in memory at a time. A member
+    is identified as "<archive path>!<member path>" in the manifest and in logs.
+    """
+
+    extensions = (".tar.gz", ".tgz", ".tar", ".zip")
+    member_extensions = (".xml", ".nxml")
+    separator = "!"
+
+    @staticmethod
+    def is_archive(path: str) -> bool:
+        return path.lower().endswith(ArchiveReader.extensions)
+
+    @staticmethod
+    def member_key(archive_path: str, member_name: str) -> str:
+        return f"{archive_path}{ArchiveReader.separator}{member_name}"
+
+    @staticmethod
+    def split_key(key: str) -> tuple:
+        """(archive path, member name) of a member key, or (key, None) for a plain file."""
+        lowered = key.lower()
+        for extension in ArchiveReader.extensions:
+            position = lowered.find(extension + ArchiveReader.separator)
+            if position >= 0:
+                end = position + len(extension)
+                return key[:end], key[end + len(ArchiveReader.separator):]
+        return key, None
+
+    @staticmethod
+    def iter_members(archive_path: str, limit: int = 0):
+        """Yields (member name, size, mtime, bytes, SHA-1) for every XML member, in archive
+        order. With a limit at most limit + 1 bytes of a member are kept, as for plain files;
+        size and SHA-1 always cover the full member."""
+        if archive_path.lower().endswith(".zip"):
+            yield from ArchiveReader._iter_zip(archive_path, limit)
+        else:
+            yield from ArchiveReader._iter_tar(archive_path, limit)
+
+    @staticmethod
+    def _read(member, limit):
+        data = member.read(limit + 1) if limit else member.read()
+        digest = hashlib.sha1(data)
+        if limit and len(data) > limit:
+            for chunk in iter(lambda: member.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return data, digest.hexdigest()
+
+    @staticmethod
+    def _iter_tar(archive_path, limit=0):
+        with tarfile.open(archive_path, mode="r|*") as tar:
+            for info in tar:
+                if not info.isfile() or not info.name.lower().endswith(ArchiveReader.member_extensions):
+                    continue
+                member = tar.extractfile(info)
+                if member is None:
+                    continue
+                data, content_hash = ArchiveReader._read(member, limit)
+                yield info.name, info.size, float(info.mtime), data, content_hash
+
+    @staticmethod
+    def _iter_zip(archive_path, limit=0):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(ArchiveReader.member_extensions):
+                    continue
+                mtime = datetime(*info.date_time).timestamp()
+                with archive.open(info) as member:
+                    data, content_hash = ArchiveReader._read(member, limit)
+                yield info.filename, info.file_size, mtime, data, content_hash
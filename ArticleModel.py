@@ -1,8 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 from typing import Optional
 
-@dataclass
+@dataclass(slots=True)
 class ArticleModel:
     ArticlesID: int = 0
     ArtTitle: str = ""
@@ -39,6 +39,19 @@ class ArticleModel:
     CustomMeta: str = ""
     ArtReferences: str = ""
     NonTarget: bool = False
+    Duplicate: bool = False
+    # structured ReferenceModel records behind ArtReferences (not a stored procedure parameter)
+    References: list = field(default_factory=list)
+    # embedding chunks, filled only when ProcessDataSrv.chunker is configured
+    Chunks: list = field(default_factory=list)
+    # packed Stage 2 filter inputs, filled only when ProcessDataSrv.keep_filter_zone is set
+    FilterZone: bytes = b""
+    # why the article was built from part of the file ("too_large", "parser_limit"), "" when complete
+    Truncated: str = ""
+    # per-column content hashes, filled only when ProcessDataSrv.field_hashes is set
+    FieldHashes: dict = field(default_factory=dict)
+    # MinHash signature of abstract and body, filled only when ProcessDataSrv.minhash is set
+    MinHash: bytes = b""
 
     def to_dict(self):
-        return self.__dict__
\ No newline at end of file
+        return {f.name: getattr(self, f.name) for f in fields(self)}
\ No newline at end of file
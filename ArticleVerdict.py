@@ -0,0 +1,35 @@
+from dataclasses import dataclass, fields
+
+
+@dataclass(slots=True)
+class ArticleVerdict:
+    """What ProcessDataSrv returns for a rejected file instead of a full ArticleModel.
+
+    Reason is one of the codes below; Signals lists the filter evidence behind it
+    ("breast:2", "human:patient", "animal:mice", ...) or, for a duplicate, the identifiers
+    that matched. NonTarget and Duplicate mirror the ArticleModel flags, so callers can
+    test either type the same way. Skipped marks a file that was not processed at all
+    (over the size budget).
+    """
+
+    NOT_BREAST = "not_breast"
+    NO_HUMAN = "no_human"
+    ANIMAL = "animal"
+    DUPLICATE = "duplicate"
+    TOO_LARGE = "too_large"
+    # ArticleModel.Truncated only: libxml2 stopped at its huge_tree limits
+    PARSER_LIMIT = "parser_limit"
+
+    ArtFileName: str = ""
+    Reason: str = ""
+    Signals: tuple = ()
+    NonTarget: bool = True
+    Duplicate: bool = False
+    Skipped: bool = False
+    # packed Stage 2 filter inputs, filled only when ProcessDataSrv.keep_filter_zone is set
+    FilterZone: bytes = b""
+    # as ArticleModel.Truncated, for a duplicate found in a file cut at the size budget
+    Truncated: str = ""
+
+    def to_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
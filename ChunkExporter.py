@@ -0,0 +1,173 @@
+import re
+from OutputSinks import ShardWriter
+
+
+class Chunker:
+    """Paragraph-aware, token-budgeted chunking for the embedding stage.
+
+    Paragraphs are packed into chunks of at most max_tokens. A paragraph that is too long on
+    its own is split at sentence boundaries (and a sentence that is still too long at word
+    boundaries) into parts of max_tokens - overlap_tokens, which leaves room for the overlap.
+    Consecutive chunks of the same top-level section share up to overlap_tokens of trailing
+    text, down to single sentences or words of a longer paragraph; a chunk never spans two
+    top-level sections. Tokens are approximated
+    as words plus punctuation marks, so leave some headroom below the embedding model limit.
+    """
+
+    _token = re.compile(r"\w+|[^\w\s]")
+    _sentence_break = re.compile(r'(?<=[.!?])\s+')
+
+    def __init__(self, max_tokens=512, overlap_tokens=64):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be between 0 and max_tokens - 1")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return len(Chunker._token.findall(text))
+
+    def _pieces(self, text):
+        tokens = Chunker.count_tokens(text)
+        if tokens <= self.max_tokens:
+            return [(text, tokens)]
+        limit = self.max_tokens - self.overlap_tokens
+        pieces = []
+        current, current_tokens = [], 0
+        for sentence in Chunker._sentence_break.split(text):
+            for part, n in Chunker._split_sentence(sentence, limit):
+                if current and current_tokens + n > limit:
+                    pieces.append((" ".join(current), current_tokens))
+                    current, current_tokens = [], 0
+                current.append(part)
+                current_tokens += n
+        if current:
+            pieces.append((" ".join(current), current_tokens))
+        return pieces
+
+    @staticmethod
+    def _split_sentence(sentence, limit):
+        tokens = Chunker.count_tokens(sentence)
+        if tokens <= limit:
+            return [(sentence, tokens)]
+        parts = []
+        current, current_tokens = [], 0
+        for word in sentence.split():
+            n = Chunker.count_tokens(word)
+            if current and current_tokens + n > limit:
+                parts.append((" ".join(current), current_tokens))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += n
+        if current:
+            parts.append((" ".join(current), current_tokens))
+        return parts
+
+    @staticmethod
+    def _tail(text, budget):
+        # the longest run of trailing sentences within budget tokens, or of trailing words
+        # when even the last sentence is longer
+        for units in (Chunker._sentence_break.split(text), text.split()):
+            tail, tokens = [], 0
+            for unit in reversed(units):
+                n = Chunker.count_tokens(unit)
+                if tokens + n > budget:
+                    break
+                tail.insert(0, unit)
+                tokens += n
+            if tail:
+                return " ".join(tail), tokens
+        return "", 0
+
+    def chunk(self, paragraphs) -> list:
+        """paragraphs: (section path tuple, text) pairs in reading order."""
+        chunks = []
+        current = []  # (paragraph no, section path, text, tokens)
+        group = None
+
+        def emit():
+            texts = []
+            for i, (number, _, text, _) in enumerate(current):
+                if i:
+                    texts.append(" " if number == current[i - 1][0] else "\n\n")
+                texts.append(text)
+            sections = list(dict.fromkeys(" > ".join(item[1]) for item in current))
+            chunks.append({
+                "chunk": len(chunks),
+                "section": sections[0],
+                "sections": sections,
+                "tokens": current_tokens,
+                "text": "".join(texts),
+            })
+
+        current_tokens = 0
+        for number, (path, text) in enumerate(paragraphs):
+            if current and path[:1] != group:
+                emit()
+                current, current_tokens = [], 0
+            group = path[:1]
+            for piece, n in self._pieces(text):
+                if current and current_tokens + n > self.max_tokens:
+                    emit()
+                    # start the next chunk with the tail of this one, as much as fits next to the piece
+                    budget = min(self.overlap_tokens, self.max_tokens - n)
+                    carry, carry_tokens = [], 0
+                    for item in reversed(current):
+                        if carry_tokens + item[3] > budget:
+                            # a piece longer than what is left carries its last sentences or words
+                            tail, tail_tokens = Chunker._tail(item[2], budget - carry_tokens)
+                            if tail:
+                                carry.insert(0, (item[0], item[1], tail, tail_tokens))
+                                carry_tokens += tail_tokens
+                            break
+                        carry.insert(0, item)
+                        carry_tokens += item[3]
+                    current, current_tokens = carry, carry_tokens
+                current.append((number, path, piece, n))
+                current_tokens += n
+        if current:
+            emit()
+        return chunks
+
+
+class ChunkExporter:
+    """Writes the Chunks of inserted articles to rotating JSONL or Parquet shards."""
+
+    columns = [
+        ("articles_id", "int64"), ("pmid", "int64"), ("pmcid", "string"), ("doi", "string"), ("file", "string"),
+        ("title", "string"), ("chunk", "int32"), ("section", "string"), ("sections", "list<string>"),
+        ("tokens", "int32"), ("text", "string"),
+    ]
+
+    def __init__(self, folder, file_format="jsonl", shard_rows=50000, prefix="chunks"):
+        self.writer = ShardWriter(folder, prefix, ChunkExporter.columns, file_format, shard_rows)
+
+    @property
+    def total_rows(self):
+        return self.writer.total_rows
+
+    @property
+    def shards(self):
+        return self.writer.shards
+
+    def write(self, article, article_id=None):
+        for chunk in article.Chunks:
+            row = {
+                "articles_id": article_id,
+                "pmid": article.Pmid,
+                "pmcid": f"PMC{article.BankId}" if article.BankId else None,
+                "doi": article.ArtDoi or None,
+                "file": article.ArtFileName,
+                "title": article.ArtTitle,
+            }
+            row.update(chunk)
+            self.writer.write(row)
+
+    def flush(self):
+        # called after every database batch, so finished articles are visible on disk
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
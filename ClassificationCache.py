@@ -0,0 +1,125 @@
+import sqlite3
+import zlib
+from datetime import datetime
+
+
+class ClassificationCache:
+    """Local SQLite cache of the Stage 2 filter inputs and verdict of every processed file.
+
+    Each row keeps the lower-cased title, check zone and MeSH text (zlib-compressed), the
+    verdict, the hash of the keyword rules that produced it and, for stored articles, the
+    ArticlesID. When the keyword lists change, reclassify() recomputes every verdict from
+    the cached zones without reading any XML and returns the files that flipped.
+    """
+
+    _separator = "\x1f"
+
+    def __init__(self, db_path, commit_every=500):
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self.conn = None
+        self._uncommitted = 0
+
+    def open(self):
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS Classifications (
+                FilePath TEXT PRIMARY KEY,
+                ContentHash TEXT,
+                FilterZone BLOB NOT NULL,
+                NonTarget INTEGER NOT NULL,
+                Reason TEXT NOT NULL,
+                RulesHash TEXT NOT NULL,
+                ArticlesID INTEGER,
+                ClassifiedOn TEXT NOT NULL
+            )""")
+        self.conn.commit()
+
+    @staticmethod
+    def pack(title_text: str, check_zone: str, mesh_text: str) -> bytes:
+        # runs in the worker, so the main process only copies the compressed bytes
+        text = ClassificationCache._separator.join((title_text, check_zone, mesh_text))
+        return zlib.compress(text.encode("utf-8"), 6)
+
+    @staticmethod
+    def unpack(zone: bytes) -> tuple:
+        return tuple(zlib.decompress(zone).decode("utf-8").split(ClassificationCache._separator))
+
+    def record(self, path, content_hash, zone, non_target, reason, rules_hash):
+        self.conn.execute("""
+            INSERT INTO Classifications (FilePath, ContentHash, FilterZone, NonTarget, Reason, RulesHash, ClassifiedOn)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(FilePath) DO UPDATE SET
+                ContentHash = excluded.ContentHash, FilterZone = excluded.FilterZone,
+                NonTarget = excluded.NonTarget, Reason = excluded.Reason, RulesHash = excluded.RulesHash,
+                ClassifiedOn = excluded.ClassifiedOn""",
+            (path, content_hash, zone, int(non_target), reason, rules_hash, ClassificationCache._now()))
+        self._count_write()
+
+    def set_article_id(self, path, article_id):
+        self.conn.execute("UPDATE Classifications SET ArticlesID = ? WHERE FilePath = ?", (article_id, path))
+        self._count_write()
+
+    def reclassify(self, classify, rules_hash, apply=True) -> list:
+        """Re-runs classify(title_text, check_zone, mesh_text) -> (non_target, reason) on every
+        cached zone and returns (path, now_non_target, old_reason, new_reason, ArticlesID) for
+        the files whose verdict flipped.
+
+        With apply, rows are updated to the new verdict, except files that became targets:
+        those keep their old row until they have been processed and recorded again, so an
+        interrupted run still finds them on the next reclassify. Files that became NonTarget
+        keep their ArticlesID until clear_article_ids(), see pending_removals()."""
+        changes = []
+        updates = []
+        rows = self.conn.execute(
+            "SELECT FilePath, FilterZone, NonTarget, Reason, ArticlesID FROM Classifications")
+        for path, zone, non_target, reason, article_id in rows.fetchall():
+            now_non_target, now_reason = classify(*ClassificationCache.unpack(zone))
+            if bool(non_target) != now_non_target:
+                changes.append((path, now_non_target, reason, now_reason, article_id))
+                if not now_non_target:
+                    continue
+            if apply:
+                updates.append((int(now_non_target), now_reason, rules_hash, ClassificationCache._now(), path))
+        if updates:
+            self.conn.executemany(
+                "UPDATE Classifications SET NonTarget = ?, Reason = ?, RulesHash = ?, ClassifiedOn = ? "
+                "WHERE FilePath = ?", updates)
+            self.conn.commit()
+        return changes
+
+    def pending_removals(self) -> list:
+        # stored articles whose current verdict is NonTarget
+        return [row[0] for row in self.conn.execute(
+            "SELECT ArticlesID FROM Classifications WHERE NonTarget = 1 AND ArticlesID IS NOT NULL")]
+
+    def clear_article_ids(self, article_ids):
+        self.conn.executemany("UPDATE Classifications SET ArticlesID = NULL WHERE ArticlesID = ?",
+                              [(article_id,) for article_id in article_ids])
+        self.conn.commit()
+
+    def stale_count(self, rules_hash) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM Classifications WHERE RulesHash <> ?",
+                                 (rules_hash,)).fetchone()[0]
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat(timespec='seconds')
+
+    def _count_write(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        if self.conn and self._uncommitted:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        if self.conn:
+            self.commit()
+            self.conn.close()
+            self.conn = None
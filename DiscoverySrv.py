@@ -0,0 +1,85 @@
+import os
+import hashlib
+import logging
+from ArchiveReader import ArchiveReader
+
+
+class DiscoverySrv:
+    """Lazy, scandir-based discovery of input files, optionally limited to one shard.
+
+    Iterating yields .xml files and archive packages as directories are scanned, so the
+    pipeline starts on the first file while the rest of the share is still being listed.
+    With shard=(i, N) only paths whose stable hash falls into shard i are yielded. The hash
+    is taken over the path relative to the input root with "/" separators, so N hosts that
+    mount the same share under different names still split it into the same disjoint sets.
+    An archive is sharded as one unit.
+    """
+
+    def __init__(self, root, shard=None):
+        self.root = root
+        self.shard = shard
+        self.files = 0
+        self.archives = 0
+        self.other_shards = 0
+
+    @staticmethod
+    def parse_shard(value: str) -> tuple:
+        try:
+            index, count = (int(part) for part in value.split("/"))
+        except ValueError:
+            raise ValueError(f"shard must look like i/N, got '{value}'")
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"shard index must be between 0 and {count - 1}, got '{value}'")
+        return index, count
+
+    @staticmethod
+    def shard_of(relative_path: str, count: int) -> int:
+        key = relative_path.replace(os.sep, "/").encode("utf-8")
+        return int(hashlib.md5(key).hexdigest()[:16], 16) % count
+
+    def _in_shard(self, path):
+        if self.shard is None:
+            return True
+        index, count = self.shard
+        relative = os.path.relpath(path, self.root) if path != self.root else os.path.basename(path)
+        if DiscoverySrv.shard_of(relative, count) == index:
+            return True
+        self.other_shards += 1
+        return False
+
+    def _accept(self, path, name):
+        if name.endswith('.xml'):
+            if self._in_shard(path):
+                self.files += 1
+                return True
+        elif ArchiveReader.is_archive(name):
+            if self._in_shard(path):
+                self.archives += 1
+                return True
+        return False
+
+    def __iter__(self):
+        if os.path.isfile(self.root):
+            if self._accept(self.root, os.path.basename(self.root)):
+                yield self.root
+            return
+        # depth first, files of a folder before its subfolders, like os.walk (which does not
+        # follow symlinked folders either, so a link loop cannot recurse forever)
+        stack = [self.root]
+        while stack:
+            folder = stack.pop()
+            subfolders = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subfolders.append(entry.path)
+                            elif self._accept(entry.path, entry.name):
+                                yield entry.path
+                        except OSError as e:
+                            logging.warning(f"Skipping {entry.path}: {str(e)}")
+            except OSError as e:
+                logging.warning(f"Cannot list folder {folder}: {str(e)}")
+                continue
+            stack.extend(reversed(subfolders))
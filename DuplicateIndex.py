@@ -0,0 +1,56 @@
+import hashlib
+
+
+class DuplicateIndex:
+    """In-memory index of the DOI / PMID / PMC id (BankId) keys that are already stored.
+
+    PMIDs and PMC ids are kept as ints. DOIs are normalized (trimmed, lower case) and kept
+    as 64-bit BLAKE2 digests instead of strings, which keeps the index small enough to copy
+    into every worker process; a false positive needs a 64-bit collision.
+    """
+
+    def __init__(self):
+        self.dois = set()
+        self.pmids = set()
+        self.bank_ids = set()
+
+    def __len__(self):
+        return len(self.dois) + len(self.pmids) + len(self.bank_ids)
+
+    @staticmethod
+    def _doi_key(doi):
+        doi = (doi or "").strip().lower()
+        if not doi:
+            return None
+        return int.from_bytes(hashlib.blake2b(doi.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def add(self, doi=None, pmid=None, bank_id=None):
+        doi_key = DuplicateIndex._doi_key(doi)
+        if doi_key is not None:
+            self.dois.add(doi_key)
+        if pmid:
+            self.pmids.add(int(pmid))
+        if bank_id:
+            self.bank_ids.add(int(bank_id))
+
+    def discard(self, doi=None, pmid=None, bank_id=None):
+        self.dois.discard(DuplicateIndex._doi_key(doi))
+        if pmid:
+            self.pmids.discard(int(pmid))
+        if bank_id:
+            self.bank_ids.discard(int(bank_id))
+
+    def contains(self, doi=None, pmid=None, bank_id=None) -> bool:
+        doi_key = DuplicateIndex._doi_key(doi)
+        return (doi_key is not None and doi_key in self.dois) or \
+               (bool(pmid) and int(pmid) in self.pmids) or \
+               (bool(bank_id) and int(bank_id) in self.bank_ids)
+
+    def add_article(self, article):
+        self.add(article.ArtDoi, article.Pmid, article.BankId)
+
+    def discard_article(self, article):
+        self.discard(article.ArtDoi, article.Pmid, article.BankId)
+
+    def contains_article(self, article) -> bool:
+        return self.contains(article.ArtDoi, article.Pmid, article.BankId)
@@ -0,0 +1,42 @@
+import hashlib
+from datetime import datetime
+from OutputSinks import ARTICLE_COLUMNS
+
+# where a copy of an article came from, not what it says
+IDENTITY_COLUMNS = ("ArtFileName", "BankNo")
+
+
+class FieldHasher:
+    """Per-column content hashes of an article, for --update-revised.
+
+    Every InsertData column is hashed on its own (64-bit BLAKE2, as hex) in the worker, so
+    the writer can tell a revised article from an unchanged re-delivery by comparing a few
+    dozen short strings with the hashes stored for the existing row, and send only the
+    columns that differ. None and "" hash alike, since the stored procedure receives "" for
+    both.
+
+    The columns that only say where the copy came from (identity_columns) are not hashed, so
+    the same article delivered in two files is an unchanged duplicate, not a revision.
+    """
+
+    identity_columns = IDENTITY_COLUMNS
+    columns = tuple(name for name, _ in ARTICLE_COLUMNS if name not in IDENTITY_COLUMNS)
+
+    @staticmethod
+    def hash_value(value) -> str:
+        if value is None:
+            value = ""
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        return hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).hexdigest()
+
+    @staticmethod
+    def compute(article) -> dict:
+        return {name: FieldHasher.hash_value(getattr(article, name)) for name in FieldHasher.columns}
+
+    @staticmethod
+    def changed(hashes: dict, stored) -> list:
+        # columns whose hash differs from the stored one; every column when nothing is stored
+        if not stored:
+            return list(hashes)
+        return [name for name, value in hashes.items() if stored.get(name) != value]
@@ -0,0 +1,148 @@
+import re
+
+
+class FuzzyKeywordIndex:
+    """Typo-tolerant keyword lookup for the Stage 2 filter (SymSpell-style deletion index).
+
+    Keywords and text are compared in a squashed form, lower case letters and digits only,
+    so "MDA MB 231", "MDA-MB-231" and "MDAMB231" all read "mdamb231". Every keyword is
+    indexed under the strings obtained by deleting up to max_distance characters from its
+    first prefix_length characters. A text candidate (one token, or up to a few adjacent
+    tokens joined) generates the same deletions and looks them up, and only the keywords it
+    hits are verified with a bounded edit distance. The work per token is constant, so
+    find() is linear in the length of the text.
+
+    Keywords shorter than min_length only match exactly: at distance 1 "mouse" would also
+    match "house". Real words that are one edit away from a longer keyword ("paternal" for
+    "maternal") are listed in exact_words and never match fuzzily either.
+
+    Adjacent tokens are joined only for keywords that are long enough or contain a digit
+    (cell lines), so "c at" never reads as "cat", and a join must spell the keyword exactly
+    ("sk br 3", "t 47d"); typos are only forgiven within one token. A token only starts a
+    join when its first head_length characters fit the start of such a keyword, or, when it
+    is shorter, when it is exactly the start of one. A number never starts one, so "stage 4
+    T1" does not read as the cell line 4T1. Results per candidate are memoized (up to
+    cache_size), which makes the common words of a corpus free after the first documents.
+    """
+
+    head_length = 3
+
+    _token = re.compile(r'[a-z0-9]+')
+
+    def __init__(self, keywords, max_distance=1, min_length=7, prefix_length=7, cache_size=200000,
+                 exact_words=()):
+        # keywords: (category, keyword) pairs
+        self.max_distance = max_distance
+        self.exact_words = {"".join(FuzzyKeywordIndex._token.findall(word.lower())) for word in exact_words}
+        self.prefix_length = prefix_length
+        self.cache_size = cache_size
+        self._cache = {}
+        self._join_cache = {}
+        self.join_heads = set()
+        self.short_heads = set()
+        self.entries = []  # (category, keyword, squashed, allowed distance, joinable)
+        self.deletes = {}
+        max_tokens = 1
+        max_length = 0
+        for category, keyword in keywords:
+            tokens = FuzzyKeywordIndex._token.findall(keyword.lower())
+            squashed = "".join(tokens)
+            if not squashed:
+                continue
+            distance = max_distance if len(squashed) >= min_length else 0
+            joinable = len(squashed) >= min_length or any(ch.isdigit() for ch in squashed)
+            entry_id = len(self.entries)
+            self.entries.append((category, keyword, squashed, distance, joinable))
+            for variant in FuzzyKeywordIndex._deletions(squashed[:prefix_length], distance):
+                self.deletes.setdefault(variant, []).append(entry_id)
+            if joinable:
+                self.join_heads |= FuzzyKeywordIndex._deletions(squashed[:self.head_length], distance)
+                self.short_heads.update(squashed[:length] for length in range(1, self.head_length))
+            max_tokens = max(max_tokens, len(tokens))
+            max_length = max(max_length, len(squashed))
+        # one extra token for a keyword written with a stray space ("mda mb 23 1")
+        self.max_span = max_tokens + 1
+        self.max_length = max_length + max_distance
+
+    @staticmethod
+    def _deletions(word, distance) -> set:
+        variants = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    @staticmethod
+    def distance(a: str, b: str, limit: int) -> int:
+        """Optimal string alignment distance (adjacent transpositions count as one edit);
+        returns limit + 1 as soon as the distance is known to exceed limit."""
+        if abs(len(a) - len(b)) > limit:
+            return limit + 1
+        previous2 = None
+        previous = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            for j in range(1, len(b) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+                if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    value = min(value, previous2[j - 2] + 1)
+                current[j] = value
+            if min(current) > limit:
+                return limit + 1
+            previous2, previous = previous, current
+        return previous[-1]
+
+    def find(self, text: str) -> list:
+        """(category, keyword) pairs that occur in text within their allowed distance, in
+        order of first occurrence."""
+        tokens = FuzzyKeywordIndex._token.findall(text.lower())
+        found = {}
+        for i in range(len(tokens)):
+            candidate = ""
+            spans = self.max_span if self._starts_join(tokens[i]) else 1
+            for span in range(min(spans, len(tokens) - i)):
+                candidate += tokens[i + span]
+                if len(candidate) > self.max_length:
+                    break
+                for entry_id in self._matches(candidate):
+                    category, keyword, squashed, _, joinable = self.entries[entry_id]
+                    if span == 0 or (joinable and candidate == squashed):
+                        found[(category, keyword)] = True
+        return list(found)
+
+    def _starts_join(self, token) -> bool:
+        starts = self._join_cache.get(token)
+        if starts is None:
+            if token.isdigit():
+                starts = False
+            elif len(token) < self.head_length:
+                starts = token in self.short_heads
+            else:
+                variants = FuzzyKeywordIndex._deletions(token[:self.head_length], self.max_distance)
+                starts = not self.join_heads.isdisjoint(variants)
+            if len(self._join_cache) >= self.cache_size:
+                self._join_cache.clear()
+            self._join_cache[token] = starts
+        return starts
+
+    def _matches(self, candidate) -> tuple:
+        # ids of the keywords within their allowed distance of candidate
+        matches = self._cache.get(candidate)
+        if matches is not None:
+            return matches
+        entry_ids = set()
+        for variant in FuzzyKeywordIndex._deletions(candidate[:self.prefix_length], self.max_distance):
+            entry_ids.update(self.deletes.get(variant, ()))
+        matches = []
+        for entry_id in sorted(entry_ids):
+            _, _, squashed, distance, _ = self.entries[entry_id]
+            if candidate == squashed or (distance and candidate not in self.exact_words and
+                                         FuzzyKeywordIndex.distance(candidate, squashed, distance) <= distance):
+                matches.append(entry_id)
+        matches = tuple(matches)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[candidate] = matches
+        return matches
@@ -0,0 +1,68 @@
+import re
+from dataclasses import dataclass, field
+
+
+@dataclass
+class KeywordHits:
+    breast_count: int = 0
+    breast_in_title: bool = False
+    breast_context: bool = False
+    human: list = field(default_factory=list)
+    animal: list = field(default_factory=list)
+    human_cells: list = field(default_factory=list)
+    animal_cells: list = field(default_factory=list)
+
+
+class KeywordMatcher:
+    """Precompiled matcher for the Stage 2 relevance filter.
+
+    Every keyword category is compiled once into a single word-bounded alternation, so a
+    scan costs one regex pass per category instead of one pattern build and pass per keyword.
+    An optional FuzzyKeywordIndex over the human, animal and cell line lists adds the
+    keywords that only occur misspelled or split ("MDA MB 231") to the exact hits.
+    """
+
+    def __init__(self, breast_keywords, breast_context_words, human_indicators, animal_keywords,
+                 human_breast_cells, animal_breast_cells, fuzzy_index=None):
+        self.fuzzy_index = fuzzy_index
+        breast = KeywordMatcher._alternation(word for word in breast_keywords if word)
+        context = KeywordMatcher._alternation(word for word in breast_context_words if word)
+        self.breast_pattern = re.compile(r'\b(' + breast + r')\b')
+        self.context_pattern = re.compile(
+            r'\b(' + breast + r')\b\s*(?:\w+\s+){0,5}\b(' + context + r')\b', re.IGNORECASE)
+        self.human_pattern = KeywordMatcher._compile(human_indicators)
+        self.animal_pattern = KeywordMatcher._compile(animal_keywords)
+        self.human_cells_pattern = KeywordMatcher._compile(human_breast_cells)
+        self.animal_cells_pattern = KeywordMatcher._compile(animal_breast_cells)
+
+    @staticmethod
+    def _compile(words):
+        # Longest first so that reported hits prefer "xenopus laevis" over "xenopus".
+        # Whether the category matches at all does not depend on the order.
+        unique = sorted({word.lower() for word in words if word}, key=len, reverse=True)
+        return re.compile(r'\b(?:' + KeywordMatcher._alternation(unique) + r')\b')
+
+    @staticmethod
+    def _alternation(words):
+        # an empty list must never match; an empty alternation would match everywhere
+        return '|'.join(re.escape(word) for word in words) or '(?!)'
+
+    @staticmethod
+    def _find_all(pattern, text):
+        return list(dict.fromkeys(m.group() for m in pattern.finditer(text)))
+
+    def scan(self, title_text: str, check_zone: str) -> KeywordHits:
+        hits = KeywordHits()
+        hits.breast_count = sum(1 for _ in self.breast_pattern.finditer(check_zone))
+        hits.breast_in_title = self.breast_pattern.search(title_text) is not None
+        hits.breast_context = self.context_pattern.search(check_zone) is not None
+        hits.human = KeywordMatcher._find_all(self.human_pattern, check_zone)
+        hits.animal = KeywordMatcher._find_all(self.animal_pattern, check_zone)
+        hits.human_cells = KeywordMatcher._find_all(self.human_cells_pattern, check_zone)
+        hits.animal_cells = KeywordMatcher._find_all(self.animal_cells_pattern, check_zone)
+        if self.fuzzy_index is not None:
+            for category, keyword in self.fuzzy_index.find(check_zone):
+                found = getattr(hits, category)
+                if keyword not in found:
+                    found.append(keyword)
+        return hits
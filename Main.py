@@ -1,21 +1,357 @@
 import os
+import csv
 import sys
 import time
-import numpy as np
+import argparse
 import random
 import logging
-import torch
 from ProcessDataSrv import ProcessDataSrv
+from PipelineSrv import IngestPipeline
 from SqlServerSrv import SqlServerSrv
+from OutputSinks import SqlServerSink, SqliteSink, FileSink
+from ManifestSrv import ManifestSrv
+from MetricsSrv import MetricsSrv
+from ChunkExporter import Chunker, ChunkExporter
+from DiscoverySrv import DiscoverySrv
+from ArchiveReader import ArchiveReader
+from ClassificationCache import ClassificationCache
+from ArticleVerdict import ArticleVerdict
+from FieldHasher import FieldHasher
+from NearDuplicateIndex import NearDuplicateIndex
 from datetime import datetime
 
-def main():
+
+def shard_arg(value):
+    try:
+        return DiscoverySrv.parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Process PMC XML articles into SQL Server.")
+    parser.add_argument("--input", default=r"\\192.168.1.22\c$\NCBI-E-utilities\PMC_BreastCancer_XML",
+                        help="Folder scanned recursively for .xml files and tar/tar.gz/zip packages, "
+                             "or a single package.")
+    parser.add_argument("--shard", type=shard_arg, default=None, metavar="i/N",
+                        help="Process only shard i (0-based) of N, partitioned by a stable hash of the relative "
+                             "path; run N hosts with 0/N .. N-1/N to split one input folder between them.")
+    parser.add_argument("--output", default=r"./", help="Base folder for the timestamped run folder.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of worker processes for parsing/classification (0 = linear).")
+    parser.add_argument("--max-in-flight", type=int, default=0,
+                        help="Maximum files submitted but not yet written (default: 4 x workers).")
+    parser.add_argument("--readers", type=int, default=4,
+                        help="Threads prefetching file bytes from the input share.")
+    parser.add_argument("--read-ahead", type=int, default=32,
+                        help="Maximum prefetched files waiting to be parsed.")
+    parser.add_argument("--queue-log-every", type=int, default=1000,
+                        help="Log pipeline queue depths every N files (0 = never).")
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="Articles sent to the sink per round trip and commit.")
+    parser.add_argument("--sink", choices=["sqlserver", "sqlite", "jsonl", "parquet"], default="sqlserver",
+                        help="Where accepted articles are written (default: SQL Server through InsertData).")
+    parser.add_argument("--sink-path", default=None,
+                        help="SQLite file (default: <output>/process_Articles.sqlite) or folder for jsonl/parquet "
+                             "shards (default: <run folder>/articles).")
+    parser.add_argument("--manifest", default=None,
+                        help="SQLite manifest of processed files (default: <output>/process_Manifest.sqlite).")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Reprocess every file even if the manifest has it; outcomes are still recorded.")
+    parser.add_argument("--classification-cache", nargs="?", const="", default=None, metavar="PATH",
+                        help="Cache the filter inputs and verdict of every file in SQLite "
+                             "(default: <output>/process_Classification.sqlite).")
+    parser.add_argument("--reclassify", action="store_true",
+                        help="Re-run the relevance filter on the cached filter inputs only, write the diff, remove "
+                             "stored articles that became NonTarget and process the files that became targets.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="With --reclassify: only write the diff, change nothing.")
+    parser.add_argument("--fuzzy-distance", type=int, default=0,
+                        help="Also match human/animal keywords and cell lines within this edit distance "
+                             "(0 = exact matching only).")
+    parser.add_argument("--fuzzy-min-length", type=int, default=7,
+                        help="Shorter keywords are only matched exactly in fuzzy mode.")
+    parser.add_argument("--max-file-mb", type=float, default=0,
+                        help="Per-file size budget in MB (0 = none); larger files are skipped or truncated.")
+    parser.add_argument("--oversize", choices=["skip", "truncate"], default="skip",
+                        help="What to do with a file over --max-file-mb: skip it, or parse only its first "
+                             "--max-file-mb (front matter and the start of the body).")
+    parser.add_argument("--huge-tree", action="store_true",
+                        help="Lift libxml2's limits on text node size and nesting depth instead of cutting the "
+                             "file off where it hits them.")
+    parser.add_argument("--update-revised", action="store_true",
+                        help="Update stored articles whose DOI comes again with changed content (a PMC "
+                             "revision), sending only the changed columns, instead of counting them as Double DOI.")
+    parser.add_argument("--hashes-table", default="ArticleFieldHashes",
+                        help="Table with the per-column content hashes of stored articles (--update-revised).")
+    parser.add_argument("--near-dup-index", nargs="?", const="", default=None, metavar="PATH",
+                        help="Detect near-duplicate articles (preprints, republished versions, other or no DOI) "
+                             "with a persistent MinHash/LSH index (default: <output>/process_NearDup.sqlite).")
+    parser.add_argument("--near-dup-flag", type=float, default=0.8,
+                        help="Estimated Jaccard similarity of abstract+body shingles at which an article is "
+                             "reported as a near duplicate (and still stored).")
+    parser.add_argument("--near-dup-skip", type=float, default=0,
+                        help="Similarity at which a near duplicate is not stored at all (0 = never skip).")
+    parser.add_argument("--duplicate-index", action="store_true",
+                        help="Preload stored DOI/PMID/PMC ids and skip known duplicates before body parsing.")
+    parser.add_argument("--articles-table", default="Articles",
+                        help="Table that InsertData writes to (used to preload the duplicate index).")
+    parser.add_argument("--refs-table", default=None,
+                        help="Bulk load structured references into this table (created if missing; file sinks "
+                             "write references shards) instead of sending them inline as ArtReferences.")
+    parser.add_argument("--chunks", choices=["jsonl", "parquet"], default=None,
+                        help="Export embedding-ready chunks of inserted articles to <run folder>/chunks.")
+    parser.add_argument("--chunk-tokens", type=int, default=512, help="Maximum (approximate) tokens per chunk.")
+    parser.add_argument("--chunk-overlap", type=int, default=64,
+                        help="Tokens repeated from the end of one chunk at the start of the next.")
+    parser.add_argument("--chunk-shard-rows", type=int, default=50000, help="Chunks per shard file.")
+    parser.add_argument("--slowest", type=int, default=20,
+                        help="Number of slowest files listed with their stage breakdown in the metrics file.")
+    args = parser.parse_args(argv)
+    if args.update_revised and args.sink not in ("sqlserver", "sqlite"):
+        parser.error("--update-revised needs the sqlserver or sqlite sink")
+    if args.near_dup_skip and args.near_dup_skip < args.near_dup_flag:
+        parser.error("--near-dup-skip must not be lower than --near-dup-flag")
+    if args.update_revised and args.duplicate_index:
+        parser.error("--update-revised cannot be combined with --duplicate-index, "
+                     "which rejects revisions before they are parsed")
+    return args
+
+
+def seed_everything(random_state):
+    # numpy/torch are not needed for processing; seed them only if something already loaded
+    # them, so a plain run never pays for importing an ML framework.
+    random.seed(random_state)
+    np = sys.modules.get("numpy")
+    if np is not None:
+        np.random.seed(random_state)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.manual_seed(random_state)
+
+
+def new_stats():
+    return {"Target": 0, "error": 0, "doubleDOI": 0, "NonTarget": 0, "nobody_Count": 0, "noabs_Count": 0}
+
+
+def format_stats(stats):
+    return (f"Target:{stats['Target']}    error:{stats['error']}   doubleDOI:{stats['doubleDOI']}    "
+            f"NonTarget:{stats['NonTarget']}    nobody_Count:{stats['nobody_Count']}    "
+            f"noabs_Count:{stats['noabs_Count']}")
+
+
+def record_outcome(manifest, result, outcome):
+    if manifest is not None:
+        manifest.record(result.path, outcome, result.content_hash, result.stat)
+
+
+def record_duplicate(stats, manifest, result):
+    stats["doubleDOI"] += 1
+    logging.error(f"Double DOI: {result.path}")
+    # a file that is still cut short stays "truncated", so it is retried once the budget covers it
+    record_outcome(manifest, result, "truncated" if result.article.Truncated else "doubleDOI")
+
+
+def make_sink(args, base_output_path, output_path, code_name="process"):
+    hashes_table = args.hashes_table if args.update_revised else None
+    if args.sink == "sqlserver":
+        db = SqlServerSrv(server='.',database='HLNLLMBreastDB', username='sa', password='sa')
+        return SqlServerSink(db, 'InsertData', args.articles_table, args.refs_table, hashes_table)
+    if args.sink == "sqlite":
+        path = args.sink_path or os.path.join(base_output_path, f"{code_name}_Articles.sqlite")
+        return SqliteSink(path, args.articles_table, args.refs_table or "ArticleReferences", hashes_table)
+    return FileSink(args.sink_path or os.path.join(output_path, "articles"), args.sink)
+
+
+def write_batch(sink, batch, stats, manifest=None, dup_index=None, refs_table=None, chunk_exporter=None,
+                cache=None, revisions=None, near_dups=None):
+    # One round trip and one commit for the whole batch; results come back per article.
+    # revisions (counters) turns on --update-revised: stored DOIs are compared and updated.
+    # near_dups already holds the batch's signatures; they get their ArticlesID or are dropped.
+    if not batch:
+        return
+    new_ids = sink.write_batch([result.article for result in batch])
+    ref_rows = []
+    hash_rows = []
+    revised = []
+    stored = []
+    for result, new_id in zip(batch, new_ids):
+        if near_dups is not None and result.article.MinHash:
+            if isinstance(new_id, int) and new_id > 0:
+                near_dups.set_article_id(result.path, new_id)
+            else:
+                near_dups.discard_pending(result.path)
+        if isinstance(new_id, Exception) or new_id is None:
+            logging.error(f"Error processing file {result.path}: {str(new_id)}")
+            record_outcome(manifest, result, "error")
+            if dup_index is not None:
+                dup_index.discard_article(result.article)
+            continue
+        if new_id <= 0:
+            if new_id == -1 and revisions is not None and result.article.ArtDoi:
+                revised.append(result)
+            elif new_id == -1:
+                record_duplicate(stats, manifest, result)
+            else:
+                stats["error"] += 1
+                logging.error(f"Error processing file: {result.path}")
+                record_outcome(manifest, result, "error")
+                if dup_index is not None:
+                    dup_index.discard_article(result.article)
+        else:
+            stored.append((result, new_id))
+            if refs_table:
+                ref_rows.extend((new_id, ref) for ref in result.article.References)
+
+    # with a references table ArtReferences was sent empty, so an article is only done once
+    # its references are stored as well
+    failed_ids = set()
+    if ref_rows:
+        try:
+            sink.write_references(ref_rows)
+        except Exception as e:
+            failed_ids = {article_id for article_id, _ in ref_rows}
+            logging.error(f"Error inserting references of ArticlesID {sorted(failed_ids)}: {str(e)}")
+            try:
+                # removed again, so the next run inserts them with their references
+                sink.delete_articles(sorted(failed_ids))
+            except Exception as e:
+                logging.error(f"Error removing ArticlesID {sorted(failed_ids)} after their references failed: "
+                              f"{str(e)}")
+    for result, new_id in stored:
+        if new_id in failed_ids:
+            stats["error"] += 1
+            record_outcome(manifest, result, "error")
+            if dup_index is not None:
+                dup_index.discard_article(result.article)
+            if near_dups is not None and result.article.MinHash:
+                near_dups.discard(result.path)
+            continue
+        stats["Target"] += 1
+        record_outcome(manifest, result, "truncated" if result.article.Truncated else "Target")
+        if cache is not None:
+            cache.set_article_id(result.path, new_id)
+        if chunk_exporter is not None:
+            chunk_exporter.write(result.article, new_id)
+        if revisions is not None:
+            hash_rows.append((new_id, result.article.FieldHashes))
+    for result in batch:
+        if (result.index + 1) % 100 == 0:
+            logging.info(f"[{result.index}] Processed - {format_stats(stats)}")
+    if revised:
+        hash_rows.extend(update_revised(sink, revised, stats, revisions, manifest, refs_table, chunk_exporter, cache))
+    if hash_rows:
+        try:
+            sink.write_field_hashes(hash_rows)
+        except Exception as e:
+            logging.error(f"Error storing field hashes of {len(hash_rows)} articles: {str(e)}")
+    if chunk_exporter is not None:
+        chunk_exporter.flush()
+    sink.flush()
+    # the manifest only marks a batch done after the sink has committed it
+    if manifest is not None:
+        manifest.commit()
+    if cache is not None:
+        cache.commit()
+    if near_dups is not None:
+        near_dups.commit()
+
+
+def update_revised(sink, results, stats, revisions, manifest=None, refs_table=None, chunk_exporter=None,
+                   cache=None):
+    # Articles whose DOI is already stored. Their FieldHashes are compared with the stored
+    # ones; unchanged articles cost nothing more, revised ones get only their changed columns
+    # (all columns once for rows stored before --update-revised). Returns the hash rows to store.
+    stored = sink.load_field_hashes([result.article.ArtDoi for result in results])
+    updates = []
+    changes = []
+    for result in results:
+        article = result.article
+        if article.ArtDoi not in stored:
+            record_duplicate(stats, manifest, result)
+            continue
+        article_id, hashes = stored[article.ArtDoi]
+        changed = FieldHasher.changed(article.FieldHashes, hashes)
+        if not changed:
+            # the same content again, from this file or another copy: a duplicate as without the option
+            revisions["unchanged"] += 1
+            record_duplicate(stats, manifest, result)
+            continue
+        # with a references table ArtReferences stays empty, the references rows are replaced instead
+        columns = {name: getattr(article, name) for name in changed if not (refs_table and name == "ArtReferences")}
+        # a revision also points the row at the file it came from
+        columns.update((name, getattr(article, name)) for name in FieldHasher.identity_columns)
+        updates.append((article_id, columns))
+        changes.append((result, article_id, changed))
+    if not changes:
+        return []
+
+    replaced = [(article_id, result) for result, article_id, changed in changes
+                if refs_table and "ArtReferences" in changed]
+    try:
+        sink.update_articles(updates)
+        if replaced:
+            sink.replace_references([article_id for article_id, _ in replaced],
+                                    [(article_id, ref) for article_id, result in replaced
+                                     for ref in result.article.References])
+    except Exception as e:
+        for result, _, _ in changes:
+            stats["error"] += 1
+            logging.error(f"Error updating revised article {result.path}: {str(e)}")
+            record_outcome(manifest, result, "error")
+        return []
+
+    hash_rows = []
+    for result, article_id, changed in changes:
+        revisions["updated"] += 1
+        revisions["columns"] += len(changed)
+        label = ", ".join(changed) if len(changed) < len(FieldHasher.columns) else "all columns"
+        logging.info(f"Updated revised article {result.path} (ArticlesID {article_id}): {label}")
+        record_outcome(manifest, result, "updated")
+        if cache is not None:
+            cache.set_article_id(result.path, article_id)
+        if chunk_exporter is not None and {"ArtTitle", "ArtAbstract", "ArtBody"} & set(changed):
+            chunk_exporter.write(result.article, article_id)
+        hash_rows.append((article_id, result.article.FieldHashes))
+    return hash_rows
+
+
+def reclassify(cache, sink, rules_hash, diff_path, dry_run=False, near_dups=None):
+    # Returns the paths to process again (files that became targets), None for a dry run.
+    logging.info(f"Reclassifying cached filter inputs, {cache.stale_count(rules_hash)} classified under other rules")
+    changes = cache.reclassify(ProcessDataSrv.reclassify, rules_hash, apply=not dry_run)
+    with open(diff_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["FilePath", "Change", "OldReason", "NewReason", "ArticlesID"])
+        for path, non_target, old_reason, new_reason, article_id in changes:
+            writer.writerow([path, "excluded" if non_target else "included", old_reason, new_reason, article_id])
+    included = [path for path, non_target, _, _, _ in changes if not non_target]
+    logging.info(f"Newly included: {len(included)}   newly excluded: {len(changes) - len(included)}   "
+                 f"diff written to {diff_path}")
+    if dry_run:
+        return None
+
+    article_ids = cache.pending_removals()
+    if article_ids:
+        try:
+            sink.delete_articles(article_ids)
+            cache.clear_article_ids(article_ids)
+            if near_dups is not None:
+                near_dups.remove_articles(article_ids)
+            logging.info(f"Removed {len(article_ids)} stored articles that are NonTarget now")
+        except Exception as e:
+            logging.error(f"Error removing {len(article_ids)} articles that are NonTarget now: {str(e)}")
+    return included
+
+
+def main(argv=None):
     # Output and logging
     start_time = time.time()
+    args = parse_args(argv)
 
     code_name = "process"
-    base_output_path = r"./"
-    input_folder = r"\\192.168.1.22\c$\NCBI-E-utilities\PMC_BreastCancer_XML"
+    base_output_path = args.output
+    input_folder = args.input
 
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     output_path = os.path.join(base_output_path, f"{code_name}_Run_{timestamp}")
@@ -34,73 +370,235 @@ def main():
     console_handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
     logger.addHandler(console_handler)
     random_state = 102
-    random.seed(random_state)
-    np.random.seed(random_state)
-    torch.manual_seed(random_state)
+    seed_everything(random_state)
     logging.info(f"Started on: {datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}")
 
-    logging.info("Connecting to SQl Server...")
-    db = SqlServerSrv(server='.',database='HLNLLMBreastDB', username='sa', password='sa')
-    db.connect()
-    logging.info("Connected")
-    logging.info("Start to reading files....")
+    sink = make_sink(args, base_output_path, output_path, code_name)
+    if sink.name == "sqlserver":
+        logging.info("Connecting to SQl Server...")
+    sink.open()
+    # every exit, early returns included, closes the outputs and commits the manifest
+    manifest = cache = near_dups = near_dup_report = chunk_exporter = None
+    try:
+        logging.info(f"Writing to {sink.name}")
+        metrics = MetricsSrv(top_n=args.slowest)
+        metrics_path = os.path.join(output_path, f"{code_name}_Metrics.json")
+        sink.metrics = metrics
 
-    if not os.path.exists(input_folder):
-        logging.error(f"Error: Folder '{input_folder}' not found!")
-        return
+        if args.refs_table:
+            logging.info(f"References are bulk loaded into {args.refs_table}")
 
-    file_paths = []
-    for root, dirs, files in os.walk(input_folder):
-        for f in files:
-            if f.endswith('.xml'):
-                full_path = os.path.join(root, f)
-                file_paths.append(full_path)
-
-    total_files = len(file_paths)
-    logging.info(f"Total files found: {total_files}")
-    logging.info("Processing started linearly...")
-    nonTarget_Count=0
-    doubleDOI_Count=0
-    error_Count=0
-    target_Count=0
-    nobody_Count=0
-    noabs_Count=0
-    for index, path in enumerate(file_paths, 1):
-        try:
-            article_model = ProcessDataSrv.process_file(path)
-            if article_model and article_model.NonTarget:
-                nonTarget_Count += 1
+        dup_index = None
+        settings = {}
+        if args.duplicate_index:
+            dup_index = sink.load_duplicate_index()
+            settings["duplicate_index"] = dup_index
+            logging.info(f"Duplicate index loaded: {len(dup_index)} keys")
+        if args.chunks:
+            settings["chunker"] = Chunker(args.chunk_tokens, args.chunk_overlap)
+            chunk_exporter = ChunkExporter(os.path.join(output_path, "chunks"), args.chunks, args.chunk_shard_rows)
+            logging.info(f"Exporting {args.chunks} chunks of up to {args.chunk_tokens} tokens")
+        if args.fuzzy_distance:
+            settings["fuzzy_distance"] = args.fuzzy_distance
+            settings["fuzzy_min_length"] = args.fuzzy_min_length
+            logging.info(f"Fuzzy keyword matching up to edit distance {args.fuzzy_distance} "
+                         f"for keywords of {args.fuzzy_min_length}+ characters")
+        if args.max_file_mb:
+            settings["max_file_bytes"] = int(args.max_file_mb * 1024 * 1024)
+            settings["oversize_mode"] = args.oversize
+            action = "truncated" if args.oversize == "truncate" else "skipped"
+            logging.info(f"Files over {args.max_file_mb} MB are {action}")
+        if args.huge_tree:
+            settings["huge_tree"] = True
+        revisions = None
+        if args.update_revised:
+            settings["field_hashes"] = True
+            revisions = {"updated": 0, "unchanged": 0, "columns": 0}
+            logging.info(f"Revised articles are updated in place, column hashes kept in {args.hashes_table}")
+        if args.near_dup_index is not None:
+            settings["minhash"] = True
+        if args.classification_cache is not None or args.reclassify:
+            cache = ClassificationCache(args.classification_cache
+                                        or os.path.join(base_output_path, f"{code_name}_Classification.sqlite"))
+            cache.open()
+            settings["keep_filter_zone"] = True
+        if settings:
+            ProcessDataSrv.configure(settings)
+        rules_hash = ProcessDataSrv.rules_hash()
+        if cache is not None:
+            logging.info(f"Caching filter inputs in {cache.db_path} (rules {rules_hash[:8]})")
+        near_dup_counts = {"flagged": 0, "skipped": 0}
+        if args.near_dup_index is not None:
+            near_dups = NearDuplicateIndex(args.near_dup_index or os.path.join(base_output_path,
+                                                                               f"{code_name}_NearDup.sqlite"),
+                                           args.near_dup_flag)
+            near_dups.open()
+            near_dup_report = open(os.path.join(output_path, f"{code_name}_NearDuplicates.csv"), 'w', newline='',
+                                   encoding='utf-8')
+            near_dup_writer = csv.writer(near_dup_report)
+            near_dup_writer.writerow(["FilePath", "Action", "Similarity", "MatchPath", "MatchArticlesID"])
+            logging.info(f"Near-duplicate index {near_dups.db_path}: {len(near_dups)} articles, "
+                         f"{NearDuplicateIndex.bins // near_dups.rows} bands of {near_dups.rows}")
+
+        manifest = ManifestSrv(args.manifest or os.path.join(base_output_path, f"{code_name}_Manifest.sqlite"))
+        manifest.open()
+        skip_file = skip_member = None
+        discovery = None
+        if args.reclassify:
+            included = reclassify(cache, sink, rules_hash, os.path.join(output_path, f"{code_name}_Reclassify.csv"),
+                                  args.dry_run, near_dups)
+            if included is None:
+                return
+            # archive members are reprocessed by streaming their archive and skipping the rest
+            wanted = set(included)
+            archives = set()
+            inputs = []
+            for path in included:
+                archive_path, member = ArchiveReader.split_key(path)
+                if member is None:
+                    inputs.append(path)
+                elif archive_path not in archives:
+                    archives.add(archive_path)
+                    inputs.append(archive_path)
+            skip_member = lambda archive_path, key, size, mtime, content_hash: key not in wanted
+        else:
+            logging.info("Start to reading files....")
+            if not os.path.exists(input_folder):
+                logging.error(f"Error: Folder '{input_folder}' not found!")
+                return
+
+            # files are discovered while the pipeline runs, so the total is only known at the end
+            discovery = DiscoverySrv(input_folder, args.shard)
+            inputs = discovery
+            if args.shard:
+                logging.info(f"Processing shard {args.shard[0]}/{args.shard[1]}")
+            if not args.no_resume:
+                skip_file = manifest.is_processed
+                skip_member = manifest.is_member_processed
+        if args.workers > 0:
+            logging.info(f"Processing started with {args.workers} workers and {args.readers} readers...")
+        else:
+            logging.info(f"Processing started linearly with {args.readers} readers...")
+        pipeline = IngestPipeline(inputs, workers=args.workers, readers=args.readers, read_ahead=args.read_ahead,
+                                  max_in_flight=args.max_in_flight, settings=settings, skip_file=skip_file,
+                                  skip_member=skip_member)
+        stats = new_stats()
+        reasons = {}
+        oversize = {"skipped": 0, "truncated": 0}
+        batch = []
+        for result in pipeline:
+            if args.queue_log_every and result.index % args.queue_log_every == 0:
+                depths = pipeline.queue_depths()
+                logging.info(f"[{result.index}] Queue depths - " + "   ".join(f"{k}:{v}" for k, v in depths.items()))
+                metrics.write_json(metrics_path)
+            metrics.observe_file(result.path, result.size, result.timings)
+            article_model = result.article
+            if result.error is not None:
+                logging.error(f"Error processing file {result.path}: {str(result.error)}")
+                record_outcome(manifest, result, "error")
                 continue
-            if article_model and (not article_model.ArtBody or article_model.ArtBody.strip() == ''):
-                nobody_Count += 1
+            if article_model is None:
+                logging.error(f"Error processing file {result.path}: no article returned")
+                record_outcome(manifest, result, "error")
                 continue
-            if article_model and (not article_model.ArtAbstract or article_model.ArtAbstract.strip() == ''):
-                noabs_Count += 1
+            if cache is not None and article_model.FilterZone:
+                cache.record(result.path, result.content_hash, article_model.FilterZone, article_model.NonTarget,
+                             article_model.Reason if article_model.NonTarget else "", rules_hash)
+            if isinstance(article_model, ArticleVerdict) and article_model.Skipped:
+                oversize["skipped"] += 1
+                logging.warning(f"Skipped {result.path}: {article_model.Reason} {' '.join(article_model.Signals)}")
+                record_outcome(manifest, result, article_model.Reason)
                 continue
-            new_id = db.insert_with_stored_procedure('InsertData', article_model)
-            if new_id<=0:
-                if new_id ==-1:
-                    doubleDOI_Count+=1
-                    logging.error(f"Double DOI: {path}")
-                else:
-                    error_Count+=1
-                    logging.error(f"Error processing file: {path}")
-            else:
-                target_Count += 1
-
-            if (index + 1) % 100 == 0:
-                logging.info(f"[{index}/{total_files}] Processed - Target:{target_Count}   error:{error_Count}   "
-                             f"doubleDOI:{doubleDOI_Count}   NonTarget:{nonTarget_Count}    nobody_Count:{nobody_Count}"
-                             f"    noabs_Count:{noabs_Count}")
-        except Exception as e:
-            logging.error(f"Error processing file {path}: {str(e)}")
-            continue
-
-    db.close()
+            if article_model.NonTarget:
+                stats["NonTarget"] += 1
+                reasons[article_model.Reason] = reasons.get(article_model.Reason, 0) + 1
+                record_outcome(manifest, result, "NonTarget")
+                continue
+            if article_model.Duplicate:
+                record_duplicate(stats, manifest, result)
+                continue
+            if article_model.Truncated:
+                oversize["truncated"] += 1
+                logging.warning(f"Truncated {result.path}: {article_model.Truncated}")
+            if not article_model.ArtBody or article_model.ArtBody.strip() == '':
+                stats["nobody_Count"] += 1
+                record_outcome(manifest, result, "nobody")
+                continue
+            if not article_model.ArtAbstract or article_model.ArtAbstract.strip() == '':
+                stats["noabs_Count"] += 1
+                record_outcome(manifest, result, "noabs")
+                continue
+            if dup_index is not None and dup_index.contains_article(article_model):
+                # catches duplicates within this run, which the workers' copy cannot see
+                record_duplicate(stats, manifest, result)
+                continue
+            if near_dups is not None and article_model.MinHash:
+                match = near_dups.query(article_model.MinHash, result.path, article_model.ArtDoi)
+                if match is not None:
+                    skip = bool(args.near_dup_skip) and match.Similarity >= args.near_dup_skip
+                    near_dup_writer.writerow([result.path, "skipped" if skip else "flagged", f"{match.Similarity:.3f}",
+                                              match.Path, match.ArticlesID or ""])
+                    logging.warning(f"Near duplicate{' skipped' if skip else ''}: {result.path} ~ {match.Path} "
+                                    f"(similarity {match.Similarity:.2f})")
+                    if skip:
+                        near_dup_counts["skipped"] += 1
+                        record_outcome(manifest, result, "nearDup")
+                        continue
+                    near_dup_counts["flagged"] += 1
+                # indexed right away, so near duplicates within the same batch are caught too
+                near_dups.add(result.path, article_model.ArtDoi, article_model.MinHash)
+            if dup_index is not None:
+                # only articles that go to the sink; write_batch takes back the ones that fail
+                dup_index.add_article(article_model)
+            if args.refs_table:
+                # the references go to their own table, keep them out of the InsertData payload
+                article_model.ArtReferences = ""
+            batch.append(result)
+            if len(batch) >= args.batch_size:
+                write_batch(sink, batch, stats, manifest, dup_index, args.refs_table, chunk_exporter, cache, revisions,
+                            near_dups)
+                batch = []
+        write_batch(sink, batch, stats, manifest, dup_index, args.refs_table, chunk_exporter, cache, revisions,
+                    near_dups)
+    finally:
+        sink.close()
+        if manifest is not None:
+            manifest.close()
+        if cache is not None:
+            cache.close()
+        if near_dups is not None:
+            near_dups.close()
+        if near_dup_report is not None:
+            near_dup_report.close()
+        if chunk_exporter is not None:
+            chunk_exporter.close()
+            logging.info(f"Chunks exported: {chunk_exporter.total_rows} in {chunk_exporter.shards} shards")
+    metrics.write_json(metrics_path)
+    logging.info(f"Metrics written to {metrics_path}")
+    if discovery is not None:
+        total_files = discovery.files
+        logging.info(f"Total files found: {total_files}")
+        if discovery.archives:
+            logging.info(f"Archives found: {discovery.archives}")
+            total_files = f"{total_files}+archives"
+        if args.shard:
+            logging.info(f"Left to other shards: {discovery.other_shards}")
+        logging.info(f"Skipped (unchanged since last run): {pipeline.skipped_files}")
+        if pipeline.skipped_members:
+            logging.info(f"Archive members skipped (unchanged since last run): {pipeline.skipped_members}")
+    else:
+        total_files = len(included)
+    if oversize["skipped"] or oversize["truncated"]:
+        logging.info(f"Oversize files skipped: {oversize['skipped']}   truncated: {oversize['truncated']}")
+    if near_dups is not None:
+        logging.info(f"Near duplicates flagged: {near_dup_counts['flagged']}   skipped: {near_dup_counts['skipped']}")
+    if revisions is not None:
+        logging.info(f"Revised articles updated: {revisions['updated']} ({revisions['columns']} columns sent)   "
+                     f"unchanged: {revisions['unchanged']}")
+    if reasons:
+        logging.info("NonTarget reasons: " + "   ".join(f"{k}:{v}" for k, v in sorted(reasons.items())))
     logging.info("--- Processing Completed Successfully ---")
-    logging.info(f"Total:{total_files} Target:{target_Count}    error:{error_Count}   "
-                 f"doubleDOI:{doubleDOI_Count}    NonTarget:{nonTarget_Count}    nobody_Count:{nobody_Count}"
-                 f"    noabs_Count:{noabs_Count}")
+    logging.info(f"Total:{total_files} {format_stats(stats)}")
     end_time = time.time()
     elapsed = end_time - start_time
     minutes = int(elapsed // 60)
@@ -0,0 +1,159 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from ArchiveReader import ArchiveReader
+
+
+class ManifestSrv:
+    """Local SQLite manifest of processed input files.
+
+    Each file is keyed by its path and stored with size, mtime, a SHA-1 of its content and
+    the outcome of the run that processed it. A later run skips a file when its size and
+    mtime are unchanged, or when they changed but the content hash did not. Files whose
+    last outcome was "error" are always retried, and so are the files the per-file budget
+    or the parser limits cut short ("too_large" skipped, "truncated" stored from a part),
+    since the budget may have been raised since.
+
+    The pipeline reader thread asks is_processed/is_member_processed while the main thread
+    records outcomes, so the connection is shared across threads behind a lock.
+    """
+
+    retry_outcomes = ("error", "too_large", "truncated")
+
+    def __init__(self, db_path, commit_every=100):
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self.conn = None
+        self._stats = {}
+        self._members = (None, {})
+        self._uncommitted = 0
+        self._lock = threading.Lock()
+
+    def open(self):
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ProcessedFiles (
+                FilePath TEXT PRIMARY KEY,
+                FileSize INTEGER NOT NULL,
+                FileMtime REAL NOT NULL,
+                ContentHash TEXT,
+                Outcome TEXT NOT NULL,
+                ProcessedOn TEXT NOT NULL
+            )""")
+        self.conn.commit()
+
+    @staticmethod
+    def file_digest(path=None, data=None):
+        digest = hashlib.sha1()
+        if data is not None:
+            digest.update(data)
+            return digest.hexdigest()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _stat(self, path):
+        stat = self._stats.get(path)
+        if stat is None:
+            st = os.stat(path)
+            stat = (st.st_size, st.st_mtime)
+            self._stats[path] = stat
+        return stat
+
+    def is_processed(self, path) -> bool:
+        with self._lock:
+            return self._is_processed(path)
+
+    def _is_processed(self, path):
+        row = self.conn.execute(
+            "SELECT FileSize, FileMtime, ContentHash, Outcome FROM ProcessedFiles WHERE FilePath = ?",
+            (path,)).fetchone()
+        if row is None or row[3] in ManifestSrv.retry_outcomes:
+            return False
+        size, mtime = self._stat(path)
+        if row[0] == size and row[1] == mtime:
+            self._stats.pop(path, None)
+            return True
+        if row[2] is None or row[0] != size:
+            return False
+
+        # touched but possibly unchanged: compare content before reprocessing
+        content_hash = ManifestSrv.file_digest(path)
+        if content_hash != row[2]:
+            return False
+        self.conn.execute("UPDATE ProcessedFiles SET FileMtime = ? WHERE FilePath = ?", (mtime, path))
+        self._stats.pop(path, None)
+        self._count_write()
+        return True
+
+    def archive_members(self, archive_path) -> dict:
+        # every recorded member of one archive: key -> (size, mtime, content hash, outcome)
+        prefix = ArchiveReader.member_key(archive_path, "")
+        rows = self.conn.execute(
+            "SELECT FilePath, FileSize, FileMtime, ContentHash, Outcome FROM ProcessedFiles "
+            "WHERE FilePath >= ? AND FilePath < ?", (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+        return {row[0]: row[1:] for row in rows}
+
+    def is_member_processed(self, archive_path, key, size, mtime, content_hash) -> bool:
+        # same rule as is_processed, for an archive member that has already been read; the
+        # rows of the current archive are loaded once when its first member comes along
+        if self._members[0] != archive_path:
+            with self._lock:
+                self._members = (archive_path, self.archive_members(archive_path))
+        row = self._members[1].get(key)
+        if row is None or row[3] in ManifestSrv.retry_outcomes:
+            return False
+        if row[0] == size and row[1] == mtime:
+            return True
+        return row[2] is not None and row[0] == size and content_hash == row[2]
+
+    def record(self, path, outcome, content_hash=None, stat=None):
+        with self._lock:
+            self._record(path, outcome, content_hash, stat)
+
+    def _record(self, path, outcome, content_hash=None, stat=None):
+        # stat: (size, mtime) for inputs that are not files on disk, such as archive members
+        try:
+            size, mtime = stat if stat is not None else self._stat(path)
+            if content_hash is None:
+                content_hash = ManifestSrv.file_digest(path)
+        except OSError:
+            # the file vanished; nothing to key the outcome on
+            return
+        finally:
+            self._stats.pop(path, None)
+        self.conn.execute("""
+            INSERT INTO ProcessedFiles (FilePath, FileSize, FileMtime, ContentHash, Outcome, ProcessedOn)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(FilePath) DO UPDATE SET
+                FileSize = excluded.FileSize, FileMtime = excluded.FileMtime,
+                ContentHash = excluded.ContentHash, Outcome = excluded.Outcome,
+                ProcessedOn = excluded.ProcessedOn""",
+            (path, size, mtime, content_hash, outcome, datetime.now().isoformat(timespec='seconds')))
+        self._count_write()
+
+    def _count_write(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self._commit()
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        if self.conn and self._uncommitted:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        with self._lock:
+            if self.conn:
+                self._commit()
+                self.conn.close()
+                self.conn = None
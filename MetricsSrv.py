@@ -0,0 +1,126 @@
+import json
+import heapq
+from bisect import bisect_left
+from time import perf_counter
+
+
+class StageTimer:
+    # Cheap lap timer: one perf_counter() call per stage boundary.
+    __slots__ = ("timings", "_last")
+
+    def __init__(self, timings=None):
+        self.timings = timings if timings is not None else {}
+        self._last = perf_counter()
+
+    def lap(self, stage):
+        now = perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "total", "min", "max")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        # upper bound of the bucket holding the q-th observation (exact max for the last bucket)
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": {("+Inf" if i == len(self.bounds) else str(self.bounds[i])): c
+                        for i, c in enumerate(self.counts)},
+        }
+
+
+class MetricsSrv:
+    """Run-wide aggregation of per-file stage timings and input sizes.
+
+    Stage timings come from ProcessDataSrv (via StageTimer), the pipeline reader and
+    SqlServerSrv. Everything is kept in fixed-bucket histograms plus a bounded heap of the
+    slowest files, so memory and per-file overhead stay constant over the run.
+    """
+
+    time_buckets = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+    size_buckets = [16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2]
+
+    def __init__(self, top_n=20):
+        self.top_n = top_n
+        self.stages = {}
+        self.file_sizes = Histogram(MetricsSrv.size_buckets)
+        self.file_times = Histogram(MetricsSrv.time_buckets)
+        self._slowest = []
+        self._seq = 0
+
+    def observe(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram(MetricsSrv.time_buckets)
+        histogram.observe(seconds)
+
+    def observe_file(self, path, size, timings):
+        total = 0.0
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+            total += seconds
+        self.file_times.observe(total)
+        if size is not None:
+            self.file_sizes.observe(size)
+
+        if self.top_n <= 0:
+            return
+        self._seq += 1
+        entry = (total, self._seq, path, size, dict(timings))
+        if len(self._slowest) < self.top_n:
+            heapq.heappush(self._slowest, entry)
+        elif total > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def summary(self):
+        return {
+            "files": self.file_times.count,
+            "file_seconds": self.file_times.to_dict(),
+            "file_bytes": self.file_sizes.to_dict(),
+            "stages": {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+            "slowest_files": [
+                {"path": path, "bytes": size, "seconds": round(total, 6),
+                 "stages": {stage: round(seconds, 6) for stage, seconds in timings.items()}}
+                for total, _, path, size, timings in sorted(self._slowest, reverse=True)
+            ],
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
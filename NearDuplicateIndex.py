@@ -0,0 +1,225 @@
+import re
+import sqlite3
+import struct
+import hashlib
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class NearDuplicateMatch:
+    Path: str
+    ArticlesID: int
+    Similarity: float
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash/LSH index for near-duplicate articles (preprints, republished
+    versions, records with another or no DOI).
+
+    signature() runs in the worker: the cleaned abstract and body are cut into word
+    shingles, and one-permutation hashing keeps the smallest hash of each of `bins` bins,
+    with optimal densification filling the bins no shingle fell into. That is one hash per
+    shingle instead of one per shingle and permutation. The signature is 4 bytes per bin.
+
+    The index is a local SQLite file. Each signature is split into bands of `rows` values,
+    and every band is a bucket key, so query() only compares the articles sharing at least
+    one bucket. The similarity is the share of equal bins (estimated Jaccard). Rows are
+    chosen once, from the threshold the index is created with, and kept in the file;
+    articles are added incrementally across runs.
+    """
+
+    bins = 128
+    shingle_words = 5
+    # shorter texts get no signature: a few shared sentences would make them look alike
+    min_words = 50
+
+    _token = re.compile(r'\w+')
+    _donors = None
+
+    def __init__(self, db_path, threshold=0.8, commit_every=500):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.commit_every = commit_every
+        self.rows = 0
+        self.conn = None
+        self._uncommitted = 0
+
+    def open(self):
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS Meta (Name TEXT PRIMARY KEY, Value TEXT NOT NULL)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS Signatures (
+                DocId INTEGER PRIMARY KEY,
+                FilePath TEXT NOT NULL UNIQUE,
+                ArtDoi TEXT,
+                ArticlesID INTEGER,
+                Signature BLOB NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS IX_Signatures_ArticlesID ON Signatures (ArticlesID)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS Buckets (BucketKey INTEGER NOT NULL, DocId INTEGER NOT NULL, "
+                          "PRIMARY KEY (BucketKey, DocId)) WITHOUT ROWID")
+        row = self.conn.execute("SELECT Value FROM Meta WHERE Name = 'rows'").fetchone()
+        if row:
+            self.rows = int(row[0])
+        else:
+            self.rows = NearDuplicateIndex.rows_for(self.threshold)
+            self.conn.executemany("INSERT INTO Meta (Name, Value) VALUES (?, ?)",
+                                  [("rows", str(self.rows)), ("bins", str(NearDuplicateIndex.bins))])
+        self.conn.commit()
+
+    @staticmethod
+    def rows_for(threshold: float) -> int:
+        # the most rows per band whose LSH threshold (1/bands)^(1/rows) is still at or below
+        # threshold, so pairs at the threshold become candidates with high probability
+        rows = 1
+        for candidate in (1, 2, 4, 8, 16, 32, 64):
+            bands = NearDuplicateIndex.bins // candidate
+            if (1 / bands) ** (1 / candidate) <= threshold:
+                rows = candidate
+        return rows
+
+    @staticmethod
+    def _hash(data: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+    @staticmethod
+    def signature(text: str) -> bytes:
+        """OPH MinHash of text, b"" when it has fewer than min_words words."""
+        tokens = NearDuplicateIndex._token.findall(text.lower())
+        if len(tokens) < NearDuplicateIndex.min_words:
+            return b""
+        bins = NearDuplicateIndex.bins
+        shift = 64 - (bins.bit_length() - 1)
+        width = NearDuplicateIndex.shingle_words
+        minima = [None] * bins
+        for start in range(len(tokens) - width + 1):
+            value = NearDuplicateIndex._hash(" ".join(tokens[start:start + width]).encode("utf-8"))
+            index = value >> shift
+            value = (value >> (shift - 32)) & 0xFFFFFFFF
+            if minima[index] is None or value < minima[index]:
+                minima[index] = value
+        return struct.pack(f"<{bins}I", *NearDuplicateIndex._densify(minima))
+
+    @staticmethod
+    def _densify(minima: list) -> list:
+        # optimal densification: an empty bin copies the bin picked by its own sequence of
+        # hashes, so two documents fill the same empty bin from the same donor
+        if NearDuplicateIndex._donors is None:
+            bins = len(minima)
+            NearDuplicateIndex._donors = [
+                [NearDuplicateIndex._hash(struct.pack("<II", index, attempt)) % bins for attempt in range(1, 4 * bins)]
+                for index in range(bins)]
+        filled = list(minima)
+        for index, value in enumerate(minima):
+            if value is not None:
+                continue
+            for donor in NearDuplicateIndex._donors[index]:
+                if minima[donor] is not None:
+                    filled[index] = minima[donor]
+                    break
+            else:
+                # practically unreachable with more than a couple of shingles
+                filled[index] = next(value for value in minima[index:] + minima[:index] if value is not None)
+        return filled
+
+    @staticmethod
+    def similarity(a: bytes, b: bytes) -> float:
+        bins = NearDuplicateIndex.bins
+        values_a = struct.unpack(f"<{bins}I", a)
+        values_b = struct.unpack(f"<{bins}I", b)
+        return sum(1 for x, y in zip(values_a, values_b) if x == y) / bins
+
+    def _bucket_keys(self, signature: bytes) -> list:
+        band_bytes = self.rows * 4
+        keys = []
+        for band, start in enumerate(range(0, len(signature), band_bytes)):
+            digest = hashlib.blake2b(bytes((band,)) + signature[start:start + band_bytes], digest_size=8).digest()
+            keys.append(int.from_bytes(digest, 'little', signed=True))
+        return keys
+
+    def query(self, signature: bytes, path: str = None, doi: str = None):
+        """The most similar indexed article at or above threshold, or None. Entries for the same
+        file and articles with the same DOI (exact duplicates, revisions) are not matches."""
+        keys = self._bucket_keys(signature)
+        doc_ids = [row[0] for row in self.conn.execute(
+            f"SELECT DISTINCT DocId FROM Buckets WHERE BucketKey IN ({', '.join('?' * len(keys))})", keys)]
+        best = None
+        for start in range(0, len(doc_ids), 500):
+            chunk = doc_ids[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT FilePath, ArtDoi, ArticlesID, Signature FROM Signatures "
+                f"WHERE DocId IN ({', '.join('?' * len(chunk))})", chunk)
+            for other_path, other_doi, article_id, other in rows:
+                if other_path == path or (doi and other_doi == doi):
+                    continue
+                similarity = NearDuplicateIndex.similarity(signature, other)
+                if similarity >= self.threshold and (best is None or similarity > best.Similarity):
+                    best = NearDuplicateMatch(other_path, article_id, similarity)
+        return best
+
+    def add(self, path, doi, signature):
+        # replaces an earlier entry of the same file, keeping its ArticlesID; new files get
+        # theirs with set_article_id once stored
+        row = self.conn.execute("SELECT ArticlesID FROM Signatures WHERE FilePath = ?", (path,)).fetchone()
+        self.discard(path)
+        cursor = self.conn.execute(
+            "INSERT INTO Signatures (FilePath, ArtDoi, ArticlesID, Signature) VALUES (?, ?, ?, ?)",
+            (path, doi or None, row[0] if row else None, signature))
+        doc_id = cursor.lastrowid
+        self.conn.executemany("INSERT OR IGNORE INTO Buckets (BucketKey, DocId) VALUES (?, ?)",
+                              [(key, doc_id) for key in self._bucket_keys(signature)])
+        self._count_write()
+
+    def set_article_id(self, path, article_id):
+        self.conn.execute("UPDATE Signatures SET ArticlesID = ? WHERE FilePath = ?", (article_id, path))
+        self._count_write()
+
+    def discard_pending(self, path):
+        # an added file that was not stored (error, DOI already stored); entries of stored files stay
+        row = self.conn.execute("SELECT ArticlesID FROM Signatures WHERE FilePath = ?", (path,)).fetchone()
+        if row is not None and row[0] is None:
+            self.discard(path)
+
+    def discard(self, path):
+        rows = self.conn.execute("SELECT DocId, Signature FROM Signatures WHERE FilePath = ?", (path,)).fetchall()
+        if rows:
+            self._delete(rows)
+            self._count_write()
+
+    def remove_articles(self, article_ids, ids_per_statement=500):
+        # stored articles that were deleted (--reclassify) must not match later articles
+        article_ids = list(article_ids)
+        for start in range(0, len(article_ids), ids_per_statement):
+            chunk = article_ids[start:start + ids_per_statement]
+            self._delete(self.conn.execute(
+                f"SELECT DocId, Signature FROM Signatures WHERE ArticlesID IN ({', '.join('?' * len(chunk))})",
+                chunk).fetchall())
+        self._uncommitted += 1
+        self.commit()
+
+    def _delete(self, rows):
+        # (DocId, Signature) rows: the entries and their buckets
+        self.conn.executemany("DELETE FROM Buckets WHERE BucketKey = ? AND DocId = ?",
+                              [(key, doc_id) for doc_id, signature in rows for key in self._bucket_keys(signature)])
+        self.conn.executemany("DELETE FROM Signatures WHERE DocId = ?", [(doc_id,) for doc_id, _ in rows])
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM Signatures").fetchone()[0]
+
+    def _count_write(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        if self.conn and self._uncommitted:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        if self.conn:
+            self.commit()
+            self.conn.close()
+            self.conn = None
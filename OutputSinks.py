@@ -0,0 +1,506 @@
+import os
+import re
+import json
+import sqlite3
+from datetime import datetime
+from time import perf_counter
+from DuplicateIndex import DuplicateIndex
+
+
+# InsertData parameters, in the order of SqlServerSrv._article_params
+ARTICLE_COLUMNS = [
+    ("ArtTitle", "string"), ("PubDate", "timestamp"), ("ArtLanguage", "string"), ("Pmid", "int64"),
+    ("BankId", "int64"), ("BankNo", "int32"), ("ArtDoi", "string"), ("ArtType", "string"),
+    ("JournalTitle", "string"), ("JournalAbbrev", "string"), ("ArtPublisher", "string"),
+    ("ArtVolume", "string"), ("ArtIssue", "string"), ("ArtFpage", "string"), ("ArtPageRange", "string"),
+    ("ArtAuthors", "string"), ("ArtKeywords", "string"), ("ArtPdfLink", "string"), ("ArtFileName", "string"),
+    ("CorrEmail", "string"), ("ArtAbstract", "string"), ("ArtBody", "string"), ("MeshTerms", "string"),
+    ("ArtReferences", "string"), ("ArtAffiliations", "string"), ("OrcidIds", "string"),
+    ("FundingGrant", "string"), ("FundingId", "string"), ("EthicsStatement", "string"),
+    ("CorrespondingAuthor", "string"), ("ArtLicense", "string"), ("PubHistory", "string"),
+    ("CustomMeta", "string"),
+]
+
+REFERENCE_COLUMNS = [
+    ("ArticlesID", "int64"), ("Seq", "int32"), ("RefText", "string"), ("Doi", "string"), ("Pmid", "int64"),
+    ("RefYear", "int32"), ("Source", "string"), ("Title", "string"),
+]
+
+
+class ShardWriter:
+    """Append-only, rotating JSONL or Parquet shards.
+
+    A shard is written as <prefix>-NNNNN.<ext>.part and renamed to <prefix>-NNNNN.<ext> once
+    it holds shard_rows rows (or on close), so a consumer can read every shard without the
+    .part suffix while the run is still going. Parquet needs pyarrow, imported on first use.
+
+    A writer on a folder that already holds shards continues after the highest number, so a
+    later run never replaces an earlier one. A JSONL .part left by an interrupted run is kept
+    up to its last complete line and renamed; a Parquet .part has no footer and is left alone.
+    """
+
+    parquet_flush_rows = 5000
+
+    def __init__(self, folder, prefix, columns, file_format="jsonl", shard_rows=50000):
+        if file_format not in ("jsonl", "parquet"):
+            raise ValueError(f"Unknown shard format: {file_format}")
+        self._pa = None
+        self._schema = None
+        if file_format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Parquet output needs pyarrow (pip install pyarrow)")
+            types = {
+                "string": pyarrow.string(), "int64": pyarrow.int64(), "int32": pyarrow.int32(),
+                "bool": pyarrow.bool_(), "timestamp": pyarrow.timestamp("us"),
+                "list<string>": pyarrow.list_(pyarrow.string()),
+            }
+            self._pa = pyarrow
+            self._schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.prefix = prefix
+        self.file_format = file_format
+        self.shard_rows = max(1, shard_rows)
+        self.existing = []
+        self.shard = self._scan_existing()
+        self.first_shard = self.shard
+        self.rows_in_shard = 0
+        self.total_rows = 0
+        self._file = None
+        self._path = None
+        self._pending = []
+
+    @property
+    def shards(self):
+        # shards started by this writer
+        return self.shard - self.first_shard
+
+    def _scan_existing(self) -> int:
+        pattern = re.compile(rf"{re.escape(self.prefix)}-(\d+)\.{self.file_format}(\.part)?")
+        last = 0
+        for name in sorted(os.listdir(self.folder)):
+            match = pattern.fullmatch(name)
+            if match is None:
+                continue
+            last = max(last, int(match.group(1)))
+            path = os.path.join(self.folder, name)
+            if match.group(2) and self.file_format == "jsonl":
+                with open(path, "rb+") as part:
+                    data = part.read()
+                    part.truncate(data.rfind(b"\n") + 1)
+                path = path[:-len(".part")]
+                os.replace(path + ".part", path)
+            elif match.group(2):
+                continue
+            self.existing.append(path)
+        self.existing.sort()
+        return last
+
+    def read_existing(self, columns):
+        """The given columns of every row in the shards found on disk, as dicts."""
+        for path in self.existing:
+            if self.file_format == "jsonl":
+                with open(path, encoding="utf-8") as shard:
+                    for line in shard:
+                        row = json.loads(line)
+                        yield {name: row.get(name) for name in columns}
+            else:
+                import pyarrow.parquet
+                yield from pyarrow.parquet.read_table(path, columns=columns).to_pylist()
+
+    def write(self, row: dict):
+        if self._file is None:
+            self._open_shard()
+        if self.file_format == "jsonl":
+            self._file.write(json.dumps(row, ensure_ascii=False, default=ShardWriter._json_value) + "\n")
+        else:
+            self._pending.append(row)
+            if len(self._pending) >= ShardWriter.parquet_flush_rows:
+                self._flush_parquet()
+        self.rows_in_shard += 1
+        self.total_rows += 1
+        if self.rows_in_shard >= self.shard_rows:
+            self._close_shard()
+
+    @staticmethod
+    def _json_value(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+    def _open_shard(self):
+        self.shard += 1
+        self.rows_in_shard = 0
+        self._path = os.path.join(self.folder, f"{self.prefix}-{self.shard:05d}.{self.file_format}")
+        if self.file_format == "jsonl":
+            self._file = open(self._path + ".part", "w", encoding="utf-8")
+        else:
+            import pyarrow.parquet
+            self._file = pyarrow.parquet.ParquetWriter(self._path + ".part", self._schema)
+
+    def _flush_parquet(self):
+        if self._pending:
+            self._file.write_table(self._pa.Table.from_pylist(self._pending, schema=self._schema))
+            self._pending = []
+
+    def _close_shard(self):
+        if self._file is None:
+            return
+        if self.file_format == "parquet":
+            self._flush_parquet()
+        self._file.close()
+        os.replace(self._path + ".part", self._path)
+        self._file = None
+
+    def flush(self):
+        # Parquet rows stay buffered until a full row group or the end of the shard
+        if self._file is not None and self.file_format == "jsonl":
+            self._file.flush()
+
+    def close(self):
+        self._close_shard()
+
+
+class OutputSink:
+    """Where Main writes accepted articles.
+
+    write_batch returns one outcome per article, in order: the new ArticlesID, -1 when the
+    DOI is already stored (InsertData's duplicate rule), None when nothing was returned, or
+    an Exception for that article. write_references takes (ArticlesID, ReferenceModel) pairs.
+    """
+
+    name = "sink"
+
+    def __init__(self):
+        # optional MetricsSrv; receives the time of every write
+        self.metrics = None
+
+    def open(self):
+        pass
+
+    def write_batch(self, articles) -> list:
+        if not articles:
+            return []
+        started = perf_counter()
+        results = self._write_batch(articles)
+        if self.metrics is not None:
+            elapsed = perf_counter() - started
+            self.metrics.observe("db_batch", elapsed)
+            self.metrics.observe("db_article", elapsed / len(articles))
+        return results
+
+    def write_references(self, rows):
+        if not rows:
+            return
+        started = perf_counter()
+        self._write_references(rows)
+        if self.metrics is not None:
+            self.metrics.observe("db_references", perf_counter() - started)
+
+    def load_duplicate_index(self) -> DuplicateIndex:
+        return DuplicateIndex()
+
+    def delete_articles(self, article_ids):
+        # used by --reclassify for articles that became NonTarget
+        raise NotImplementedError(f"The {self.name} sink cannot remove stored articles")
+
+    # --update-revised: articles whose DOI is already stored are compared by FieldHashes and
+    # only their changed columns are written
+
+    def load_field_hashes(self, dois) -> dict:
+        # {DOI: (ArticlesID, {column: hash} or None when none are stored)} for the stored DOIs
+        raise NotImplementedError(f"The {self.name} sink cannot update stored articles")
+
+    def update_articles(self, updates):
+        # (ArticlesID, {column: value}) pairs; only the given columns are sent
+        if not updates:
+            return
+        started = perf_counter()
+        self._update_articles(updates)
+        if self.metrics is not None:
+            self.metrics.observe("db_update", perf_counter() - started)
+
+    def write_field_hashes(self, rows):
+        # (ArticlesID, {column: hash}) pairs, replacing what is stored for those articles
+        raise NotImplementedError(f"The {self.name} sink cannot update stored articles")
+
+    def replace_references(self, article_ids, rows):
+        self._delete_references(article_ids)
+        self.write_references(rows)
+
+    def _update_articles(self, updates):
+        raise NotImplementedError(f"The {self.name} sink cannot update stored articles")
+
+    def _delete_references(self, article_ids):
+        raise NotImplementedError(f"The {self.name} sink cannot update stored articles")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _write_batch(self, articles) -> list:
+        raise NotImplementedError
+
+    def _write_references(self, rows):
+        raise NotImplementedError
+
+    @staticmethod
+    def article_row(article) -> dict:
+        return {name: getattr(article, name) for name, _ in ARTICLE_COLUMNS}
+
+    @staticmethod
+    def reference_row(article_id, ref) -> dict:
+        return {"ArticlesID": article_id, "Seq": ref.Seq, "RefText": ref.RefText, "Doi": ref.Doi or None,
+                "Pmid": ref.Pmid, "RefYear": ref.RefYear, "Source": ref.Source or None,
+                "Title": ref.Title or None}
+
+
+class SqlServerSink(OutputSink):
+    # the production path: InsertData through a SqlServerSrv
+    name = "sqlserver"
+
+    def __init__(self, db, sp_name="InsertData", articles_table="Articles", refs_table=None, hashes_table=None):
+        super().__init__()
+        self.db = db
+        self.sp_name = sp_name
+        self.articles_table = articles_table
+        self.refs_table = refs_table
+        self.hashes_table = hashes_table
+
+    def open(self):
+        self.db.connect()
+        if self.refs_table:
+            self.db.ensure_references_table(self.refs_table)
+        if self.hashes_table:
+            self.db.ensure_field_hashes_table(self.hashes_table)
+
+    def _write_batch(self, articles) -> list:
+        return self.db.insert_batch_with_stored_procedure(self.sp_name, articles)
+
+    def _write_references(self, rows):
+        self.db.insert_references(rows, self.refs_table)
+
+    def load_duplicate_index(self) -> DuplicateIndex:
+        return self.db.load_duplicate_index(self.articles_table)
+
+    def delete_articles(self, article_ids):
+        self.db.delete_articles(article_ids, self.articles_table, self.refs_table)
+        if self.hashes_table:
+            self.db.delete_field_hashes(article_ids, self.hashes_table)
+
+    def load_field_hashes(self, dois) -> dict:
+        return self.db.load_field_hashes(dois, self.articles_table, self.hashes_table)
+
+    def _update_articles(self, updates):
+        self.db.update_articles(updates, self.articles_table)
+
+    def write_field_hashes(self, rows):
+        self.db.write_field_hashes(rows, self.hashes_table)
+
+    def _delete_references(self, article_ids):
+        self.db.delete_references(article_ids, self.refs_table)
+
+    def close(self):
+        self.db.close()
+
+
+class SqliteSink(OutputSink):
+    """Embedded stand-in for SQL Server: same columns, same duplicate-DOI rule, no server.
+
+    One transaction per batch, in WAL mode. An article whose non-empty DOI is already stored
+    gets -1 and is not inserted, as with InsertData.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, articles_table="Articles", refs_table="ArticleReferences", hashes_table=None):
+        super().__init__()
+        self.path = path
+        self.articles_table = articles_table
+        self.refs_table = refs_table
+        self.hashes_table = hashes_table
+        self.conn = None
+
+    def open(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        kinds = {"string": "TEXT", "timestamp": "TEXT", "int64": "INTEGER", "int32": "INTEGER"}
+        columns = ", ".join(f"{name} {kinds[kind]}" for name, kind in ARTICLE_COLUMNS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.articles_table} "
+                          f"(ArticlesID INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS IX_{self.articles_table}_ArtDoi "
+                          f"ON {self.articles_table} (ArtDoi)")
+        columns = ", ".join(f"{name} {kinds[kind]}" for name, kind in REFERENCE_COLUMNS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.refs_table} ({columns}, "
+                          f"PRIMARY KEY (ArticlesID, Seq))")
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS IX_{self.refs_table}_Doi ON {self.refs_table} (Doi)")
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS IX_{self.refs_table}_Pmid ON {self.refs_table} (Pmid)")
+        if self.hashes_table:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.hashes_table} "
+                              f"(ArticlesID INTEGER PRIMARY KEY, FieldHashes TEXT NOT NULL)")
+        self.conn.commit()
+
+    def _write_batch(self, articles) -> list:
+        names = [name for name, _ in ARTICLE_COLUMNS]
+        insert = (f"INSERT INTO {self.articles_table} ({', '.join(names)}) "
+                  f"VALUES ({', '.join('?' * len(names))})")
+        exists = f"SELECT 1 FROM {self.articles_table} WHERE ArtDoi = ? LIMIT 1"
+        results = []
+        cursor = self.conn.cursor()
+        try:
+            for article in articles:
+                try:
+                    if article.ArtDoi and cursor.execute(exists, (article.ArtDoi,)).fetchone():
+                        results.append(-1)
+                        continue
+                    params = [getattr(article, name) for name in names]
+                    params[1] = article.PubDate.isoformat() if article.PubDate else None
+                    cursor.execute(insert, params)
+                    results.append(cursor.lastrowid)
+                except sqlite3.Error as e:
+                    results.append(e)
+            self.conn.commit()
+        finally:
+            cursor.close()
+        return results
+
+    def _write_references(self, rows):
+        names = [name for name, _ in REFERENCE_COLUMNS]
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO {self.refs_table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            [tuple(OutputSink.reference_row(article_id, ref).values()) for article_id, ref in rows])
+        self.conn.commit()
+
+    def load_duplicate_index(self) -> DuplicateIndex:
+        index = DuplicateIndex()
+        for doi, pmid, bank_id in self.conn.execute(f"SELECT ArtDoi, Pmid, BankId FROM {self.articles_table}"):
+            index.add(doi, pmid, bank_id)
+        return index
+
+    def delete_articles(self, article_ids):
+        params = [(article_id,) for article_id in article_ids]
+        self.conn.executemany(f"DELETE FROM {self.refs_table} WHERE ArticlesID = ?", params)
+        self.conn.executemany(f"DELETE FROM {self.articles_table} WHERE ArticlesID = ?", params)
+        if self.hashes_table:
+            self.conn.executemany(f"DELETE FROM {self.hashes_table} WHERE ArticlesID = ?", params)
+        self.conn.commit()
+
+    def load_field_hashes(self, dois) -> dict:
+        stored = {}
+        dois = list(dict.fromkeys(doi for doi in dois if doi))
+        for start in range(0, len(dois), 500):
+            chunk = dois[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT a.ArtDoi, a.ArticlesID, h.FieldHashes FROM {self.articles_table} a "
+                f"LEFT JOIN {self.hashes_table} h ON h.ArticlesID = a.ArticlesID "
+                f"WHERE a.ArtDoi IN ({', '.join('?' * len(chunk))}) ORDER BY a.ArticlesID", chunk)
+            for doi, article_id, hashes in rows:
+                stored.setdefault(doi, (article_id, json.loads(hashes) if hashes else None))
+        return stored
+
+    def _update_articles(self, updates):
+        try:
+            for article_id, columns in updates:
+                params = [value.isoformat() if isinstance(value, datetime) else value for value in columns.values()]
+                self.conn.execute(f"UPDATE {self.articles_table} SET {', '.join(f'{name} = ?' for name in columns)} "
+                                  f"WHERE ArticlesID = ?", params + [article_id])
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def write_field_hashes(self, rows):
+        if not rows:
+            return
+        self.conn.executemany(f"INSERT OR REPLACE INTO {self.hashes_table} (ArticlesID, FieldHashes) VALUES (?, ?)",
+                              [(article_id, json.dumps(hashes, separators=(",", ":"))) for article_id, hashes in rows])
+        self.conn.commit()
+
+    def _delete_references(self, article_ids):
+        self.conn.executemany(f"DELETE FROM {self.refs_table} WHERE ArticlesID = ?",
+                              [(article_id,) for article_id in article_ids])
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class FileSink(OutputSink):
+    """Articles (and references) as rotating JSONL or Parquet shards.
+
+    Ids are assigned in write order, and a DOI already written gets -1, so the counters of a
+    file run match a database run. A folder with shards of earlier runs is appended to: ids
+    continue after the highest stored one and their DOIs count as written.
+    """
+
+    def __init__(self, folder, file_format, shard_rows=10000):
+        super().__init__()
+        self.name = file_format
+        self.folder = folder
+        self.file_format = file_format
+        self.shard_rows = shard_rows
+        self._articles = None
+        self._references = None
+        self._dois = set()
+        self._next_id = 1
+
+    def open(self):
+        self._articles = ShardWriter(self.folder, "articles", [("ArticlesID", "int64")] + ARTICLE_COLUMNS,
+                                     self.file_format, self.shard_rows)
+        for row in self._articles.read_existing(["ArticlesID", "ArtDoi"]):
+            self._next_id = max(self._next_id, row["ArticlesID"] + 1)
+            if row["ArtDoi"]:
+                self._dois.add(row["ArtDoi"])
+
+    def load_duplicate_index(self) -> DuplicateIndex:
+        index = DuplicateIndex()
+        for row in self._articles.read_existing(["ArtDoi", "Pmid", "BankId"]):
+            index.add(row["ArtDoi"], row["Pmid"], row["BankId"])
+        return index
+
+    def _write_batch(self, articles) -> list:
+        results = []
+        for article in articles:
+            if article.ArtDoi and article.ArtDoi in self._dois:
+                results.append(-1)
+                continue
+            try:
+                row = {"ArticlesID": self._next_id}
+                row.update(OutputSink.article_row(article))
+                self._articles.write(row)
+            except Exception as e:
+                results.append(e)
+                continue
+            if article.ArtDoi:
+                self._dois.add(article.ArtDoi)
+            results.append(self._next_id)
+            self._next_id += 1
+        return results
+
+    def _write_references(self, rows):
+        if self._references is None:
+            self._references = ShardWriter(self.folder, "references", REFERENCE_COLUMNS, self.file_format,
+                                           self.shard_rows * 50)
+        for article_id, ref in rows:
+            self._references.write(OutputSink.reference_row(article_id, ref))
+
+    def flush(self):
+        for writer in (self._articles, self._references):
+            if writer is not None:
+                writer.flush()
+
+    def close(self):
+        for writer in (self._articles, self._references):
+            if writer is not None:
+                writer.close()
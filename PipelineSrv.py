@@ -0,0 +1,214 @@
+import os
+import queue
+import hashlib
+import threading
+from time import perf_counter
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from ProcessDataSrv import ProcessDataSrv
+from ArchiveReader import ArchiveReader
+
+# stat is (size, mtime) for archive members, which the manifest cannot os.stat(); None for files
+PipelineResult = namedtuple("PipelineResult", ["index", "path", "article", "error", "content_hash", "size", "timings",
+                                               "stat"])
+
+_END = object()
+
+
+class _StageFailure:
+    def __init__(self, error):
+        self.error = error
+
+
+def _read_file(path, limit=0):
+    # with a per-file budget only one byte more than the budget is kept, which is enough for
+    # ProcessDataSrv to skip or truncate the file; the rest is only streamed through the hash,
+    # since the manifest compares it with the hash of the whole file
+    started = perf_counter()
+    with open(path, 'rb') as f:
+        data = f.read(limit + 1) if limit else f.read()
+        digest = hashlib.sha1(data)
+        if limit and len(data) > limit:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    read_seconds = perf_counter() - started
+    return data, digest.hexdigest(), read_seconds
+
+
+def _process_timed(data, file_name):
+    # runs in the worker process; the stage timings travel back with the article
+    timings = {}
+    article = ProcessDataSrv.process_bytes(data, file_name, timings)
+    return article, timings
+
+
+class IngestPipeline:
+    """Reader -> parser -> writer pipeline connected by bounded queues.
+
+    Reader threads prefetch file bytes (network I/O), the parse stage runs
+    ProcessDataSrv.process_bytes inline or in a process pool (CPU), and the caller
+    iterates the results in input order as the writer (database I/O). Every queue is
+    bounded, so a slow stage blocks the stages in front of it instead of buffering the
+    corpus in memory.
+
+    paths may be any iterable, including a lazy discovery generator; it is consumed by the
+    reader stage. skip_file(path), when given, drops files that were already processed
+    before they are read.
+
+    A path may also be a tar/tar.gz/zip package (see ArchiveReader). Its XML members are
+    streamed in archive order by the reader stage; skip_member(archive_path, key, size,
+    mtime, content_hash), when given, drops members that were already processed.
+    """
+
+    def __init__(self, paths, workers=0, readers=4, read_ahead=32, max_in_flight=0, settings=None,
+                 skip_file=None, skip_member=None):
+        self.paths = paths
+        self.skip_file = skip_file
+        self.skip_member = skip_member
+        self.skipped_files = 0
+        self.skipped_members = 0
+        self.workers = workers
+        self.readers = max(1, readers)
+        self.max_in_flight = max_in_flight or max(1, workers) * 4
+        self.settings = settings or {}
+        self.read_queue = queue.Queue(maxsize=max(1, read_ahead))
+        self.result_queue = queue.Queue(maxsize=self.max_in_flight)
+        self._reading = 0
+        self._parsing = 0
+
+    def queue_depths(self):
+        return {
+            "reading": self._reading,
+            "read_queue": self.read_queue.qsize(),
+            "parsing": self._parsing,
+            "write_queue": self.result_queue.qsize(),
+        }
+
+    def __iter__(self):
+        threading.Thread(target=self._run_stage, args=(self._read_stage, self.read_queue),
+                         name="pipeline-reader", daemon=True).start()
+        threading.Thread(target=self._run_stage, args=(self._parse_stage, self.result_queue),
+                         name="pipeline-parser", daemon=True).start()
+        while True:
+            item = self.result_queue.get()
+            if item is _END:
+                return
+            if isinstance(item, _StageFailure):
+                raise item.error
+            yield item
+
+    @staticmethod
+    def _run_stage(stage, output):
+        try:
+            stage()
+        except Exception as e:
+            output.put(_StageFailure(e))
+        output.put(_END)
+
+    def _read_stage(self):
+        with ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="pipeline-read") as pool:
+            pending = deque()
+            index = 0
+            for path in self.paths:
+                if ArchiveReader.is_archive(path):
+                    # keep input order: everything read before the archive goes first
+                    while pending:
+                        self.read_queue.put(IngestPipeline._resolve_read(pending.popleft()))
+                    self._reading = 0
+                    index = self._read_archive(path, index)
+                    continue
+                if self.skip_file is not None and self.skip_file(path):
+                    self.skipped_files += 1
+                    continue
+                index += 1
+                pending.append((index, path, pool.submit(_read_file, path, self.settings.get("max_file_bytes", 0))))
+                self._reading = len(pending)
+                if len(pending) >= self.readers * 2:
+                    self.read_queue.put(IngestPipeline._resolve_read(pending.popleft()))
+            while pending:
+                self.read_queue.put(IngestPipeline._resolve_read(pending.popleft()))
+                self._reading = len(pending)
+
+    def _read_archive(self, archive_path, index):
+        members = ArchiveReader.iter_members(archive_path, self.settings.get("max_file_bytes", 0))
+        while True:
+            started = perf_counter()
+            try:
+                name, size, mtime, data, content_hash = next(members)
+            except StopIteration:
+                return index
+            except Exception as e:
+                # unreadable or truncated archive: report it once and go on with the next input
+                index += 1
+                self.read_queue.put((index, archive_path, os.path.basename(archive_path), None, e, None, {}, None))
+                return index
+            read_seconds = perf_counter() - started
+            key = ArchiveReader.member_key(archive_path, name)
+            if self.skip_member is not None and self.skip_member(archive_path, key, size, mtime, content_hash):
+                self.skipped_members += 1
+                continue
+            index += 1
+            # the member path, so members with the same file name in different folders stay apart
+            self.read_queue.put((index, key, name, data, None, content_hash, {"read": read_seconds}, (size, mtime)))
+
+    @staticmethod
+    def _resolve_read(item):
+        index, path, future = item
+        try:
+            data, content_hash, read_seconds = future.result()
+            return index, path, os.path.basename(path), data, None, content_hash, {"read": read_seconds}, None
+        except Exception as e:
+            return index, path, os.path.basename(path), None, e, None, {}, None
+
+    def _next_read(self):
+        item = self.read_queue.get()
+        if isinstance(item, _StageFailure):
+            raise item.error
+        return item
+
+    def _parse_stage(self):
+        if self.workers <= 0:
+            self._parse_inline()
+        else:
+            self._parse_pooled()
+
+    def _parse_inline(self):
+        while (item := self._next_read()) is not _END:
+            index, path, name, data, error, content_hash, timings, stat = item
+            self._parsing = 1
+            article = None
+            if error is None:
+                article = ProcessDataSrv.process_bytes(data, name, timings)
+            self._parsing = 0
+            size = len(data) if data is not None else None
+            self.result_queue.put(PipelineResult(index, path, article, error, content_hash, size, timings, stat))
+
+    def _parse_pooled(self):
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=ProcessDataSrv.configure,
+                                 initargs=(self.settings,)) as pool:
+            pending = deque()
+            while (item := self._next_read()) is not _END:
+                index, path, name, data, error, content_hash, timings, stat = item
+                future = None
+                if error is None:
+                    future = pool.submit(_process_timed, data, name)
+                size = len(data) if data is not None else None
+                pending.append((index, path, future, error, content_hash, size, timings, stat))
+                self._parsing = len(pending)
+                if len(pending) >= self.max_in_flight:
+                    self.result_queue.put(IngestPipeline._resolve_parse(pending.popleft()))
+            while pending:
+                self.result_queue.put(IngestPipeline._resolve_parse(pending.popleft()))
+                self._parsing = len(pending)
+
+    @staticmethod
+    def _resolve_parse(item):
+        index, path, future, error, content_hash, size, timings, stat = item
+        article = None
+        if future is not None:
+            try:
+                article, worker_timings = future.result()
+                timings.update(worker_timings)
+            except Exception as e:
+                error = e
+        return PipelineResult(index, path, article, error, content_hash, size, timings, stat)
@@ -1,11 +1,20 @@
+import io
 import os
 import re
+import json
+import hashlib
 from lxml import etree
-from unstructured.cleaners.core import clean, clean_extra_whitespace
 from datetime import datetime
-from difflib import SequenceMatcher
 from ArticleModel import ArticleModel
-import copy
+from ArticleVerdict import ArticleVerdict
+from ReferenceModel import ReferenceModel
+from KeywordMatcher import KeywordMatcher, KeywordHits
+from FuzzyKeywordIndex import FuzzyKeywordIndex
+from MetricsSrv import StageTimer
+from TextCleaner import TextCleaner
+from ClassificationCache import ClassificationCache
+from FieldHasher import FieldHasher
+from NearDuplicateIndex import NearDuplicateIndex
 
 class ProcessDataSrv:
     ref_stop_pattern = r'\n\s*(references|reference list|bibliography|literature cited|acknowledgments)\s*\n'
@@ -41,265 +50,594 @@ class ProcessDataSrv:
     general_words = ["patient", "patients", "tissue", "tissues"]
     human_breast_cells = ["mcf-7", "mcf7", "mda-mb-231", "t47d", "sk-br-3", "bt-474"]
     animal_breast_cells = ["4t1", "e0771", "mmt", "mtln3"]
+    # body subtrees that never contribute text (skipped together with their tail text)
+    body_excluded_tags = {"ref-list", "ref", "table-wrap", "fig", "ack", "notes", "formula", "inline-formula",
+                          "glossary", "app-group"}
+    body_excluded_sec_types = {"ref-list", "fn-group", "supplementary-material", "ack", "COI-statement",
+                               "author-contribution", "data-availability"}
+    body_excluded_sec_ids = ("ack", "competing", "con")
+    # typo-tolerant matching of the human, animal and cell line lists: maximum edit distance
+    # (0 = exact matching only) and the shortest keyword that may be matched fuzzily
+    fuzzy_distance = 0
+    fuzzy_min_length = 7
+    # real words one edit away from a fuzzily matched keyword; they only ever match exactly
+    fuzzy_exact_words = ["paternal", "material", "patent", "thicken", "caprice", "porcini"]
+    # built once from the lists above on first use
+    _matcher = None
+    # optional DuplicateIndex of keys already stored; see configure()
+    duplicate_index = None
+    # optional ChunkExporter.Chunker; when set, target articles carry embedding-ready Chunks
+    chunker = None
+    # when True every result carries its packed filter inputs (FilterZone) for ClassificationCache
+    keep_filter_zone = False
+    # when True target articles carry per-column content hashes (FieldHashes) for --update-revised
+    field_hashes = False
+    # when True target articles carry a MinHash signature of abstract and body for NearDuplicateIndex
+    minhash = False
+    # per-file budget in bytes (0 = none). Larger files are skipped, or with oversize_mode
+    # "truncate" parsed only up to the budget (recover=True closes the open elements).
+    max_file_bytes = 0
+    oversize_mode = "skip"
+    # lift libxml2's limits (10 MB text nodes, nesting depth 256); otherwise a file that hits
+    # them is cut off at that point and marked Truncated = "parser_limit"
+    huge_tree = False
 
     @staticmethod
-    def process_file(file_path: str) -> ArticleModel:
+    def configure(settings: dict):
+        # Sets class-level options. Also used as the worker-process initializer, since
+        # class attributes set in the parent are not inherited by spawned workers.
+        for name, value in settings.items():
+            if not hasattr(ProcessDataSrv, name):
+                raise AttributeError(f"Unknown ProcessDataSrv setting: {name}")
+            setattr(ProcessDataSrv, name, value)
+
+    @staticmethod
+    def process_file(file_path: str, timings: dict = None) -> ArticleModel | ArticleVerdict:
+        # timings, when given, receives the wall time of each stage in seconds.
+        # Rejected files (NonTarget, known duplicate) come back as a small ArticleVerdict.
 
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         try:
-            parser = etree.XMLParser(recover=True, remove_comments=True)
-            tree = etree.parse(file_path, parser=parser)
-            root = tree.getroot()
-
-            article = ArticleModel()
-            article.BankNo = 1
-            article.ArtFileName = os.path.basename(file_path)
-
-            # --- Stage 1: Quick Extraction for Filtering ---
-            title = ProcessDataSrv._get_text(root, ".//article-title")
-            abstract_node = root.find(".//abstract")
-            raw_abstract = " ".join(abstract_node.itertext()) if abstract_node is not None else ""
-            kwds = ", ".join([k.text.strip() for k in root.xpath(".//kwd") if k.text])
-            meshes = " | ".join([m.text.strip() for m in root.xpath(".//mesh-heading/descriptor-name") if m.text])
-
-            check_zone = f"{title} {raw_abstract} {kwds} {meshes}".lower()
-
-            # --- Stage 2: Refined Filtering (Anti-Fake Logic) ---
-            abstract_text = raw_abstract.lower()
-            title_text = title.lower()
-            check_zone = f"{title_text} {abstract_text} {kwds.lower()} {meshes.lower()}"
-
-            breast_matches = re.findall(r'\b(breast|mammary)\b', check_zone)
-            breast_count = len(breast_matches)
-            escaped_context = '|'.join(
-                re.escape(word) for word in (ProcessDataSrv.breast_context_words + ProcessDataSrv.general_words))
-
-            context_pattern = r'\b(breast|mammary)\b\s*(?:\w+\s+){0,5}\b(' + escaped_context + r')\b'
-            context_match_nearby = re.search(context_pattern, check_zone, re.IGNORECASE)
-            is_breast_related = False
-
-            if re.search(r'\b(breast|mammary)\b', title_text):
-                is_breast_related = True
-            elif breast_count >= 2 and context_match_nearby:
-                is_breast_related = True
-            elif breast_count >= 1 and any(
-                    re.search(rf'\b{re.escape(c.lower())}\b', check_zone) for c in ProcessDataSrv.human_breast_cells):
-                is_breast_related = True
-
-            has_human = any(re.search(rf'\b{re.escape(k.lower())}\b', check_zone) for k in ProcessDataSrv.human_indicators) or \
-                        "humans" in meshes.lower()
-
-            has_animal = any(re.search(rf'\b{re.escape(k.lower())}\b', check_zone) for k in ProcessDataSrv.animal_keywords) or \
-                         any(re.search(rf'\b{re.escape(c.lower())}\b', check_zone) for c in
-                             ProcessDataSrv.animal_breast_cells)
-
-            article.NonTarget = False
-
-            if not (is_breast_related and has_human) or has_animal:
-                article.NonTarget = True
-                return article
-
-            # --- Stage 3: Full Metadata Extraction ---
-            article.ArtTitle = title
-
-            abstract_nodes = root.xpath(
-                ".//abstract[not(@abstract-type='graphical') and not(@abstract-type='toc')]"
-            )
+            file_name = os.path.basename(file_path)
+            budget = ProcessDataSrv.max_file_bytes
+            if budget and os.path.getsize(file_path) > budget:
+                if ProcessDataSrv.oversize_mode != "truncate":
+                    return ProcessDataSrv._skip_oversize(file_name)
+                with open(file_path, 'rb') as f:
+                    data = f.read(budget)
+                return ProcessDataSrv._process_source(io.BytesIO(data), file_name, timings, ArticleVerdict.TOO_LARGE)
+            with open(file_path, 'rb') as source:
+                return ProcessDataSrv._process_source(source, file_name, timings)
+        except Exception as e:
+            print(f"Error in ProcessDataSrv: {file_path} -> {e}")
+            return None
 
-            if abstract_nodes:
-                all_paragraphs = []
-
-                for main_abstract in abstract_nodes:
-                    # --- Step 1: Collect paragraphs separately ---
-                    paragraphs = main_abstract.xpath(".//p")
-                    if not paragraphs:
-                        # fallback: raw text if no <p> exists
-                        raw_txt = " ".join(main_abstract.itertext()).strip()
-                        if raw_txt:
-                            paragraphs = [main_abstract]
-
-                    for p in paragraphs:
-                        # Step 2: Clean each paragraph individually
-                        txt = " ".join(p.itertext()).strip()
-                        if txt:
-                            cleaned_p = clean(txt, extra_whitespace=True, dashes=True, bullets=False)
-                            cleaned_p = ProcessDataSrv._filter_figure_references(cleaned_p)
-                            cleaned_p = ProcessDataSrv._sanitize_string(cleaned_p)
-                            cleaned_p = re.sub(r'[ \t]+', ' ', cleaned_p).strip()
-                            # --- Step 2.5: Remove Keywords section from this paragraph ---
-                            cleaned_p = re.split(r'\r?\n\s*(keywords?|key words?)\s*:', cleaned_p, flags=re.IGNORECASE)[
-                                0].strip()
-
-                            if cleaned_p:
-                                # Step 3: Append Windows-style separator (\r\n\r\n)
-                                all_paragraphs.append(cleaned_p)
-
-                # Step 4: Join all paragraphs into one text
-                final_text = "\r\n\r\n".join(all_paragraphs)
-                final_text = re.split(r'\s*\b(?:keywords?|key words?)\b\s*:', final_text, flags=re.IGNORECASE)[
-                    0].strip()
-                article.ArtAbstract = final_text
-            else:
-                article.ArtAbstract = ""
+    @staticmethod
+    def process_bytes(data: bytes, file_name: str, timings: dict = None) -> ArticleModel | ArticleVerdict:
+        # Same as process_file for content that has already been read (prefetch, archives).
+        try:
+            budget = ProcessDataSrv.max_file_bytes
+            if budget and len(data) > budget:
+                if ProcessDataSrv.oversize_mode != "truncate":
+                    return ProcessDataSrv._skip_oversize(file_name)
+                return ProcessDataSrv._process_source(io.BytesIO(data[:budget]), file_name, timings,
+                                                      ArticleVerdict.TOO_LARGE)
+            return ProcessDataSrv._process_source(io.BytesIO(data), file_name, timings)
+        except Exception as e:
+            print(f"Error in ProcessDataSrv: {file_name} -> {e}")
+            return None
 
-            article.ArtKeywords =ProcessDataSrv._sanitize_string(kwds)
-            article.MeshTerms = meshes
+    @staticmethod
+    def _process_source(source, file_name: str, timings: dict = None,
+                        truncated: str = "") -> ArticleModel | ArticleVerdict:
+        timer = StageTimer(timings)
+        # Phase 1: stream only up to </front>. The relevance filter needs nothing else, so
+        # NonTarget articles never read or build their body and reference list.
+        context = etree.iterparse(source, events=('start', 'end'), tag=ProcessDataSrv._stream_tags(), recover=True,
+                                  remove_comments=True, huge_tree=ProcessDataSrv.huge_tree)
+        events = iter(context)
+        front = None
+        in_body = False
+        for event, node in events:
+            if node.tag == "front":
+                if event == "end":
+                    front = node
+                    break
+            elif node.tag == "body" and event == "start":
+                in_body = True
+                break
+        if front is None:
+            # not a JATS document (or no <front>): filter on the whole tree
+            ProcessDataSrv._finish_parse(events, in_body)
+            root = context.root
+            scope = root
+        else:
+            root = None
+            scope = front
+        timer.lap("parse_front")
+
+        # --- Stage 1: Quick Extraction for Filtering ---
+        title, raw_abstract, kwds, meshes = ProcessDataSrv._filter_inputs(scope)
+
+        # --- Stage 2: Refined Filtering (Anti-Fake Logic) ---
+        abstract_text = raw_abstract.lower()
+        title_text = title.lower()
+        check_zone = f"{title_text} {abstract_text} {kwds.lower()} {meshes.lower()}"
+
+        non_target, hits = ProcessDataSrv.classify(title_text, check_zone, meshes.lower())
+        zone = b""
+        if ProcessDataSrv.keep_filter_zone:
+            zone = ClassificationCache.pack(title_text, check_zone, meshes.lower())
+        timer.lap("filter")
+        if non_target:
+            verdict = ProcessDataSrv._reject(file_name, hits, meshes.lower())
+            verdict.FilterZone = zone
+            return verdict
+
+        article = ArticleModel()
+        article.BankNo = 1
+        article.ArtFileName = file_name
+        article.FilterZone = zone
+        article.Truncated = truncated
+
+        # --- Stage 2.5: Identifiers and known-duplicate check (front matter only) ---
+        article.ArtDoi = ProcessDataSrv._get_text(scope, ".//article-id[@pub-id-type='doi']")
+
+        pmid = ProcessDataSrv._get_text(scope, ".//article-id[@pub-id-type='pmid']")
+        article.Pmid = int(pmid) if pmid.isdigit() else None
+
+        pmc = ProcessDataSrv._get_text(scope, ".//article-id[@pub-id-type='pmc']")
+        if pmc:
+            pmc_clean = re.sub(r'\D', '', pmc)
+            if pmc_clean.isdigit():
+                article.BankId = int(pmc_clean)
+
+        if ProcessDataSrv.duplicate_index is not None and ProcessDataSrv.duplicate_index.contains_article(article):
+            timer.lap("identifiers")
+            signals = tuple(f"{name}:{value}" for name, value in
+                            (("doi", article.ArtDoi), ("pmid", article.Pmid), ("pmc", article.BankId)) if value)
+            return ArticleVerdict(file_name, ArticleVerdict.DUPLICATE, signals, NonTarget=False, Duplicate=True,
+                                  FilterZone=zone, Truncated=article.Truncated)
+        timer.lap("identifiers")
+
+        # Phase 2: target article, finish the parse to get <body> and <back>
+        if root is None:
+            ProcessDataSrv._finish_parse(events)
+            root = context.root
+        if not article.Truncated and ProcessDataSrv._hit_parser_limit(context):
+            article.Truncated = ArticleVerdict.PARSER_LIMIT
+        timer.lap("parse_rest")
+
+        # --- Stage 3: Full Metadata Extraction ---
+        article.ArtTitle = title
+        article.ArtAbstract = ProcessDataSrv._extract_abstract(root)
+        timer.lap("abstract")
+        article.ArtKeywords =ProcessDataSrv._sanitize_string(kwds)
+        article.MeshTerms = meshes
+
+        ProcessDataSrv._extract_metadata(root, article)
+        timer.lap("metadata")
+
+        # --- Section 1: Extract References (Global) ---
+        article.References = ProcessDataSrv._extract_references(root)
+        article.ArtReferences = ProcessDataSrv._references_text(article.References)
+        timer.lap("references")
+
+        # --- Section 2: Process Body Text (Clean and Filtered) ---
+        paragraphs = [] if ProcessDataSrv.chunker is not None else None
+        article.ArtBody = ProcessDataSrv._extract_body(root, timer, paragraphs)
+        if paragraphs is not None:
+            abstract = [(("Abstract",), text) for text in article.ArtAbstract.split("\r\n\r\n") if text]
+            article.Chunks = ProcessDataSrv.chunker.chunk(abstract + paragraphs)
+            timer.lap("chunks")
+
+        if ProcessDataSrv.minhash:
+            article.MinHash = NearDuplicateIndex.signature(f"{article.ArtAbstract}\n{article.ArtBody}")
+            timer.lap("minhash")
+
+        if ProcessDataSrv.field_hashes:
+            article.FieldHashes = FieldHasher.compute(article)
+            timer.lap("hashes")
 
-            article.JournalTitle = ProcessDataSrv._get_text(root, ".//journal-title")
-            article.JournalAbbrev = ProcessDataSrv._get_text(
-                root, ".//journal-id[@journal-id-type='nlm-ta'] | .//abbrev-journal-title"
-            )
-            article.ArtPublisher = ProcessDataSrv._get_text(root, ".//publisher-name")
-            article.ArtDoi = ProcessDataSrv._get_text(root, ".//article-id[@pub-id-type='doi']")
-            article.ArtType = root.get("article-type", "")
-            article.ArtLanguage = ProcessDataSrv._get_text(root, ".//language") or "en"
-
-            pmid = ProcessDataSrv._get_text(root, ".//article-id[@pub-id-type='pmid']")
-            article.Pmid = int(pmid) if pmid.isdigit() else None
-
-            pmc = ProcessDataSrv._get_text(root, ".//article-id[@pub-id-type='pmc']")
-            if pmc:
-                pmc_clean = re.sub(r'\D', '', pmc)
-                if pmc_clean.isdigit():
-                    article.BankId = int(pmc_clean)
-
-            article.ArtVolume = ProcessDataSrv._get_text(root, ".//volume")
-            article.ArtIssue = ProcessDataSrv._get_text(root, ".//issue")
-            article.ArtFpage = ProcessDataSrv._get_text(root, ".//fpage")
-            lpage = ProcessDataSrv._get_text(root, ".//lpage")
-            if article.ArtFpage and lpage:
-                article.ArtPageRange = f"{article.ArtFpage}-{lpage}"
-
-            pub_date_nodes = root.xpath(
-                ".//pub-date[@pub-type='ppub'] | .//pub-date[@pub-type='epub'] | .//pub-date"
-            )
-            if pub_date_nodes:
-                node = pub_date_nodes[0]
-                year = ProcessDataSrv._get_text(node, "year")
-                month = ProcessDataSrv._get_text(node, "month")
-                day = ProcessDataSrv._get_text(node, "day")
-                if year.isdigit():
-                    try:
-                        m = int(month) if month and month.isdigit() and 1 <= int(month) <= 12 else 1
-                        d = int(day) if day and day.isdigit() and 1 <= int(day) <= 31 else 1
-                        article.PubDate = datetime(int(year), m, d)
-                    except (ValueError, TypeError):
-                        pass
-
-            authors = []
-            orcids = []
-            for auth in root.xpath(".//contrib[@contrib-type='author']"):
-                given = ProcessDataSrv._get_text(auth, './/given-names')
-                sur = ProcessDataSrv._get_text(auth, './/surname')
-                name = f"{given} {sur}".strip()
-                if name:
-                    authors.append(name)
-
-                orcid = ProcessDataSrv._get_text(auth, ".//contrib-id[@contrib-id-type='orcid']")
-                if orcid:
-                    orcids.append(f"{name}: {orcid}")
-
-                if auth.get("corresp") == "yes":
-                    article.CorrespondingAuthor = name
-                    email = ProcessDataSrv._get_text(auth, ".//email")
-                    if not email:
-                        email = ProcessDataSrv._get_text(root, ".//author-notes//email")
-                    article.CorrEmail = email
-
-            article.ArtAuthors = ", ".join(authors)
-            article.OrcidIds = " || ".join(orcids)
-
-            # Affiliations
-            affs = [clean_extra_whitespace(" ".join(aff.itertext())) for aff in root.xpath(".//aff")]
-            article.ArtAffiliations = " | ".join(filter(None, affs))
-
-            # License & Ethics
-            article.ArtLicense = ProcessDataSrv._get_text(root, ".//license//p")
-
-            ethics = root.xpath(".//notes[@notes-type='ethics-statement'] | .//fn[@fn-type='ethics-statement']")
+        return article
+
+    @staticmethod
+    def _stream_tags() -> tuple:
+        # elements iterparse reports: the phase markers and every body element that may be
+        # excluded (a <ref> itself never is, _extract_references reads them wherever they are)
+        excluded = ProcessDataSrv.body_excluded_tags - {"ref-list", "ref"}
+        return ("front", "body", "sec") + tuple(excluded)
+
+    @staticmethod
+    def _finish_parse(events, in_body=False):
+        # Reads the rest of the document. Body elements that _extract_body skips are emptied as
+        # soon as they end, so inlined tables, figures and MathML never pile up in memory. One
+        # holding references (a ref-list section, notes, an appendix) is kept for them.
+        for event, node in events:
+            if node.tag == "body":
+                in_body = event == "start"
+            elif in_body and event == "end" and ProcessDataSrv._is_excluded(node) and node.find(".//ref") is None:
+                node.clear(keep_tail=True)
+
+    @staticmethod
+    def _hit_parser_limit(context) -> bool:
+        # with recover=True libxml2 stops at its safety limits and only logs it
+        for error in context.error_log:
+            message = error.message.lower()
+            if "huge" in message or "excessive depth" in message:
+                return True
+        return False
+
+    @staticmethod
+    def _skip_oversize(file_name: str) -> ArticleVerdict:
+        signals = (f"max_file_bytes:{ProcessDataSrv.max_file_bytes}",)
+        return ArticleVerdict(file_name, ArticleVerdict.TOO_LARGE, signals, NonTarget=False, Skipped=True)
+
+    @staticmethod
+    def _filter_inputs(scope):
+        title = ProcessDataSrv._get_text(scope, ".//article-title")
+        abstract_node = scope.find(".//abstract")
+        raw_abstract = " ".join(abstract_node.itertext()) if abstract_node is not None else ""
+        kwds = ", ".join([k.text.strip() for k in scope.xpath(".//kwd") if k.text])
+        meshes = " | ".join([m.text.strip() for m in scope.xpath(".//mesh-heading/descriptor-name") if m.text])
+        return title, raw_abstract, kwds, meshes
+
+    @staticmethod
+    def _extract_abstract(root) -> str:
+        abstract_nodes = root.xpath(
+            ".//abstract[not(@abstract-type='graphical') and not(@abstract-type='toc')]"
+        )
+
+        if abstract_nodes:
+            all_paragraphs = []
+
+            for main_abstract in abstract_nodes:
+                # --- Step 1: Collect paragraphs separately ---
+                paragraphs = main_abstract.xpath(".//p")
+                if not paragraphs:
+                    # fallback: raw text if no <p> exists
+                    raw_txt = " ".join(main_abstract.itertext()).strip()
+                    if raw_txt:
+                        paragraphs = [main_abstract]
+
+                # Step 2: Clean each paragraph individually, cutting at a "Keywords:" line
+                texts = [txt for txt in (" ".join(p.itertext()).strip() for p in paragraphs) if txt]
+                all_paragraphs.extend(TextCleaner.clean_paragraphs(texts, keywords=True))
+
+            # Step 4: Join all paragraphs into one text
+            final_text = "\r\n\r\n".join(all_paragraphs)
+            final_text = re.split(r'\s*\b(?:keywords?|key words?)\b\s*:', final_text, flags=re.IGNORECASE)[
+                0].strip()
+            return final_text
+        return ""
+
+    # Metadata lookups are compiled once and run against <front> (plus <back> for ethics and
+    # funding), so their cost follows the front matter and not the body or reference list.
+    _journal_title = etree.XPath(".//journal-title")
+    _journal_abbrev = etree.XPath(".//journal-id[@journal-id-type='nlm-ta'] | .//abbrev-journal-title")
+    _publisher = etree.XPath(".//publisher-name")
+    _language = etree.XPath(".//language")
+    _volume = etree.XPath(".//volume")
+    _issue = etree.XPath(".//issue")
+    _fpage = etree.XPath(".//fpage")
+    _lpage = etree.XPath(".//lpage")
+    _pub_date = etree.XPath(".//pub-date")
+    _year = etree.XPath("year")
+    _month = etree.XPath("month")
+    _day = etree.XPath("day")
+    _authors = etree.XPath(".//contrib[@contrib-type='author']")
+    _given_names = etree.XPath(".//given-names")
+    _surname = etree.XPath(".//surname")
+    _orcid = etree.XPath(".//contrib-id[@contrib-id-type='orcid']")
+    _email = etree.XPath(".//email")
+    _notes_email = etree.XPath(".//author-notes//email")
+    _affiliations = etree.XPath(".//aff")
+    _license = etree.XPath(".//license//p")
+    _ethics = etree.XPath(".//notes[@notes-type='ethics-statement'] | .//fn[@fn-type='ethics-statement']")
+    _funding_source = etree.XPath(".//funding-source")
+    _award_id = etree.XPath(".//award-id")
+    _pdf_link = etree.XPath(".//self-uri[@content-type='pdf']/@href")
+
+    @staticmethod
+    def _extract_metadata(root, article: ArticleModel):
+        # efetch output wraps the <article> in a <pmc-articleset>
+        article_node = root if root.tag == "article" else root.find("article")
+        front = article_node.find("front") if article_node is not None else None
+        if front is None:
+            # not JATS: search the whole document as before
+            front = root
+            back = None
+        else:
+            back = article_node.find("back")
+        scopes = (front,) if back is None else (front, back)
+
+        article.JournalTitle = ProcessDataSrv._get_text(front, ProcessDataSrv._journal_title)
+        article.JournalAbbrev = ProcessDataSrv._get_text(front, ProcessDataSrv._journal_abbrev)
+        article.ArtPublisher = ProcessDataSrv._get_text(front, ProcessDataSrv._publisher)
+        article.ArtType = root.get("article-type", "")
+        article.ArtLanguage = ProcessDataSrv._get_text(front, ProcessDataSrv._language) or "en"
+
+        article.ArtVolume = ProcessDataSrv._get_text(front, ProcessDataSrv._volume)
+        article.ArtIssue = ProcessDataSrv._get_text(front, ProcessDataSrv._issue)
+        article.ArtFpage = ProcessDataSrv._get_text(front, ProcessDataSrv._fpage)
+        lpage = ProcessDataSrv._get_text(front, ProcessDataSrv._lpage)
+        if article.ArtFpage and lpage:
+            article.ArtPageRange = f"{article.ArtFpage}-{lpage}"
+
+        # the old ppub | epub | any union resolved to the first pub-date in document order
+        pub_date_nodes = ProcessDataSrv._pub_date(front)
+        if pub_date_nodes:
+            node = pub_date_nodes[0]
+            year = ProcessDataSrv._get_text(node, ProcessDataSrv._year)
+            month = ProcessDataSrv._get_text(node, ProcessDataSrv._month)
+            day = ProcessDataSrv._get_text(node, ProcessDataSrv._day)
+            if year.isdigit():
+                try:
+                    m = int(month) if month and month.isdigit() and 1 <= int(month) <= 12 else 1
+                    d = int(day) if day and day.isdigit() and 1 <= int(day) <= 31 else 1
+                    article.PubDate = datetime(int(year), m, d)
+                except (ValueError, TypeError):
+                    pass
+
+        authors = []
+        orcids = []
+        for auth in ProcessDataSrv._authors(front):
+            given = ProcessDataSrv._get_text(auth, ProcessDataSrv._given_names)
+            sur = ProcessDataSrv._get_text(auth, ProcessDataSrv._surname)
+            name = f"{given} {sur}".strip()
+            if name:
+                authors.append(name)
+
+            orcid = ProcessDataSrv._get_text(auth, ProcessDataSrv._orcid)
+            if orcid:
+                orcids.append(f"{name}: {orcid}")
+
+            if auth.get("corresp") == "yes":
+                article.CorrespondingAuthor = name
+                email = ProcessDataSrv._get_text(auth, ProcessDataSrv._email)
+                if not email:
+                    email = ProcessDataSrv._get_text(front, ProcessDataSrv._notes_email)
+                article.CorrEmail = email
+
+        article.ArtAuthors = ", ".join(authors)
+        article.OrcidIds = " || ".join(orcids)
+
+        # Affiliations
+        affs = [TextCleaner.clean_extra_whitespace(" ".join(aff.itertext()))
+                for aff in ProcessDataSrv._affiliations(front)]
+        article.ArtAffiliations = " | ".join(filter(None, affs))
+
+        # License & Ethics
+        article.ArtLicense = ProcessDataSrv._get_text(front, ProcessDataSrv._license)
+
+        for scope in scopes:
+            ethics = ProcessDataSrv._ethics(scope)
             if ethics:
                 article.EthicsStatement = " ".join(ethics[0].itertext()).strip()
+                break
 
-            # --- Section 1: Extract References (Global) ---
-            all_refs = []
-            for ref in root.xpath(".//ref"):
-                ref_text = " ".join(ref.itertext()).strip()
-                if ref_text:
-                    # Using clean_extra_whitespace for single-line reference formatting
-                    formatted_ref = clean_extra_whitespace(ref_text)
-                    if formatted_ref not in all_refs:
-                        all_refs.append(formatted_ref)
-
-            article.ArtReferences = "\n".join(all_refs)
-            article.ArtReferences = ProcessDataSrv._sanitize_string(article.ArtReferences)
-            # --- Section 2: Process Body Text (Clean and Filtered) ---
-            body_node = root.find(".//body")
-            if body_node is not None:
-                temp_body = copy.deepcopy(body_node)
-
-                unwanted_query = """
-                    .//ref-list | .//ref | .//table-wrap | .//fig | .//ack | .//notes |
-                    .//sec[@sec-type='ref-list'] | .//sec[@sec-type='fn-group'] |
-                    .//sec[@sec-type='supplementary-material'] | .//formula | .//inline-formula |
-                    .//sec[@sec-type='ack'] | .//sec[@sec-type='COI-statement'] | 
-                    .//sec[@sec-type='author-contribution'] | .//sec[@sec-type='data-availability'] |
-                    .//sec[contains(@id, 'ack')] | .//sec[contains(@id, 'competing')] |
-                    .//sec[contains(@id, 'con')] | .//glossary | .//app-group
-                """
-                for node in temp_body.xpath(unwanted_query):
-                    if node.getparent() is not None:
-                        node.getparent().remove(node)
+        # Funding
+        article.FundingGrant = " | ".join([f.text.strip() for scope in scopes
+                                           for f in ProcessDataSrv._funding_source(scope) if f.text])
+        article.FundingId = " | ".join([f.text.strip() for scope in scopes
+                                        for f in ProcessDataSrv._award_id(scope) if f.text])
 
-                raw_parts = []
-                for sec in temp_body.xpath(".//sec"):
-                    # Include title
-                    # title_text = " ".join(sec.xpath("./title//text()")).strip()
-                    # if title_text:
-                    #     raw_parts.append(title_text)
-
-                    for p in sec.xpath(".//p"):
-                        txt = " ".join(p.itertext()).strip()
-                        if txt:
-                            cleaned_p = clean(
-                                txt,
-                                extra_whitespace=True,
-                                dashes=True,
-                                bullets=False
-                            )
-                            cleaned_p = ProcessDataSrv._filter_figure_references(cleaned_p)
-                            cleaned_p = ProcessDataSrv._sanitize_string(cleaned_p)
-                            cleaned_p = re.sub(r'[ \t]+', ' ', cleaned_p).strip()
-                            cleaned_p = ProcessDataSrv._normalize_references(cleaned_p)
-                            if cleaned_p:
-                                raw_parts.append(cleaned_p)
-
-                temp_full_text = "\r\n\r\n".join(raw_parts)
-
-                ref_stop_pattern = r'\r?\n\s*(references|reference list|bibliography|literature cited|acknowledgments)\s*\r?\n'
-                processed_text = re.split(ref_stop_pattern, temp_full_text, maxsplit=1, flags=re.IGNORECASE)[0]
-
-                # Double newline normalization
-                article.ArtBody = re.sub(r'(\r?\n)+', '\r\n\r\n', processed_text.strip())
+        article.ArtPdfLink = ProcessDataSrv._get_text(front, ProcessDataSrv._pdf_link)
+
+    @staticmethod
+    def _extract_references(root) -> list:
+        refs = []
+        seen = set()
+        for ref in root.iter("ref"):
+            ref_text = " ".join(ref.itertext()).strip()
+            if ref_text:
+                # Using clean_extra_whitespace for single-line reference formatting
+                formatted_ref = TextCleaner.clean_extra_whitespace(ref_text)
+                if formatted_ref not in seen:
+                    seen.add(formatted_ref)
+                    refs.append(ProcessDataSrv._reference_record(ref, len(refs) + 1, formatted_ref))
+        return refs
+
+    @staticmethod
+    def _reference_record(ref, seq: int, ref_text: str) -> ReferenceModel:
+        # one pass over the reference, keeping the first element of each kind
+        found = {}
+        for node in ref.iter("pub-id", "year", "source", "article-title", "chapter-title"):
+            key = node.tag if node.tag != "pub-id" else node.get("pub-id-type")
+            if key not in found:
+                found[key] = node
+
+        def text(key):
+            node = found.get(key)
+            if node is None:
+                return ""
+            return TextCleaner.sanitize(node.text or "" if len(node) == 0 else " ".join(node.itertext()))
+
+        record = ReferenceModel(Seq=seq, RefText=ref_text, Doi=text("doi"), Source=text("source"),
+                                Title=text("article-title") or text("chapter-title"))
+        pmid = text("pmid")
+        record.Pmid = int(pmid) if pmid.isdigit() else None
+        year = re.match(r'\d{4}', text("year"))
+        record.RefYear = int(year.group()) if year else None
+        return record
+
+    @staticmethod
+    def _references_text(refs: list) -> str:
+        # the legacy ArtReferences column: one reference per line
+        return ProcessDataSrv._sanitize_string("\n".join(ref.RefText for ref in refs))
+
+    @staticmethod
+    def _extract_body(root, timer: StageTimer = None, paragraphs: list = None) -> str:
+        # paragraphs, when given, receives (section title path, cleaned text) for every body paragraph
+        body_node = root.find(".//body")
+        if body_node is not None:
+            texts = []
+            sections = [] if paragraphs is not None else None
+            ProcessDataSrv._collect_body_paragraphs(body_node, False, texts, sections)
+            if timer is not None:
+                timer.lap("body_walk")
+            if sections is None:
+                raw_parts = TextCleaner.clean_paragraphs(texts, references=True)
             else:
-                article.ArtBody = ""
+                raw_parts = []
+                for section, txt in zip(sections, texts):
+                    cleaned_p = TextCleaner.clean_paragraph(txt, references=True)
+                    if cleaned_p:
+                        raw_parts.append(cleaned_p)
+                        paragraphs.append((section, cleaned_p))
+
+            temp_full_text = "\r\n\r\n".join(raw_parts)
+
+            ref_stop_pattern = r'\r?\n\s*(references|reference list|bibliography|literature cited|acknowledgments)\s*\r?\n'
+            processed_text = re.split(ref_stop_pattern, temp_full_text, maxsplit=1, flags=re.IGNORECASE)[0]
+
+            # Double newline normalization
+            body_text = re.sub(r'(\r?\n)+', '\r\n\r\n', processed_text.strip())
+            if paragraphs and len(processed_text) < len(temp_full_text):
+                # cut at the same "References"-style heading as the body text
+                del paragraphs[len(body_text.split("\r\n\r\n")) if body_text else 0:]
+        else:
+            body_text = ""
+        if timer is not None:
+            timer.lap("body")
+        return body_text
 
-            # Funding
-            article.FundingGrant = " | ".join([f.text.strip() for f in root.xpath(".//funding-source") if f.text])
-            article.FundingId = " | ".join([f.text.strip() for f in root.xpath(".//award-id") if f.text])
+    @staticmethod
+    def _is_excluded(node) -> bool:
+        tag = node.tag
+        if tag in ProcessDataSrv.body_excluded_tags:
+            return True
+        if tag != "sec":
+            return False
+        if node.get("sec-type") in ProcessDataSrv.body_excluded_sec_types:
+            return True
+        sec_id = node.get("id")
+        return sec_id is not None and any(part in sec_id for part in ProcessDataSrv.body_excluded_sec_ids)
 
-            article.ArtPdfLink = ProcessDataSrv._get_text(root, ".//self-uri[@content-type='pdf']/@href")
+    @staticmethod
+    def _collect_body_paragraphs(node, in_sec: bool, texts: list, sections: list = None, path: tuple = ()):
+        # One ordered walk of the original tree: excluded subtrees are skipped instead of being
+        # removed from a copy, and every <p> inside a <sec> is taken once, however deeply the
+        # sections are nested. sections, when given, gets the title path of each paragraph.
+        for child in node:
+            if not isinstance(child.tag, str) or ProcessDataSrv._is_excluded(child):
+                continue
+            if in_sec and child.tag == "p":
+                parts = []
+                ProcessDataSrv._visible_text(child, parts)
+                txt = " ".join(parts).strip()
+                if txt:
+                    texts.append(txt)
+                    if sections is not None:
+                        sections.append(path)
+            child_path = path
+            if sections is not None and child.tag == "sec":
+                title = child.find("title")
+                title_text = " ".join(" ".join(title.itertext()).split()) if title is not None else ""
+                child_path = path + (title_text or child.get("sec-type") or "",)
+            ProcessDataSrv._collect_body_paragraphs(child, in_sec or child.tag == "sec", texts, sections, child_path)
 
-        except Exception as e:
-            print(f"Error in ProcessDataSrv: {file_path} -> {e}")
-            return None
+    @staticmethod
+    def _visible_text(node, parts: list):
+        # itertext() minus excluded subtrees; like a detached node, an excluded one loses its tail
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            if isinstance(child.tag, str):
+                if ProcessDataSrv._is_excluded(child):
+                    continue
+                ProcessDataSrv._visible_text(child, parts)
+            if child.tail:
+                parts.append(child.tail)
 
-        return article
+    @staticmethod
+    def _get_matcher() -> KeywordMatcher:
+        if ProcessDataSrv._matcher is None:
+            fuzzy_index = None
+            if ProcessDataSrv.fuzzy_distance > 0:
+                keywords = [(category, word) for category, words in (
+                    ("human", ProcessDataSrv.human_indicators), ("animal", ProcessDataSrv.animal_keywords),
+                    ("human_cells", ProcessDataSrv.human_breast_cells),
+                    ("animal_cells", ProcessDataSrv.animal_breast_cells)) for word in words]
+                fuzzy_index = FuzzyKeywordIndex(keywords, ProcessDataSrv.fuzzy_distance,
+                                                ProcessDataSrv.fuzzy_min_length,
+                                                exact_words=ProcessDataSrv.fuzzy_exact_words)
+            ProcessDataSrv._matcher = KeywordMatcher(
+                ProcessDataSrv.breast_keywords,
+                ProcessDataSrv.breast_context_words + ProcessDataSrv.general_words,
+                ProcessDataSrv.human_indicators,
+                ProcessDataSrv.animal_keywords,
+                ProcessDataSrv.human_breast_cells,
+                ProcessDataSrv.animal_breast_cells,
+                fuzzy_index,
+            )
+        return ProcessDataSrv._matcher
+
+    @staticmethod
+    def classify(title_text: str, check_zone: str, mesh_text: str) -> tuple[bool, KeywordHits]:
+        # Returns (non_target, hits). All inputs are expected in lower case.
+        hits = ProcessDataSrv._get_matcher().scan(title_text, check_zone)
+        is_breast_related = ProcessDataSrv._is_breast_related(hits)
+        has_human = bool(hits.human) or "humans" in mesh_text
+        has_animal = bool(hits.animal) or bool(hits.animal_cells)
+
+        return not (is_breast_related and has_human) or has_animal, hits
 
     @staticmethod
-    def _get_text(node, xpath: str) -> str:
+    def _is_breast_related(hits: KeywordHits) -> bool:
+        if hits.breast_in_title:
+            return True
+        if hits.breast_count >= 2 and hits.breast_context:
+            return True
+        return hits.breast_count >= 1 and bool(hits.human_cells)
+
+    @staticmethod
+    def rules_hash() -> str:
+        # identifies the keyword lists behind a verdict; any edit to them changes it
+        rules = [ProcessDataSrv.breast_keywords, ProcessDataSrv.breast_context_words, ProcessDataSrv.general_words,
+                 ProcessDataSrv.human_indicators, ProcessDataSrv.animal_keywords,
+                 ProcessDataSrv.human_breast_cells, ProcessDataSrv.animal_breast_cells]
+        if ProcessDataSrv.fuzzy_distance > 0:
+            rules.append([ProcessDataSrv.fuzzy_distance, ProcessDataSrv.fuzzy_min_length,
+                          ProcessDataSrv.fuzzy_exact_words])
+        return hashlib.md5(json.dumps(rules).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def reclassify(title_text: str, check_zone: str, mesh_text: str) -> tuple[bool, str]:
+        # (non_target, reason code) from cached filter inputs; reason is "" for a target
+        non_target, hits = ProcessDataSrv.classify(title_text, check_zone, mesh_text)
+        return non_target, ProcessDataSrv._reject_reason(hits) if non_target else ""
+
+    @staticmethod
+    def _reject_reason(hits: KeywordHits) -> str:
+        # the first failing rule of classify() becomes the reason code
+        if hits.animal or hits.animal_cells:
+            return ArticleVerdict.ANIMAL
+        if not ProcessDataSrv._is_breast_related(hits):
+            return ArticleVerdict.NOT_BREAST
+        return ArticleVerdict.NO_HUMAN
+
+    @staticmethod
+    def _reject(file_name: str, hits: KeywordHits, mesh_text: str) -> ArticleVerdict:
+        reason = ProcessDataSrv._reject_reason(hits)
+        signals = [f"breast:{hits.breast_count}"]
+        if hits.breast_in_title:
+            signals.append("breast_in_title")
+        if hits.breast_context:
+            signals.append("breast_context")
+        if "humans" in mesh_text:
+            signals.append("mesh:humans")
+        for label, words in (("human", hits.human), ("human_cells", hits.human_cells),
+                             ("animal", hits.animal), ("animal_cells", hits.animal_cells)):
+            signals.extend(f"{label}:{word}" for word in dict.fromkeys(words))
+        return ArticleVerdict(file_name, reason, tuple(signals))
+
+    @staticmethod
+    def _get_text(node, xpath) -> str:
+        # xpath is an expression string or a precompiled etree.XPath
         try:
-            res = node.xpath(xpath)
+            res = xpath(node) if isinstance(xpath, etree.XPath) else node.xpath(xpath)
             if res:
                 if isinstance(res[0], etree._Element):
                     return " ".join(res[0].itertext()).strip()
@@ -308,52 +646,10 @@ class ProcessDataSrv:
             pass
         return ""
 
-    @staticmethod
-    def _filter_figure_references(text: str) -> str:
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        return " ".join([
-            s for s in sentences
-            if not (
-                    re.search(r'(?i)\b(Fig|Table|Tbl)\.?\s*\d+', s)
-                    and len(s) < 65
-            )
-        ])
-
     @staticmethod
     def _sanitize_string(text: str) -> str:
         if not text:
             return ""
         # حذف کاراکترهای غیرچاپ‌شونده (Null byte و غیره) که SQL را خراب می‌کنند
         # فقط کاراکترهای بالای 31 (استاندارد) و خط جدید/تب رو نگه می‌داریم
-        clean_text = "".join(ch for ch in text if ord(ch) > 31 or ch in "\n\r\t")
-        return clean_text.strip()
-
-    @staticmethod
-    def _normalize_references(text: str) -> str:
-        def fix_ref(match):
-            ref = match.group()
-            # remove spaces inside brackets
-            ref = re.sub(r'\[\s*(.*?)\s*\]', r'[\1]', ref)
-            ref = re.sub(r'\(\s*(.*?)\s*\)', r'(\1)', ref)
-            # spaces around commas -> normalize
-            ref = re.sub(r'\s*,\s*', ',', ref)
-            # spaces around dash -> normalize
-            ref = re.sub(r'\s*-\s*', '-', ref)
-            # replace number sequences with space like "5 9" -> "5-9"
-            ref = re.sub(r'(\d+)\s+(\d+)', r'\1-\2', ref)
-            # multiple spaces -> single
-            ref = re.sub(r'\s+', ' ', ref)
-            return ref
-
-        # anything inside [] or ()
-        pattern = r'(\[[\w\-,\s.&]+\]|\([\w\-,\s.&]+\))'
-        return re.sub(pattern, fix_ref, text)
-
-    @staticmethod
-    def _fuzzy_in(word, text, threshold=0.8):
-        """Check if word approximately exists in text using fuzzy matching"""
-        words = re.findall(r'\w+', text)
-        for w in words:
-            if SequenceMatcher(None, word, w).ratio() >= threshold:
-                return True
-        return False
\ No newline at end of file
+        return TextCleaner.sanitize(text)
@@ -0,0 +1,15 @@
+from dataclasses import dataclass, fields
+from typing import Optional
+
+@dataclass(slots=True)
+class ReferenceModel:
+    Seq: int = 0
+    RefText: str = ""
+    Doi: str = ""
+    Pmid: Optional[int] = None
+    RefYear: Optional[int] = None
+    Source: str = ""
+    Title: str = ""
+
+    def to_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
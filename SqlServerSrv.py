@@ -1,4 +1,6 @@
+import json
 import pymssql
+from DuplicateIndex import DuplicateIndex
 
 class SqlServerSrv:
     def __init__(self, server='localhost', database='YourDatabase', username='sa', password='sa'):
@@ -23,12 +25,9 @@ class SqlServerSrv:
             print(f"Connection failed: {e}")
             raise
 
-    def insert_with_stored_procedure(self, sp_name, article):
-        if not self.conn:
-            self.connect()
-
-        cursor = self.conn.cursor()
-        sql = f"""
+    @staticmethod
+    def _exec_statement(sp_name):
+        return f"""
         EXEC {sp_name} 
             @ArtTitle=%s, @PubDate=%s, @ArtLanguage=%s, @Pmid=%s, @BankId=%s, @BankNo=%s, 
             @ArtDoi=%s, @ArtType=%s, @JournalTitle=%s, @JournalAbbrev=%s, @ArtPublisher=%s, 
@@ -38,7 +37,10 @@ class SqlServerSrv:
             @OrcidIds=%s, @FundingGrant=%s, @FundingId=%s, @EthicsStatement=%s, 
             @CorrespondingAuthor=%s, @ArtLicense=%s, @PubHistory=%s, @CustomMeta=%s
         """
-        params = (
+
+    @staticmethod
+    def _article_params(article):
+        return (
             article.ArtTitle,
             article.PubDate,
             article.ArtLanguage,
@@ -74,12 +76,21 @@ class SqlServerSrv:
             article.CustomMeta or ""
         )
 
+    def insert_with_stored_procedure(self, sp_name, article):
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        sql = SqlServerSrv._exec_statement(sp_name)
+        params = SqlServerSrv._article_params(article)
+
         try:
             cursor.execute(sql, params)
             new_id = None
             row = cursor.fetchone()
-            if row:
-                new_id = row[0]
+            if row and row[0] is not None:
+                # pymssql returns NUMERIC/IDENTITY scalars as Decimal
+                new_id = int(row[0])
 
             self.conn.commit()
             return new_id
@@ -94,6 +105,302 @@ class SqlServerSrv:
         finally:
             cursor.close()
 
+    def insert_batch_with_stored_procedure(self, sp_name, articles):
+        """Insert several articles in one round trip and one commit.
+
+        Every article is executed inside its own TRY/CATCH and the value returned by the
+        stored procedure is captured with INSERT ... EXEC, so the result list has one entry
+        per article, in order: the new id (-1 for a duplicate DOI), None when the procedure
+        returned no row, or an Exception carrying that article's error message.
+
+        Each article starts at a savepoint, and a failed one is rolled back to it, so none of
+        its partial writes are committed with the rest of the batch. When the transaction is
+        no longer committable (or the procedure ended it), the whole batch is rolled back and
+        retried one article at a time.
+        """
+        if not articles:
+            return []
+        if not self.conn:
+            self.connect()
+
+        statements = [
+            "SET NOCOUNT ON;",
+            "IF @@TRANCOUNT = 0 BEGIN TRANSACTION;",
+            "DECLARE @Results TABLE (Seq INT PRIMARY KEY, NewId BIGINT NULL, ErrorMessage NVARCHAR(4000) NULL);",
+            "DECLARE @Row TABLE (NewId BIGINT NULL);",
+        ]
+        params = []
+        exec_statement = SqlServerSrv._exec_statement(sp_name)
+        for seq, article in enumerate(articles):
+            statements.append(f"""
+            DELETE FROM @Row;
+            SAVE TRANSACTION s{seq};
+            BEGIN TRY
+                INSERT INTO @Row (NewId) {exec_statement};
+                INSERT INTO @Results (Seq, NewId) SELECT {seq}, (SELECT TOP 1 NewId FROM @Row);
+            END TRY
+            BEGIN CATCH
+                IF XACT_STATE() <> 1 THROW;
+                ROLLBACK TRANSACTION s{seq};
+                INSERT INTO @Results (Seq, ErrorMessage) VALUES ({seq}, ERROR_MESSAGE());
+            END CATCH""")
+            params.extend(SqlServerSrv._article_params(article))
+        statements.append("SELECT Seq, NewId, ErrorMessage FROM @Results ORDER BY Seq;")
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("\n".join(statements), tuple(params))
+            rows = cursor.fetchall()
+            self.conn.commit()
+        except Exception as e:
+            if self.conn:
+                self.conn.rollback()
+            print(f"Database Error (batch of {len(articles)}): {e}. Retrying one by one.")
+            return self._insert_one_by_one(sp_name, articles)
+        finally:
+            cursor.close()
+
+        results = [None] * len(articles)
+        for seq, new_id, error_message in rows:
+            if error_message is not None:
+                results[seq] = RuntimeError(error_message)
+            else:
+                results[seq] = int(new_id) if new_id is not None else None
+        return results
+
+    def _insert_one_by_one(self, sp_name, articles):
+        results = []
+        for article in articles:
+            try:
+                results.append(self.insert_with_stored_procedure(sp_name, article))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def load_duplicate_index(self, table_name='Articles', fetch_size=50000):
+        if not self.conn:
+            self.connect()
+
+        index = DuplicateIndex()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"SELECT ArtDoi, Pmid, BankId FROM {table_name}")
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for doi, pmid, bank_id in rows:
+                    index.add(doi, pmid, bank_id)
+        finally:
+            cursor.close()
+        return index
+
+    def ensure_references_table(self, table_name='ArticleReferences'):
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"""
+            IF OBJECT_ID(N'{table_name}', N'U') IS NULL
+            BEGIN
+                CREATE TABLE {table_name} (
+                    ArticlesID BIGINT NOT NULL,
+                    Seq INT NOT NULL,
+                    RefText NVARCHAR(MAX) NULL,
+                    Doi NVARCHAR(255) NULL,
+                    Pmid BIGINT NULL,
+                    RefYear INT NULL,
+                    Source NVARCHAR(1000) NULL,
+                    Title NVARCHAR(2000) NULL,
+                    CONSTRAINT PK_{table_name} PRIMARY KEY (ArticlesID, Seq)
+                );
+                CREATE INDEX IX_{table_name}_Doi ON {table_name} (Doi);
+                CREATE INDEX IX_{table_name}_Pmid ON {table_name} (Pmid);
+            END""")
+            self.conn.commit()
+        finally:
+            cursor.close()
+
+    def insert_references(self, rows, table_name='ArticleReferences', rows_per_statement=250):
+        """Bulk insert (ArticlesID, ReferenceModel) pairs with multi-row INSERTs and one commit.
+
+        250 rows x 8 columns stays under SQL Server's limit of 2100 parameters per request.
+        """
+        if not rows:
+            return 0
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        try:
+            for start in range(0, len(rows), rows_per_statement):
+                chunk = rows[start:start + rows_per_statement]
+                params = []
+                for article_id, ref in chunk:
+                    params.extend((article_id, ref.Seq, ref.RefText, ref.Doi or None, ref.Pmid, ref.RefYear,
+                                   ref.Source or None, ref.Title or None))
+                values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(chunk))
+                cursor.execute(f"INSERT INTO {table_name} (ArticlesID, Seq, RefText, Doi, Pmid, RefYear, Source, Title) "
+                               f"VALUES {values}", tuple(params))
+            self.conn.commit()
+        except Exception as e:
+            if self.conn:
+                self.conn.rollback()
+            print(f"Database Error (references): {e}")
+            raise
+        finally:
+            cursor.close()
+        return len(rows)
+
+    def delete_articles(self, article_ids, table_name='Articles', refs_table=None, ids_per_statement=1000):
+        """Delete articles (and their references) by ArticlesID in one transaction."""
+        if not article_ids:
+            return 0
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        try:
+            for start in range(0, len(article_ids), ids_per_statement):
+                chunk = tuple(article_ids[start:start + ids_per_statement])
+                placeholders = ", ".join(["%s"] * len(chunk))
+                if refs_table:
+                    cursor.execute(f"DELETE FROM {refs_table} WHERE ArticlesID IN ({placeholders})", chunk)
+                cursor.execute(f"DELETE FROM {table_name} WHERE ArticlesID IN ({placeholders})", chunk)
+            self.conn.commit()
+        except Exception as e:
+            if self.conn:
+                self.conn.rollback()
+            print(f"Database Error (delete): {e}")
+            raise
+        finally:
+            cursor.close()
+        return len(article_ids)
+
+    def ensure_field_hashes_table(self, table_name='ArticleFieldHashes'):
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"""
+            IF OBJECT_ID(N'{table_name}', N'U') IS NULL
+                CREATE TABLE {table_name} (
+                    ArticlesID BIGINT NOT NULL PRIMARY KEY,
+                    FieldHashes NVARCHAR(MAX) NOT NULL
+                )""")
+            self.conn.commit()
+        finally:
+            cursor.close()
+
+    def load_field_hashes(self, dois, table_name='Articles', hashes_table='ArticleFieldHashes',
+                          dois_per_statement=1000):
+        """{DOI: (ArticlesID, {column: hash} or None)} for the stored DOIs.
+
+        Only ids and hashes cross the wire, so re-delivered articles that did not change cost
+        one small query per batch.
+        """
+        dois = list(dict.fromkeys(doi for doi in dois if doi))
+        if not dois:
+            return {}
+        if not self.conn:
+            self.connect()
+
+        stored = {}
+        cursor = self.conn.cursor()
+        try:
+            for start in range(0, len(dois), dois_per_statement):
+                chunk = tuple(dois[start:start + dois_per_statement])
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(f"SELECT a.ArtDoi, a.ArticlesID, h.FieldHashes FROM {table_name} a "
+                               f"LEFT JOIN {hashes_table} h ON h.ArticlesID = a.ArticlesID "
+                               f"WHERE a.ArtDoi IN ({placeholders}) ORDER BY a.ArticlesID", chunk)
+                for doi, article_id, hashes in cursor.fetchall():
+                    stored.setdefault(doi, (int(article_id), json.loads(hashes) if hashes else None))
+        finally:
+            cursor.close()
+        return stored
+
+    def update_articles(self, updates, table_name='Articles'):
+        """Write only the given columns of stored articles, (ArticlesID, {column: value}) pairs,
+        in one transaction."""
+        if not updates:
+            return 0
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        try:
+            for article_id, columns in updates:
+                assignments = ", ".join(f"{name} = %s" for name in columns)
+                cursor.execute(f"UPDATE {table_name} SET {assignments} WHERE ArticlesID = %s",
+                               tuple(columns.values()) + (article_id,))
+            self.conn.commit()
+        except Exception as e:
+            if self.conn:
+                self.conn.rollback()
+            print(f"Database Error (update): {e}")
+            raise
+        finally:
+            cursor.close()
+        return len(updates)
+
+    def write_field_hashes(self, rows, table_name='ArticleFieldHashes', rows_per_statement=500):
+        """Replace the stored hashes of (ArticlesID, {column: hash}) pairs."""
+        if not rows:
+            return 0
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        try:
+            for start in range(0, len(rows), rows_per_statement):
+                chunk = rows[start:start + rows_per_statement]
+                ids = tuple(article_id for article_id, _ in chunk)
+                cursor.execute(f"DELETE FROM {table_name} WHERE ArticlesID IN ({', '.join(['%s'] * len(ids))})", ids)
+                params = []
+                for article_id, hashes in chunk:
+                    params.extend((article_id, json.dumps(hashes, separators=(",", ":"))))
+                values = ", ".join(["(%s, %s)"] * len(chunk))
+                cursor.execute(f"INSERT INTO {table_name} (ArticlesID, FieldHashes) VALUES {values}", tuple(params))
+            self.conn.commit()
+        except Exception as e:
+            if self.conn:
+                self.conn.rollback()
+            print(f"Database Error (field hashes): {e}")
+            raise
+        finally:
+            cursor.close()
+        return len(rows)
+
+    def delete_field_hashes(self, article_ids, table_name='ArticleFieldHashes', ids_per_statement=1000):
+        self._delete_by_article_id(article_ids, table_name, ids_per_statement)
+
+    def delete_references(self, article_ids, table_name='ArticleReferences', ids_per_statement=1000):
+        self._delete_by_article_id(article_ids, table_name, ids_per_statement)
+
+    def _delete_by_article_id(self, article_ids, table_name, ids_per_statement):
+        if not article_ids:
+            return
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        try:
+            for start in range(0, len(article_ids), ids_per_statement):
+                chunk = tuple(article_ids[start:start + ids_per_statement])
+                cursor.execute(f"DELETE FROM {table_name} WHERE ArticlesID IN ({', '.join(['%s'] * len(chunk))})",
+                               chunk)
+            self.conn.commit()
+        except Exception as e:
+            if self.conn:
+                self.conn.rollback()
+            print(f"Database Error (delete from {table_name}): {e}")
+            raise
+        finally:
+            cursor.close()
+
     def close(self):
         if self.conn:
             self.conn.close()
@@ -0,0 +1,117 @@
+import re
+
+
+class TextCleaner:
+    """Drop-in replacement for the two unstructured.cleaners.core functions we use.
+
+    clean(text, extra_whitespace=True, dashes=True) and clean_extra_whitespace(text) give
+    exactly the output of the unstructured versions (bullets, lowercase and trailing
+    punctuation cleaning are not used by the pipeline and not provided). Importing
+    unstructured pulls in its whole dependency tree, which every worker process would pay for.
+    """
+
+    _dashes = re.compile(r"[-\u2013]")
+    _nbsp_newline = re.compile(r"[\xa0\n]")
+    _spaces = re.compile(r"([ ]{2,})")
+
+    # clean(extra_whitespace=True, dashes=True) in one translate, one collapse and one strip
+    _whitespace_table = str.maketrans({"-": " ", "\u2013": " ", "\xa0": " ", "\n": " "})
+    _space_runs = re.compile(r" {2,}")
+    _figure_reference = re.compile(r'(?i)\b(Fig|Table|Tbl)\.?\s*\d+')
+    _sentence_break = re.compile(r'(?<=[.!?])\s+')
+    _control_chars = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+    _control_table = {i: None for i in range(32) if chr(i) not in "\n\r\t"}
+    _blank_runs = re.compile(r'[ \t]+')
+    _keywords_line = re.compile(r'\r?\n\s*(keywords?|key words?)\s*:', re.IGNORECASE)
+    _citation = re.compile(r'(\[[\w\-,\s.&]+\]|\([\w\-,\s.&]+\))')
+    _has_space = re.compile(r'\s')
+    _citation_steps = (
+        (re.compile(r'\[\s*(.*?)\s*\]'), r'[\1]'),
+        (re.compile(r'\(\s*(.*?)\s*\)'), r'(\1)'),
+        (re.compile(r'\s*,\s*'), ','),
+        (re.compile(r'\s*-\s*'), '-'),
+        (re.compile(r'(\d+)\s+(\d+)'), r'\1-\2'),
+        (re.compile(r'\s+'), ' '),
+    )
+
+    @staticmethod
+    def clean_dashes(text: str) -> str:
+        return TextCleaner._dashes.sub(" ", text).strip()
+
+    @staticmethod
+    def clean_extra_whitespace(text: str) -> str:
+        cleaned_text = TextCleaner._nbsp_newline.sub(" ", text)
+        cleaned_text = TextCleaner._spaces.sub(" ", cleaned_text)
+        return cleaned_text.strip()
+
+    @staticmethod
+    def clean(text: str, extra_whitespace: bool = False, dashes: bool = False) -> str:
+        cleaned_text = TextCleaner.clean_dashes(text) if dashes else text
+        cleaned_text = TextCleaner.clean_extra_whitespace(cleaned_text) if extra_whitespace else cleaned_text
+        return cleaned_text.strip()
+
+    @staticmethod
+    def sanitize(text: str) -> str:
+        # drop control characters (except newline, carriage return and tab) that break SQL
+        if not text:
+            return ""
+        if TextCleaner._control_chars.search(text) is not None:
+            text = text.translate(TextCleaner._control_table)
+        return text.strip()
+
+    @staticmethod
+    def filter_figure_references(text: str) -> str:
+        # drops short sentences that only point at a figure or table
+        if TextCleaner._figure_reference.search(text) is None:
+            return TextCleaner._sentence_break.sub(" ", text)
+        return " ".join([
+            s for s in TextCleaner._sentence_break.split(text)
+            if not (TextCleaner._figure_reference.search(s) and len(s) < 65)
+        ])
+
+    @staticmethod
+    def _fix_citation(match):
+        ref = match.group()
+        if TextCleaner._has_space.search(ref) is None:
+            # every step below only rewrites whitespace
+            return ref
+        for pattern, replacement in TextCleaner._citation_steps:
+            ref = pattern.sub(replacement, ref)
+        return ref
+
+    @staticmethod
+    def normalize_references(text: str) -> str:
+        # "[ 1 , 2 ]" -> "[1,2]", "(5 9)" -> "(5-9)"
+        if "[" not in text and "(" not in text:
+            return text
+        return TextCleaner._citation.sub(TextCleaner._fix_citation, text)
+
+    @staticmethod
+    def clean_paragraph(text: str, references: bool = False, keywords: bool = False) -> str:
+        """Full paragraph cleaning used for abstracts and bodies.
+
+        Same result as clean(extra_whitespace=True, dashes=True), figure-reference filter,
+        sanitize, tab/space collapse, then optionally citation normalization (body) or
+        cutting at a "Keywords:" line (abstract), with the passes that cannot change the
+        text skipped.
+        """
+        text = TextCleaner._space_runs.sub(" ", text.translate(TextCleaner._whitespace_table)).strip()
+        text = TextCleaner.filter_figure_references(text)
+        text = TextCleaner.sanitize(text)
+        if "\t" in text or "  " in text:
+            text = TextCleaner._blank_runs.sub(" ", text).strip()
+        if references:
+            text = TextCleaner.normalize_references(text)
+        if keywords and "\n" in text:
+            text = TextCleaner._keywords_line.split(text)[0].strip()
+        return text
+
+    @staticmethod
+    def clean_paragraphs(texts, references: bool = False, keywords: bool = False) -> list:
+        # batch form: cleans every paragraph of an article and drops the ones left empty
+        cleaned = []
+        for text in texts:
+            text = TextCleaner.clean_paragraph(text, references, keywords)
+            if text:
+                cleaned.append(text)
+        return cleaned
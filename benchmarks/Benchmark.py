@@ -0,0 +1,326 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree
+from ArticleModel import ArticleModel
+from ProcessDataSrv import ProcessDataSrv
+from SqlServerSrv import SqlServerSrv
+from OutputSinks import OutputSink, SqliteSink
+from TextCleaner import TextCleaner
+from SyntheticCorpus import SyntheticCorpus, CorpusShape
+
+
+class StubSink(OutputSink):
+    # Stands in for SQL Server: builds the InsertData parameters of every article and
+    # encodes the text the way it would travel over TDS (UTF-16), without any I/O.
+    name = "stub"
+
+    def __init__(self):
+        super().__init__()
+        self.bytes_sent = 0
+
+    def _write_batch(self, articles):
+        for article in articles:
+            for value in SqlServerSrv._article_params(article):
+                if isinstance(value, str):
+                    self.bytes_sent += len(value.encode('utf-16-le'))
+        return list(range(1, len(articles) + 1))
+
+
+def _sqlite_insert(articles, batch_size=50):
+    sink = SqliteSink(":memory:")
+    sink.open()
+    for start in range(0, len(articles), batch_size):
+        sink.write_batch(articles[start:start + batch_size])
+    sink.close()
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+def measure_startup(repeat):
+    # Fresh interpreter per run: import time of Main (and everything it pulls in) and the
+    # resulting RSS, which is what every worker process pays as well.
+    # VmHWM rather than ru_maxrss: on Linux the latter keeps the parent's peak across fork/exec
+    script = ("import time; started = time.perf_counter(); import Main; elapsed = time.perf_counter() - started\n"
+              "try:\n"
+              "    peak = [int(l.split()[1]) for l in open('/proc/self/status') if l.startswith('VmHWM')][0] / 1024\n"
+              "except OSError:\n"
+              "    import resource, sys\n"
+              "    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)\n"
+              "print(elapsed, peak)")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = []
+    for _ in range(max(1, repeat)):
+        try:
+            output = subprocess.check_output([sys.executable, "-c", script], cwd=root, text=True,
+                                             stderr=subprocess.DEVNULL)
+        except (subprocess.CalledProcessError, OSError):
+            return None
+        seconds, rss = output.split()
+        runs.append((float(seconds), float(rss)))
+    seconds, rss = min(runs)
+    return {"import_seconds": round(seconds, 4), "rss_mb": round(rss, 1)}
+
+
+def measure_in_flight(documents, count=1000):
+    # Memory held by `count` processed results kept alive at once, as the pipeline queues
+    # and the write batch hold them: all results, accepted articles only, rejections only.
+    # tracemalloc counts what the results retain, independent of allocator and RSS noise.
+    import gc
+    import tracemalloc
+    if count <= 0 or not documents:
+        return None
+    for name, data in documents:
+        ProcessDataSrv.process_bytes(data, name)  # warm up matcher and XPath caches
+    selections = {
+        "all": lambda a: True,
+        "target": lambda a: not (a.NonTarget or a.Duplicate),
+        "rejected": lambda a: a.NonTarget or a.Duplicate,
+    }
+    result = {}
+    for label, keep in selections.items():
+        held = []
+        gc.collect()
+        tracemalloc.start()
+        while len(held) < count:
+            added = False
+            for name, data in documents:
+                article = ProcessDataSrv.process_bytes(data, name)
+                if article is not None and keep(article):
+                    held.append(article)
+                    added = True
+                    if len(held) == count:
+                        break
+            if not added:
+                break
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result[label] = round(current / (1024 * 1024) * 1000 / count, 2) if held else None
+        del held
+    return result
+
+
+def _parity_samples(documents):
+    # Every paragraph, affiliation and reference text of the corpus plus a few edge cases.
+    edge_cases = ["", " ", "-", "\u2013\u2013", "a\xa0\xa0b", "a \n\n b", "\t- x -\t", "x\u2014y", "  a  -  b  ",
+                  "\u3000lead", "trail\u2028", "a\r\nb", "1 - 2 \u2013 3", "\xa0-\n"]
+    yield from edge_cases
+    for _, data in documents:
+        root = _parse(data)
+        for node in root.iter("p", "aff", "ref", "title", "article-title"):
+            yield " ".join(node.itertext())
+
+
+def check_parity(documents):
+    from unstructured.cleaners.core import clean, clean_extra_whitespace
+    checked = mismatches = 0
+    for text in _parity_samples(documents):
+        for expected, actual in (
+                (clean(text, extra_whitespace=True, dashes=True, bullets=False),
+                 TextCleaner.clean(text, extra_whitespace=True, dashes=True)),
+                (clean_extra_whitespace(text), TextCleaner.clean_extra_whitespace(text))):
+            checked += 1
+            if expected != actual:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"Mismatch for {text!r}: expected {expected!r}, got {actual!r}")
+    print(f"TextCleaner parity: {checked} checks, {mismatches} mismatches")
+    return mismatches == 0
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _parse(data):
+    parser = etree.XMLParser(recover=True, remove_comments=True)
+    return etree.parse(io.BytesIO(data), parser=parser).getroot()
+
+
+def _filter(root):
+    front = root.find("front")
+    title, raw_abstract, kwds, meshes = ProcessDataSrv._filter_inputs(front if front is not None else root)
+    title_text = title.lower()
+    check_zone = f"{title_text} {raw_abstract.lower()} {kwds.lower()} {meshes.lower()}"
+    return ProcessDataSrv.classify(title_text, check_zone, meshes.lower())[0]
+
+
+def _fuzzy_matcher(distance=1):
+    ProcessDataSrv.configure({"fuzzy_distance": distance, "_matcher": None})
+    try:
+        return ProcessDataSrv._get_matcher()
+    finally:
+        ProcessDataSrv.configure({"fuzzy_distance": 0, "_matcher": None})
+
+
+def _filter_fuzzy(roots, matcher):
+    # the same filter with a FuzzyKeywordIndex (--fuzzy-distance 1); the matcher and its
+    # memo outlive the repeats, as they do over a long run
+    exact, ProcessDataSrv._matcher = ProcessDataSrv._matcher, matcher
+    try:
+        return [_filter(root) for root in roots]
+    finally:
+        ProcessDataSrv._matcher = exact
+
+
+def run_stages(documents, repeat):
+    # Every stage runs over every document, independent of the filter verdict, so the
+    # per-stage numbers measure the same work on every commit.
+    roots = [_parse(data) for _, data in documents]
+    fuzzy_matcher = _fuzzy_matcher()
+    stages = {
+        "parse": lambda: [_parse(data) for _, data in documents],
+        "filter": lambda: [_filter(root) for root in roots],
+        "filter_fuzzy": lambda: _filter_fuzzy(roots, fuzzy_matcher),
+        "abstract": lambda: [ProcessDataSrv._extract_abstract(root) for root in roots],
+        "metadata": lambda: [ProcessDataSrv._extract_metadata(root, ArticleModel()) for root in roots],
+        "body": lambda: [ProcessDataSrv._extract_body(root) for root in roots],
+        "references": lambda: [ProcessDataSrv._extract_references(root) for root in roots],
+        "end_to_end": lambda: [ProcessDataSrv.process_bytes(data, name) for name, data in documents],
+    }
+
+    total_bytes = sum(len(data) for _, data in documents)
+    results = {}
+    for name, stage in stages.items():
+        results[name] = _time_stage(stage, repeat, len(documents), total_bytes)
+
+    articles = [a for a in (ProcessDataSrv.process_bytes(data, name) for name, data in documents)
+                if a is not None and not a.NonTarget]
+    sink = StubSink()
+    sink.write_batch(articles)
+    payload = sink.bytes_sent
+    # MB/s of the insert stages is measured on the encoded payload, not on the XML input
+    results["db_insert"] = _time_stage(lambda: sink.write_batch(articles), repeat, len(articles), payload)
+    results["db_insert"]["payload_mb"] = round(payload / (1024 * 1024), 3)
+    results["sqlite_insert"] = _time_stage(lambda: _sqlite_insert(articles), repeat, len(articles), payload)
+    results["end_to_end"]["targets"] = len(articles)
+    return results
+
+
+def _time_stage(stage, repeat, files, total_bytes):
+    best = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        stage()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "files": files,
+        "seconds": round(best, 6),
+        "files_per_s": round(files / best, 1) if best else None,
+        "mb_per_s": round(total_bytes / best / (1024 * 1024), 3) if best else None,
+    }
+
+
+def compare(baseline_path, candidate_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(candidate_path, encoding='utf-8') as f:
+        candidate = json.load(f)
+    print(f"{'stage':<12} {'baseline f/s':>13} {'candidate f/s':>14} {'speedup':>8}")
+    for name, stage in baseline["stages"].items():
+        other = candidate["stages"].get(name)
+        if not other or not stage["files_per_s"] or not other["files_per_s"]:
+            continue
+        speedup = other["files_per_s"] / stage["files_per_s"]
+        print(f"{name:<12} {stage['files_per_s']:>13.1f} {other['files_per_s']:>14.1f} {speedup:>7.2f}x")
+    print(f"{'peak_rss_mb':<12} {baseline.get('peak_rss_mb')!s:>13} {candidate.get('peak_rss_mb')!s:>14}")
+    for key, label in (("import_seconds", "import_s"), ("rss_mb", "import_mb")):
+        before = (baseline.get("startup") or {}).get(key)
+        after = (candidate.get("startup") or {}).get(key)
+        print(f"{label:<12} {before!s:>13} {after!s:>14}")
+    for key in ("all", "target", "rejected"):
+        before = (baseline.get("in_flight_mb_per_1000") or {}).get(key)
+        after = (candidate.get("in_flight_mb_per_1000") or {}).get(key)
+        print(f"{'mb/1k ' + key:<12} {before!s:>13} {after!s:>14}")
+
+
+def parse_args(argv=None):
+    defaults = CorpusShape()
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmark of ProcessDataSrv on a synthetic corpus.")
+    parser.add_argument("--output", default=None, help="Write the JSON result to this file (default: stdout).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is reported.")
+    parser.add_argument("--write-corpus", default=None, help="Also write the generated XML files to this folder.")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="Compare two JSON results instead of running.")
+    parser.add_argument("--parity", action="store_true",
+                        help="Check TextCleaner against unstructured on the corpus instead of running.")
+    parser.add_argument("--parity-input", default=None,
+                        help="Folder of real .xml files to use for --parity instead of the synthetic corpus.")
+    parser.add_argument("--in-flight", type=int, default=1000,
+                        help="Results held at once when measuring memory per 1000 in-flight articles (0 = skip).")
+    for name, value in vars(defaults).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    shape = CorpusShape(**{name: getattr(args, name) for name in vars(CorpusShape())})
+    corpus = SyntheticCorpus(shape)
+    if args.write_corpus:
+        corpus.write(args.write_corpus)
+    documents = list(corpus)
+    if args.parity:
+        if args.parity_input:
+            documents = []
+            for folder, _, files in os.walk(args.parity_input):
+                for name in files:
+                    if name.endswith('.xml'):
+                        with open(os.path.join(folder, name), 'rb') as f:
+                            documents.append((name, f.read()))
+        sys.exit(0 if check_parity(documents) else 1)
+
+    result = {
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "lxml": ".".join(map(str, etree.LXML_VERSION)),
+        "corpus": vars(shape),
+        "corpus_mb": round(sum(len(data) for _, data in documents) / (1024 * 1024), 3),
+        "stages": run_stages(documents, args.repeat),
+        "peak_rss_mb": peak_rss_mb(),
+        "startup": measure_startup(args.repeat),
+        "in_flight_mb_per_1000": measure_in_flight(documents, args.in_flight),
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
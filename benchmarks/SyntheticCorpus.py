@@ -0,0 +1,179 @@
+import os
+import random
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+
+@dataclass
+class CorpusShape:
+    count: int = 200
+    sections: int = 6
+    paragraphs_per_section: int = 4
+    sentences_per_paragraph: int = 6
+    nested_sections: float = 0.3
+    refs: int = 40
+    tables: int = 2
+    figures: int = 3
+    formulas: int = 2
+    abstract_paragraphs: int = 3
+    target_share: float = 0.4
+    animal_share: float = 0.3
+    seed: int = 102
+
+
+class SyntheticCorpus:
+    """Deterministic generator of JATS/PMC-like articles for benchmarks.
+
+    Articles are a mix of three kinds: "target" (human breast research), "animal" (breast
+    research on mouse models, rejected by the filter) and "other" (not breast related).
+    The same shape and seed always produce byte-identical XML.
+    """
+
+    filler_words = (
+        "the of and in to a was were for with by on that as from at this are be analysis "
+        "expression protein levels significant increased reduced signaling pathway receptor "
+        "response group treatment samples data model associated observed compared clinical "
+        "results study measured higher lower between within factor regulation activity"
+    ).split()
+    topic_words = {
+        "target": ["breast cancer cells", "women", "patient", "mammary gland", "biopsy", "cohort",
+                   "MCF-7", "ductal epithelium", "postmenopausal"],
+        "animal": ["mammary gland", "mice", "mouse", "4T1", "breast tumor", "rat"],
+        "other": ["lung tissue", "patients", "hepatic cells", "cohort", "kidney", "women"],
+    }
+    titles = {
+        "target": "Breast cancer cell signaling in a cohort of women",
+        "animal": "Mammary gland development in mice",
+        "other": "Hepatic tissue response in a clinical cohort",
+    }
+
+    def __init__(self, shape: CorpusShape = None):
+        self.shape = shape or CorpusShape()
+
+    def _kind(self, rnd):
+        r = rnd.random()
+        if r < self.shape.target_share:
+            return "target"
+        if r < self.shape.target_share + self.shape.animal_share:
+            return "animal"
+        return "other"
+
+    def _sentence(self, rnd, kind):
+        words = [rnd.choice(SyntheticCorpus.filler_words) for _ in range(rnd.randint(8, 24))]
+        words.insert(rnd.randrange(len(words)), rnd.choice(SyntheticCorpus.topic_words[kind]))
+        sentence = " ".join(words)
+        r = rnd.random()
+        if r < 0.08:
+            sentence += f" (Fig. {rnd.randint(1, 6)})"
+        elif r < 0.2:
+            sentence += f" [{rnd.randint(1, 40)}, {rnd.randint(41, 60)}]"
+        elif r < 0.25:
+            sentence += f" ({rnd.randint(1, 9)} - {rnd.randint(10, 20)})"
+        return escape(sentence[0].upper() + sentence[1:] + ".")
+
+    def _paragraph(self, rnd, kind, formulas):
+        parts = [self._sentence(rnd, kind) for _ in range(max(1, self.shape.sentences_per_paragraph))]
+        if formulas and rnd.random() < 0.3:
+            parts.insert(1, f"<inline-formula><mml:math><mml:mi>x</mml:mi><mml:mo>=</mml:mo>"
+                            f"<mml:mn>{rnd.randint(1, 99)}</mml:mn></mml:math></inline-formula>")
+        if rnd.random() < 0.3:
+            parts.append(f'<xref ref-type="bibr" rid="R{rnd.randint(1, max(1, self.shape.refs))}">'
+                         f'{rnd.randint(1, 50)}</xref>')
+        return "<p>" + " ".join(parts) + "</p>"
+
+    def _section(self, rnd, kind, index, depth=0):
+        shape = self.shape
+        inner = [f"<title>Section {index}</title>"]
+        inner += [self._paragraph(rnd, kind, shape.formulas) for _ in range(shape.paragraphs_per_section)]
+        if depth == 0 and rnd.random() < shape.nested_sections:
+            inner.append(self._section(rnd, kind, f"{index}.1", depth + 1))
+        return f'<sec id="s{index}">' + "".join(inner) + "</sec>"
+
+    def _floats(self, rnd):
+        shape = self.shape
+        parts = []
+        for i in range(shape.tables):
+            rows = "".join(f"<tr><td>{rnd.random():.4f}</td><td>{rnd.random():.4f}</td></tr>" for _ in range(20))
+            parts.append(f'<table-wrap id="T{i}"><label>Table {i + 1}</label><table>{rows}</table></table-wrap>')
+        for i in range(shape.figures):
+            parts.append(f'<fig id="F{i}"><label>Figure {i + 1}</label><caption><p>Figure caption '
+                         f'{i + 1} with some descriptive text.</p></caption><graphic/></fig>')
+        for i in range(shape.formulas):
+            parts.append(f'<disp-formula id="E{i}"><mml:math><mml:mi>y</mml:mi><mml:mo>=</mml:mo>'
+                         f'<mml:mn>{i}</mml:mn></mml:math></disp-formula>')
+        return parts
+
+    def _references(self, rnd):
+        refs = []
+        for i in range(1, self.shape.refs + 1):
+            refs.append(
+                f'<ref id="R{i}"><label>{i}</label><element-citation publication-type="journal">'
+                f'<person-group person-group-type="author"><name><surname>Author{i % 17}</surname>'
+                f'<given-names>A</given-names></name></person-group>'
+                f'<article-title>{self._sentence(rnd, "other")}</article-title>'
+                f'<source>Journal {i % 11}</source><year>{1990 + i % 30}</year><volume>{i}</volume>'
+                f'<fpage>{i * 3}</fpage><lpage>{i * 3 + 9}</lpage>'
+                f'<pub-id pub-id-type="doi">10.5555/ref.{i}</pub-id>'
+                f'<pub-id pub-id-type="pmid">{3000000 + i}</pub-id></element-citation></ref>')
+        return "<ref-list><title>References</title>" + "".join(refs) + "</ref-list>"
+
+    def article(self, index: int) -> bytes:
+        rnd = random.Random(self.shape.seed * 1000003 + index)
+        kind = self._kind(rnd)
+        shape = self.shape
+        abstract = "".join(self._paragraph(rnd, kind, False) for _ in range(shape.abstract_paragraphs))
+        keywords = "".join(f"<kwd>{escape(w)}</kwd>" for w in rnd.sample(SyntheticCorpus.topic_words[kind], 3))
+        sections = [self._section(rnd, kind, i + 1) for i in range(shape.sections)]
+        floats = self._floats(rnd)
+        if sections:
+            # tables, figures and display formulas sit inside the sections, as in most PMC files
+            for item in floats:
+                i = rnd.randrange(len(sections))
+                sections[i] = sections[i][:-len("</sec>")] + item + "</sec>"
+            floats = []
+        body = "".join(sections)
+        xml = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE article PUBLIC "-//NLM//DTD JATS (Z39.96) Journal Archiving and Interchange DTD v1.2 20190208//EN" '
+            '"JATS-archivearticle1.dtd">\n'
+            '<article xmlns:mml="http://www.w3.org/1998/Math/MathML" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            'article-type="research-article"><front>'
+            '<journal-meta><journal-id journal-id-type="nlm-ta">Synth J</journal-id>'
+            '<journal-title-group><journal-title>Synthetic Journal</journal-title></journal-title-group>'
+            '<publisher><publisher-name>Synthetic Press</publisher-name></publisher></journal-meta>'
+            '<article-meta>'
+            f'<article-id pub-id-type="pmid">{1000000 + index}</article-id>'
+            f'<article-id pub-id-type="pmc">PMC{2000000 + index}</article-id>'
+            f'<article-id pub-id-type="doi">10.5555/synth.{index}</article-id>'
+            f'<title-group><article-title>{SyntheticCorpus.titles[kind]} {index}</article-title></title-group>'
+            '<contrib-group><contrib contrib-type="author" corresp="yes"><name><surname>Doe</surname>'
+            '<given-names>Jane</given-names></name><contrib-id contrib-id-type="orcid">0000-0000-0000-0001'
+            '</contrib-id><email>jane@example.org</email></contrib>'
+            '<contrib contrib-type="author"><name><surname>Roe</surname><given-names>Rick</given-names></name>'
+            '</contrib></contrib-group><aff id="A1">Department of Synthetic Studies, Example University</aff>'
+            f'<pub-date pub-type="epub"><day>{rnd.randint(1, 28)}</day><month>{rnd.randint(1, 12)}</month>'
+            f'<year>{2000 + index % 25}</year></pub-date><volume>{index % 50}</volume><issue>{index % 12}</issue>'
+            '<fpage>1</fpage><lpage>12</lpage>'
+            '<permissions><license><p>Open access under CC BY 4.0.</p></license></permissions>'
+            '<self-uri content-type="pdf" xlink:href="article.pdf"/>'
+            f'<abstract>{abstract}</abstract><kwd-group>{keywords}</kwd-group>'
+            '<funding-group><award-group><funding-source>Synthetic Foundation</funding-source>'
+            '<award-id>SF-001</award-id></award-group></funding-group>'
+            '</article-meta></front>'
+            f'<body>{body}</body>'
+            '<back><ack><p>We thank everyone.</p></ack>'
+            '<fn-group><fn fn-type="ethics-statement"><p>Approved by the ethics board.</p></fn></fn-group>'
+            f'{self._references(rnd)}</back>'
+            f'<floats-group>{"".join(floats)}</floats-group></article>'
+        )
+        return xml.encode("utf-8")
+
+    def __iter__(self):
+        for index in range(self.shape.count):
+            yield f"PMC{2000000 + index}.xml", self.article(index)
+
+    def write(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        for name, data in self:
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(data)
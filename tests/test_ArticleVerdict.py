@@ -0,0 +1,45 @@
+import pytest
+from ArticleModel import ArticleModel
+from ArticleVerdict import ArticleVerdict
+from ProcessDataSrv import ProcessDataSrv
+
+
+def jats(title, abstract):
+    return (f"<article><front><article-meta><title-group><article-title>{title}</article-title></title-group>"
+            f"<abstract><p>{abstract}</p></abstract></article-meta></front>"
+            f"<body><sec><p>A body paragraph.</p></sec></body></article>").encode("utf-8")
+
+
+@pytest.mark.parametrize("title, abstract, reason, signals", [
+    ("Soil bacteria", "Soil bacteria were studied.", ArticleVerdict.NOT_BREAST, ("breast:0",)),
+    ("Breast cancer in mice", "Breast tumors in mice were studied.", ArticleVerdict.ANIMAL,
+     ("breast:2", "breast_in_title", "breast_context", "animal:mice")),
+    ("Breast cancer cell signalling", "Breast cancer signalling pathways in tumor tissue.", ArticleVerdict.NO_HUMAN,
+     ("breast:2", "breast_in_title", "breast_context")),
+])
+def test_rejected_file_comes_back_as_a_verdict(title, abstract, reason, signals):
+    verdict = ProcessDataSrv.process_bytes(jats(title, abstract), "PMC1.xml")
+    assert isinstance(verdict, ArticleVerdict)
+    assert (verdict.ArtFileName, verdict.Reason, verdict.Signals) == ("PMC1.xml", reason, signals)
+    assert verdict.NonTarget and not verdict.Duplicate and not verdict.Skipped
+
+
+def test_target_file_comes_back_as_an_article():
+    article = ProcessDataSrv.process_bytes(jats("Breast cancer in women", "Breast cancer patients were studied."),
+                                           "PMC1.xml")
+    assert isinstance(article, ArticleModel)
+    assert not article.NonTarget and not article.Duplicate
+
+
+@pytest.mark.parametrize("model", [ArticleModel(), ArticleVerdict()])
+def test_models_use_slots(model):
+    assert not hasattr(model, "__dict__")
+    with pytest.raises(AttributeError):
+        model.Unknown = 1
+
+
+def test_verdict_to_dict():
+    verdict = ArticleVerdict("PMC1.xml", ArticleVerdict.ANIMAL, ("animal:mice",))
+    assert verdict.to_dict() == {"ArtFileName": "PMC1.xml", "Reason": "animal", "Signals": ("animal:mice",),
+                                 "NonTarget": True, "Duplicate": False, "Skipped": False, "FilterZone": b"",
+                                 "Truncated": ""}
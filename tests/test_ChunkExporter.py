@@ -0,0 +1,44 @@
+from ChunkExporter import Chunker
+
+
+def paragraph(number, sentences=6, words=9):
+    # sentences of `words` words plus a full stop, distinct per paragraph and sentence
+    return " ".join(" ".join(f"p{number}s{s}w{w}" for w in range(words)) + "." for s in range(sentences))
+
+
+def test_chunks_stay_within_the_token_budget():
+    chunker = Chunker(max_tokens=100, overlap_tokens=30)
+    chunks = chunker.chunk([(("Intro",), paragraph(n)) for n in range(5)] + [(("Intro",), "word " * 250)])
+    assert chunks
+    for chunk in chunks:
+        assert chunk["tokens"] == Chunker.count_tokens(chunk["text"])
+        assert chunk["tokens"] <= 100
+    assert [chunk["chunk"] for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_paragraphs_longer_than_the_overlap_still_overlap():
+    # 60-token paragraphs, 30 tokens of overlap: the last sentences of a paragraph are carried
+    chunker = Chunker(max_tokens=100, overlap_tokens=30)
+    chunks = chunker.chunk([(("Results",), paragraph(n)) for n in range(4)])
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        carried = chunk["text"].split("\n\n")[0]
+        assert previous["text"].endswith(carried)
+        assert 0 < Chunker.count_tokens(carried) <= 30
+
+
+def test_sentence_longer_than_the_overlap_carries_its_last_words():
+    chunker = Chunker(max_tokens=50, overlap_tokens=10)
+    chunks = chunker.chunk([(("Results",), " ".join(f"w{n}" for n in range(120)))])
+    assert len(chunks) > 1
+    second = chunks[1]["text"].split()
+    assert second[:10] == chunks[0]["text"].split()[-10:]
+
+
+def test_chunks_never_span_top_level_sections():
+    chunker = Chunker(max_tokens=100, overlap_tokens=30)
+    chunks = chunker.chunk([(("Intro",), paragraph(0, sentences=2)), (("Intro", "Aim"), paragraph(1, sentences=2)),
+                            (("Methods",), paragraph(2, sentences=2))])
+    assert [chunk["sections"] for chunk in chunks] == [["Intro", "Intro > Aim"], ["Methods"]]
+    # nothing of the previous section is carried over
+    assert "p1" not in chunks[1]["text"]
@@ -0,0 +1,55 @@
+import pytest
+from ClassificationCache import ClassificationCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "cache.sqlite"), commit_every=2)
+    cache.open()
+    yield cache
+    cache.close()
+
+
+def classify_breast(title_text, check_zone, mesh_text):
+    # stand-in rules: a file is a target when its zone mentions breast
+    return ("breast" not in check_zone), ("" if "breast" in check_zone else "not_breast")
+
+
+def rows(cache):
+    return cache.conn.execute(
+        "SELECT FilePath, NonTarget, Reason, RulesHash, ArticlesID FROM Classifications ORDER BY FilePath").fetchall()
+
+
+def test_pack_round_trips_the_filter_inputs():
+    zone = ClassificationCache.pack("breast cancer", "breast cancer patients", "humans")
+    assert isinstance(zone, bytes)
+    assert ClassificationCache.unpack(zone) == ("breast cancer", "breast cancer patients", "humans")
+
+
+def test_record_replaces_the_row_of_a_file(cache):
+    cache.record("a.xml", "h1", ClassificationCache.pack("t", "soil", ""), True, "not_breast", "old")
+    cache.record("a.xml", "h2", ClassificationCache.pack("t", "breast", ""), False, "", "new")
+    cache.set_article_id("a.xml", 7)
+    assert rows(cache) == [("a.xml", 0, "", "new", 7)]
+    assert cache.stale_count("new") == 0 and cache.stale_count("newer") == 1
+
+
+def test_reclassify_returns_the_flipped_files(cache):
+    # a.xml was stored and is NonTarget now, b.xml was rejected and is a target now
+    cache.record("a.xml", "h", ClassificationCache.pack("t", "soil", ""), False, "", "old")
+    cache.set_article_id("a.xml", 1)
+    cache.record("b.xml", "h", ClassificationCache.pack("t", "breast", ""), True, "no_human", "old")
+    cache.record("c.xml", "h", ClassificationCache.pack("t", "breast", ""), False, "", "old")
+    cache.commit()
+
+    changes = cache.reclassify(classify_breast, "new", apply=False)
+    assert changes == [("a.xml", True, "", "not_breast", 1), ("b.xml", False, "no_human", "", None)]
+    assert cache.stale_count("new") == 3
+
+    assert cache.reclassify(classify_breast, "new") == changes
+    # b.xml keeps its old row until it has been processed again
+    assert rows(cache) == [("a.xml", 1, "not_breast", "new", 1), ("b.xml", 1, "no_human", "old", None),
+                           ("c.xml", 0, "", "new", None)]
+    assert cache.pending_removals() == [1]
+    cache.clear_article_ids([1])
+    assert cache.pending_removals() == []
@@ -0,0 +1,31 @@
+import os
+from DiscoverySrv import DiscoverySrv
+
+
+def make_tree(root):
+    (root / "b" / "c").mkdir(parents=True)
+    for path in ("1.xml", "b/2.xml", "b/c/3.xml", "b/notes.txt"):
+        (root / path).write_bytes(b"<article/>")
+
+
+def names(paths, root):
+    return sorted(os.path.relpath(path, root).replace(os.sep, "/") for path in paths)
+
+
+def test_symlinked_folder_loop_is_not_followed(tmp_path):
+    make_tree(tmp_path)
+    os.symlink(tmp_path, tmp_path / "b" / "c" / "loop", target_is_directory=True)
+    discovery = DiscoverySrv(str(tmp_path))
+    assert names(discovery, tmp_path) == ["1.xml", "b/2.xml", "b/c/3.xml"]
+    assert discovery.files == 3
+
+
+def test_files_come_before_subfolders(tmp_path):
+    make_tree(tmp_path)
+    assert [os.path.basename(path) for path in DiscoverySrv(str(tmp_path))] == ["1.xml", "2.xml", "3.xml"]
+
+
+def test_shards_split_the_files_without_overlap(tmp_path):
+    make_tree(tmp_path)
+    shards = [names(DiscoverySrv(str(tmp_path), (index, 2)), tmp_path) for index in range(2)]
+    assert sorted(shards[0] + shards[1]) == ["1.xml", "b/2.xml", "b/c/3.xml"]
@@ -0,0 +1,54 @@
+from ArticleModel import ArticleModel
+from ArticleVerdict import ArticleVerdict
+from DuplicateIndex import DuplicateIndex
+from ProcessDataSrv import ProcessDataSrv
+
+ARTICLE = b"""<article><front><article-meta>
+<article-id pub-id-type="doi">10.1000/ABC</article-id>
+<article-id pub-id-type="pmid">123</article-id>
+<article-id pub-id-type="pmc">PMC456</article-id>
+<title-group><article-title>Breast cancer in women</article-title></title-group>
+<abstract><p>Breast cancer patients.</p></abstract>
+</article-meta></front>
+<body><sec><title>Results</title><p>A body paragraph.</p></sec></body></article>"""
+
+
+def test_doi_is_trimmed_and_case_insensitive():
+    index = DuplicateIndex()
+    index.add(doi=" 10.1000/ABC ")
+    assert index.contains(doi="10.1000/abc")
+    assert not index.contains(doi="10.1000/abd")
+    assert not index.contains(doi="") and not index.contains()
+    assert len(index) == 1
+
+
+def test_any_matching_key_is_a_duplicate():
+    index = DuplicateIndex()
+    index.add(doi="10.1/a", pmid=123, bank_id=456)
+    assert index.contains(pmid="123")
+    assert index.contains(doi="10.1/other", bank_id=456)
+    assert not index.contains(doi="10.1/other", pmid=124, bank_id=457)
+    assert len(index) == 3
+
+
+def test_discard_removes_the_keys_of_a_failed_write():
+    index = DuplicateIndex()
+    article = ArticleModel(ArtDoi="10.1/a", Pmid=123, BankId=None)
+    index.add_article(article)
+    assert index.contains_article(article)
+    index.discard_article(article)
+    assert not index.contains_article(article) and len(index) == 0
+
+
+def test_known_article_comes_back_as_a_duplicate_verdict(monkeypatch):
+    index = DuplicateIndex()
+    index.add(pmid=123)
+    monkeypatch.setattr(ProcessDataSrv, "duplicate_index", index)
+    verdict = ProcessDataSrv.process_bytes(ARTICLE, "PMC456.xml")
+    assert isinstance(verdict, ArticleVerdict) and verdict.Duplicate and not verdict.NonTarget
+    assert verdict.Reason == ArticleVerdict.DUPLICATE
+    assert verdict.Signals == ("doi:10.1000/ABC", "pmid:123", "pmc:456")
+
+    monkeypatch.setattr(ProcessDataSrv, "duplicate_index", DuplicateIndex())
+    article = ProcessDataSrv.process_bytes(ARTICLE, "PMC456.xml")
+    assert isinstance(article, ArticleModel) and article.BankId == 456
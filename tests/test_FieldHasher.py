@@ -0,0 +1,24 @@
+from ArticleModel import ArticleModel
+from FieldHasher import FieldHasher
+
+
+def test_copy_in_another_file_hashes_the_same():
+    first = ArticleModel(ArtTitle="t", ArtBody="b", ArtDoi="10.1/a", ArtFileName="a.xml", BankNo=1)
+    copy = ArticleModel(ArtTitle="t", ArtBody="b", ArtDoi="10.1/a", ArtFileName="a_copy.xml", BankNo=2)
+    assert "ArtFileName" not in FieldHasher.columns
+    assert FieldHasher.changed(FieldHasher.compute(copy), FieldHasher.compute(first)) == []
+
+
+def test_changed_lists_only_the_revised_columns():
+    stored = FieldHasher.compute(ArticleModel(ArtTitle="t", ArtBody="b", ArtDoi="10.1/a"))
+    revised = FieldHasher.compute(ArticleModel(ArtTitle="t", ArtBody="b2", ArtDoi="10.1/a", ArtIssue="3"))
+    assert FieldHasher.changed(revised, stored) == ["ArtIssue", "ArtBody"]
+
+
+def test_none_and_empty_hash_alike():
+    assert FieldHasher.hash_value(None) == FieldHasher.hash_value("")
+
+
+def test_without_stored_hashes_every_column_changed():
+    hashes = FieldHasher.compute(ArticleModel(ArtTitle="t"))
+    assert FieldHasher.changed(hashes, None) == list(FieldHasher.columns)
@@ -0,0 +1,64 @@
+import pytest
+from FuzzyKeywordIndex import FuzzyKeywordIndex
+from ProcessDataSrv import ProcessDataSrv
+
+
+@pytest.fixture(scope="module")
+def index():
+    keywords = [("human_cells", keyword) for keyword in ProcessDataSrv.human_breast_cells]
+    keywords += [("animal", keyword) for keyword in ("mouse", "zebrafish", "xenopus laevis")]
+    return FuzzyKeywordIndex(keywords, max_distance=1, min_length=7)
+
+
+@pytest.mark.parametrize("text, keyword", [
+    ("cultured sk br 3 cells", "sk-br-3"),
+    ("the BT 474 line", "bt-474"),
+    ("T 47D cells were used", "t47d"),
+    ("mda mb 231 cells", "mda-mb-231"),
+    ("MDA-MB 23 1 cells", "mda-mb-231"),
+])
+def test_split_cell_lines_match(index, text, keyword):
+    assert ("human_cells", keyword) in index.find(text)
+
+
+def test_short_keywords_only_match_exactly(index):
+    assert index.find("a house in town") == []
+    assert index.find("a mouse model") == [("animal", "mouse")]
+
+
+def test_misspelled_long_keyword_matches(index):
+    assert index.find("zebrafsh embryos") == [("animal", "zebrafish")]
+
+
+def test_joined_tokens_must_spell_the_keyword(index):
+    assert index.find("xenopus laevis oocytes") == [("animal", "xenopus laevis")]
+    assert index.find("xenopus laevls oocytes") == []
+
+
+def test_unrelated_short_tokens_do_not_join(index):
+    assert index.find("s k b r in t a") == []
+
+
+@pytest.fixture(scope="module")
+def filter_index():
+    # the lists and stop words of the Stage 2 filter
+    keywords = [(category, word) for category, words in (
+        ("human", ProcessDataSrv.human_indicators), ("animal", ProcessDataSrv.animal_keywords),
+        ("human_cells", ProcessDataSrv.human_breast_cells),
+        ("animal_cells", ProcessDataSrv.animal_breast_cells)) for word in words]
+    return FuzzyKeywordIndex(keywords, 1, 7, exact_words=ProcessDataSrv.fuzzy_exact_words)
+
+
+@pytest.mark.parametrize("text", [
+    "stage 4 T1 tumors",
+    "Figure 4 T1-weighted images",
+    "paternal age at birth",
+    "the material was stained",
+])
+def test_no_false_category_hits(filter_index, text):
+    assert filter_index.find(text) == []
+
+
+def test_exact_words_still_match_exactly(filter_index):
+    assert filter_index.find("maternal age") == [("human", "maternal")]
+    assert filter_index.find("4T1 cells") == [("animal_cells", "4t1")]
@@ -0,0 +1,70 @@
+from KeywordMatcher import KeywordMatcher
+from ProcessDataSrv import ProcessDataSrv
+
+
+def make_matcher(**lists):
+    keywords = {
+        "breast_keywords": ["breast", "mammary"],
+        "breast_context_words": ["cancer", "tumor"],
+        "human_indicators": ["patients", "women"],
+        "animal_keywords": ["mice", "rat"],
+        "human_breast_cells": ["mcf-7"],
+        "animal_breast_cells": ["4t1"],
+    }
+    keywords.update(lists)
+    return KeywordMatcher(**keywords)
+
+
+def test_empty_category_never_matches():
+    matcher = make_matcher(animal_keywords=[], animal_breast_cells=[])
+    hits = matcher.scan("breast cancer", "breast cancer in women treated at our clinic")
+    assert hits.animal == []
+    assert hits.animal_cells == []
+    assert hits.human == ["women"]
+
+
+def test_empty_breast_lists_never_match():
+    matcher = make_matcher(breast_keywords=[], breast_context_words=[])
+    hits = matcher.scan("breast cancer", "breast cancer in women")
+    assert hits.breast_count == 0
+    assert not hits.breast_in_title
+    assert not hits.breast_context
+
+
+def test_empty_animal_list_does_not_reject_human_study(monkeypatch):
+    monkeypatch.setattr(ProcessDataSrv, "animal_keywords", [])
+    monkeypatch.setattr(ProcessDataSrv, "_matcher", None)
+    try:
+        title = "breast cancer outcomes"
+        zone = "breast cancer outcomes in women treated with surgery"
+        non_target, hits = ProcessDataSrv.classify(title, zone, "")
+        assert not non_target
+        assert hits.animal == []
+    finally:
+        ProcessDataSrv._matcher = None
+
+
+# (title, rest of the check zone, MeSH terms, NonTarget) as decided by the original per-keyword
+# regex filter of ProcessDataSrv
+VERDICTS = [
+    ('breast cancer in women', '', '', False),
+    ('breast cancer', 'breast cancer in 120 patients treated with surgery', '', True),
+    ('tumour growth', 'mammary gland development and breast epithelium in women', '', False),
+    ('tumour growth', 'breast tissue of one woman', '', True),
+    ('mcf-7 study', 'breast mcf-7 cells from a human donor', '', False),
+    ('breast cancer in mice', 'breast cancer in mice and women', '', True),
+    ('breast tumors', 'breast tumors in 4t1 models of female patients', '', True),
+    ('breast cancer', 'breast cancer in wistar rats and patients', '', True),
+    ('lung cancer', 'lung cancer in women', '', True),
+    ('breast cancer', 'breast cancer cohort', '', False),
+    ('breast cancer', 'breast cancer in a mouse-free study of volunteers', '', True),
+    ('breast reconstruction', 'breast reconstruction outcomes', 'humans | female', False),
+    ('mammary tumor', 'mammary tumor in the c. elegans model and women', '', True),
+    ('breast cancer screening', 'breast cancer screening by mammography', '', False),
+    ('breastfeeding duration', 'breastfeeding duration and maternal health', '', True),
+]
+
+
+def test_verdicts_match_the_original_filter():
+    for title, rest, mesh, non_target in VERDICTS:
+        assert ProcessDataSrv.classify(title, f"{title} {rest} {mesh}", mesh)[0] == non_target, title
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import pytest
+from ArticleModel import ArticleModel
+from ReferenceModel import ReferenceModel
+from FieldHasher import FieldHasher
+from DiscoverySrv import DiscoverySrv
+from ManifestSrv import ManifestSrv
+from OutputSinks import SqliteSink
+from PipelineSrv import PipelineResult
+
+pytest.importorskip("pymssql")  # Main imports SqlServerSrv
+import Main  # noqa: E402
+from ProcessDataSrv import ProcessDataSrv  # noqa: E402
+
+SETTINGS = ("duplicate_index", "chunker", "keep_filter_zone", "field_hashes", "minhash", "fuzzy_distance",
+            "fuzzy_min_length", "max_file_bytes", "oversize_mode", "huge_tree")
+
+
+@pytest.fixture(autouse=True)
+def restore_settings(monkeypatch):
+    # Main.main configures ProcessDataSrv at class level; keep one run's options out of the next
+    for name in SETTINGS:
+        monkeypatch.setattr(ProcessDataSrv, name, getattr(ProcessDataSrv, name))
+
+
+def make_result(index, path, doi):
+    article = ArticleModel(ArtTitle="t", ArtBody="b", ArtAbstract="a", ArtDoi=doi, ArtFileName=path)
+    article.References = [ReferenceModel(Seq=1, RefText="A ref. 2020")]
+    return PipelineResult(index, path, article, None, "hash", 10, {}, (10, 1.0))
+
+
+def outcomes(manifest):
+    return dict(manifest.conn.execute("SELECT FilePath, Outcome FROM ProcessedFiles"))
+
+
+def test_failed_references_leave_articles_to_retry(tmp_path, monkeypatch):
+    sink = SqliteSink(str(tmp_path / "articles.sqlite"), refs_table="Refs")
+    sink.open()
+    manifest = ManifestSrv(str(tmp_path / "manifest.sqlite"))
+    manifest.open()
+
+    def fail(rows):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(sink, "_write_references", fail)
+    stats = Main.new_stats()
+    batch = [make_result(0, "a.xml", "10.1/a"), make_result(1, "b.xml", "10.1/b")]
+    Main.write_batch(sink, batch, stats, manifest, refs_table="Refs")
+
+    assert stats["Target"] == 0 and stats["error"] == 2
+    assert outcomes(manifest) == {"a.xml": "error", "b.xml": "error"}
+    # removed again, so the retry is not rejected as a duplicate DOI
+    assert sink.conn.execute("SELECT COUNT(*) FROM Articles").fetchone()[0] == 0
+
+    monkeypatch.undo()
+    stats = Main.new_stats()
+    Main.write_batch(sink, batch, stats, manifest, refs_table="Refs")
+    assert stats["Target"] == 2
+    assert outcomes(manifest) == {"a.xml": "Target", "b.xml": "Target"}
+    assert sink.conn.execute("SELECT COUNT(*) FROM Refs").fetchone()[0] == 2
+    manifest.close()
+    sink.close()
+
+
+def test_missing_input_still_closes_outputs(tmp_path, monkeypatch):
+    closed = []
+    monkeypatch.setattr(Main.ManifestSrv, "close", lambda self: closed.append("manifest"))
+    monkeypatch.setattr(Main.ClassificationCache, "close", lambda self: closed.append("cache"))
+    monkeypatch.setattr(Main.NearDuplicateIndex, "close", lambda self: closed.append("near_dups"))
+    Main.main(["--input", str(tmp_path / "missing"), "--output", str(tmp_path / "out"), "--sink", "sqlite",
+               "--classification-cache", str(tmp_path / "cache.sqlite"),
+               "--near-dup-index", str(tmp_path / "near.sqlite")])
+    assert sorted(closed) == ["cache", "manifest", "near_dups"]
+
+
+def test_duplicate_of_a_truncated_file_stays_truncated(tmp_path):
+    manifest = ManifestSrv(str(tmp_path / "manifest.sqlite"))
+    manifest.open()
+    result = make_result(0, "a.xml", "10.1/a")
+    result.article.Truncated = "too_large"
+    stats = Main.new_stats()
+    Main.record_duplicate(stats, manifest, result)
+    assert stats["doubleDOI"] == 1
+    # recorded so that it is retried once the budget covers the whole file
+    assert outcomes(manifest) == {"a.xml": "truncated"}
+    manifest.close()
+
+
+def make_revision_result(index, path, body):
+    result = make_result(index, path, "10.1/a")
+    result.article.ArtBody = body
+    result.article.FieldHashes = FieldHasher.compute(result.article)
+    return result
+
+
+def test_update_revised_updates_revisions_and_counts_copies_as_duplicates(tmp_path):
+    sink = SqliteSink(str(tmp_path / "articles.sqlite"), hashes_table="Hashes")
+    sink.open()
+    manifest = ManifestSrv(str(tmp_path / "manifest.sqlite"))
+    manifest.open()
+    revisions = {"updated": 0, "unchanged": 0, "columns": 0}
+    stats = Main.new_stats()
+    Main.write_batch(sink, [make_revision_result(0, "a.xml", "b")], stats, manifest, revisions=revisions)
+    Main.write_batch(sink, [make_revision_result(1, "a_copy.xml", "b")], stats, manifest, revisions=revisions)
+    assert stats["Target"] == 1 and stats["doubleDOI"] == 1
+    assert revisions == {"updated": 0, "unchanged": 1, "columns": 0}
+
+    Main.write_batch(sink, [make_revision_result(2, "a_v2.xml", "b2")], stats, manifest, revisions=revisions)
+    assert revisions == {"updated": 1, "unchanged": 1, "columns": 1}
+    assert sink.conn.execute("SELECT ArtBody, ArtFileName FROM Articles").fetchall() == [("b2", "a_v2.xml")]
+    assert outcomes(manifest) == {"a.xml": "Target", "a_copy.xml": "doubleDOI", "a_v2.xml": "updated"}
+    manifest.close()
+    sink.close()
+
+
+def jats(doi, pmid, words):
+    body = " ".join(words)
+    return (f"<article><front><article-meta><article-id pub-id-type='doi'>{doi}</article-id>"
+            f"<article-id pub-id-type='pmid'>{pmid}</article-id>"
+            f"<title-group><article-title>Breast cancer in women</article-title></title-group>"
+            f"<abstract><p>Breast cancer patients were studied.</p></abstract></article-meta></front>"
+            f"<body><sec><title>Results</title><p>{body}</p></sec></body></article>").encode("utf-8")
+
+
+def test_skipped_near_duplicate_does_not_block_its_identifiers(tmp_path):
+    text = [f"word{n}" for n in range(80)]
+    other = [f"term{n}" for n in range(80)]
+    (tmp_path / "in" / "1" / "2").mkdir(parents=True)
+    # discovered in this order: a, then its near duplicate b, then c with b's identifiers
+    (tmp_path / "in" / "a.xml").write_bytes(jats("10.1/a", 1, text))
+    (tmp_path / "in" / "1" / "b.xml").write_bytes(jats("10.1/b", 2, text))
+    (tmp_path / "in" / "1" / "2" / "c.xml").write_bytes(jats("10.1/b", 2, other))
+    Main.main(["--input", str(tmp_path / "in"), "--output", str(tmp_path / "out"), "--sink", "sqlite",
+               "--no-resume", "--duplicate-index", "--near-dup-index", str(tmp_path / "near.sqlite"),
+               "--near-dup-skip", "0.9", "--manifest", str(tmp_path / "manifest.sqlite")])
+    manifest = ManifestSrv(str(tmp_path / "manifest.sqlite"))
+    manifest.open()
+    assert {os.path.basename(path): outcome for path, outcome in outcomes(manifest).items()} == {
+        "a.xml": "Target", "b.xml": "nearDup", "c.xml": "Target"}
+    manifest.close()
+
+
+def test_failed_near_dup_open_keeps_its_error(tmp_path, monkeypatch):
+    def fail(self):
+        raise sqlite3.OperationalError("unable to open database file")
+
+    monkeypatch.setattr(Main.NearDuplicateIndex, "open", fail)
+    (tmp_path / "in").mkdir()
+    with pytest.raises(sqlite3.OperationalError, match="unable to open"):
+        Main.main(["--input", str(tmp_path / "in"), "--output", str(tmp_path / "out"), "--sink", "sqlite",
+                   "--near-dup-index", str(tmp_path / "near.sqlite"), "--manifest", str(tmp_path / "m.sqlite")])
+
+
+def run_articles(tmp_path, name, workers):
+    Main.main(["--input", str(tmp_path / "in"), "--output", str(tmp_path / name), "--sink", "sqlite", "--no-resume",
+               "--workers", str(workers), "--max-in-flight", "2", "--batch-size", "3"])
+    conn = sqlite3.connect(str(tmp_path / name / "process_Articles.sqlite"))
+    rows = conn.execute("SELECT ArticlesID, ArtFileName, ArtDoi FROM Articles ORDER BY ArticlesID").fetchall()
+    conn.close()
+    return rows
+
+
+def test_worker_processes_keep_input_order(tmp_path):
+    (tmp_path / "in").mkdir()
+    for n in range(8):
+        words = [f"w{n}x{i}" for i in range(20 + 400 * (n % 3))]  # uneven sizes finish out of order
+        data = jats(f"10.1/{n}", n + 1, words)
+        if n % 4 == 3:
+            data = data.replace(b"Breast cancer", b"Soil bacteria")
+        (tmp_path / "in" / f"{n}.xml").write_bytes(data)
+    discovered = [os.path.basename(path) for path in DiscoverySrv(str(tmp_path / "in"))]
+    inline = run_articles(tmp_path, "inline", 0)
+    assert [row[1] for row in inline] == [name for name in discovered if name not in ("3.xml", "7.xml")]
+    assert run_articles(tmp_path, "pooled", 2) == inline
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\r\n").split(",") for line in f]
+
+
+def test_reclassify_removes_articles_that_became_non_target(tmp_path):
+    sink = SqliteSink(str(tmp_path / "articles.sqlite"))
+    sink.open()
+    assert sink.write_batch([make_result(0, "a.xml", "10.1/a").article]) == [1]
+    cache = Main.ClassificationCache(str(tmp_path / "cache.sqlite"))
+    cache.open()
+    # a.xml was stored under earlier rules but is NonTarget under the current ones; b.xml is the reverse
+    soil = Main.ClassificationCache.pack("soil bacteria", "soil bacteria were studied.", "")
+    breast = Main.ClassificationCache.pack("breast cancer in women",
+                                           "breast cancer in women breast cancer patients were studied.", "")
+    cache.record("a.xml", "h", soil, False, "", "old")
+    cache.set_article_id("a.xml", 1)
+    cache.record("b.xml", "h", breast, True, "no_human", "old")
+    diff_path = str(tmp_path / "diff.csv")
+
+    assert Main.reclassify(cache, sink, "new", diff_path, dry_run=True) is None
+    assert read_csv(diff_path)[1:] == [["a.xml", "excluded", "", "not_breast", "1"],
+                                       ["b.xml", "included", "no_human", "", ""]]
+    assert sink.conn.execute("SELECT COUNT(*) FROM Articles").fetchone()[0] == 1
+    assert cache.stale_count("new") == 2
+
+    assert Main.reclassify(cache, sink, "new", diff_path) == ["b.xml"]
+    assert sink.conn.execute("SELECT COUNT(*) FROM Articles").fetchone()[0] == 0
+    assert cache.pending_removals() == []
+    cache.close()
+    sink.close()
@@ -0,0 +1,37 @@
+from ManifestSrv import ManifestSrv
+
+
+def make_manifest(tmp_path):
+    manifest = ManifestSrv(str(tmp_path / "manifest.sqlite"))
+    manifest.open()
+    return manifest
+
+
+def test_processed_file_is_skipped(tmp_path):
+    path = tmp_path / "PMC1.xml"
+    path.write_bytes(b"<article/>")
+    manifest = make_manifest(tmp_path)
+    manifest.record(str(path), "Target")
+    assert manifest.is_processed(str(path))
+    manifest.close()
+
+
+def test_error_too_large_and_truncated_are_retried(tmp_path):
+    manifest = make_manifest(tmp_path)
+    for outcome in ("error", "too_large", "truncated"):
+        path = tmp_path / f"{outcome}.xml"
+        path.write_bytes(b"<article/>")
+        manifest.record(str(path), outcome)
+        assert not manifest.is_processed(str(path))
+    manifest.close()
+
+
+def test_touched_member_is_compared_by_content_hash(tmp_path):
+    manifest = make_manifest(tmp_path)
+    archive = str(tmp_path / "bulk.tar.gz")
+    key = archive + "!a/PMC1.nxml"
+    manifest.record(key, "Target", "abc", (100, 1.0))
+    assert manifest.is_member_processed(archive, key, 100, 1.0, "ignored")
+    assert manifest.is_member_processed(archive, key, 100, 2.0, "abc")
+    assert not manifest.is_member_processed(archive, key, 100, 2.0, "def")
+    manifest.close()
@@ -0,0 +1,17 @@
+from MetricsSrv import MetricsSrv
+
+
+def test_slowest_keeps_top_n():
+    metrics = MetricsSrv(top_n=2)
+    for seconds, path in ((0.1, "a"), (0.3, "b"), (0.2, "c")):
+        metrics.observe_file(path, 100, {"read": seconds})
+    assert [entry["path"] for entry in metrics.summary()["slowest_files"]] == ["b", "c"]
+
+
+def test_no_slowest_report():
+    metrics = MetricsSrv(top_n=0)
+    metrics.observe_file("a", 100, {"read": 0.1})
+    metrics.observe_file("b", 100, {"read": 0.2})
+    summary = metrics.summary()
+    assert summary["files"] == 2
+    assert summary["slowest_files"] == []
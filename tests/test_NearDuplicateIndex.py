@@ -0,0 +1,51 @@
+import random
+import pytest
+from NearDuplicateIndex import NearDuplicateIndex
+
+WORDS = ("tumor cells breast cancer patients expression receptor signaling cohort analysis study "
+         "estrogen therapy survival biopsy tissue growth factor response clinical trial").split()
+
+
+def text(seed, count=300):
+    generator = random.Random(seed)
+    return " ".join(generator.choice(WORDS) for _ in range(count))
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "neardup.sqlite"), threshold=0.8)
+    index.open()
+    yield index
+    index.close()
+
+
+def test_short_text_has_no_signature():
+    assert NearDuplicateIndex.signature("too short to compare") == b""
+
+
+def test_near_duplicate_is_found(index):
+    original = text(1)
+    index.add("a.xml", "10.1/a", NearDuplicateIndex.signature(original))
+    index.add("b.xml", "10.1/b", NearDuplicateIndex.signature(text(2)))
+    revised = original.replace("cohort", "population", 1)
+    match = index.query(NearDuplicateIndex.signature(revised), "c.xml", "10.1/c")
+    assert match is not None and match.Path == "a.xml" and match.Similarity >= 0.8
+
+
+def test_same_file_and_same_doi_are_not_matches(index):
+    signature = NearDuplicateIndex.signature(text(1))
+    index.add("a.xml", "10.1/a", signature)
+    assert index.query(signature, "a.xml", None) is None
+    assert index.query(signature, "b.xml", "10.1/a") is None
+
+
+def test_remove_articles(index):
+    for number in range(5):
+        path = f"{number}.xml"
+        index.add(path, None, NearDuplicateIndex.signature(text(number)))
+        index.set_article_id(path, 100 + number)
+    index.remove_articles([101, 103])
+    assert len(index) == 3
+    assert index.query(NearDuplicateIndex.signature(text(1)), "x.xml") is None
+    assert index.query(NearDuplicateIndex.signature(text(2)), "x.xml").ArticlesID == 102
+    assert index.conn.execute("SELECT COUNT(*) FROM Buckets").fetchone()[0] == 3 * (128 // index.rows)
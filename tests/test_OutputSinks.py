@@ -0,0 +1,110 @@
+import os
+import json
+from datetime import datetime
+import pytest
+from ArticleModel import ArticleModel
+from ReferenceModel import ReferenceModel
+from OutputSinks import FileSink, ShardWriter, SqliteSink
+
+
+def make_article(doi, pmid=None):
+    return ArticleModel(ArtTitle="t", ArtBody="b", ArtAbstract="a", ArtDoi=doi, Pmid=pmid, ArtFileName=f"{doi}.xml")
+
+
+def stored_rows(folder):
+    rows = []
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), encoding="utf-8") as shard:
+            rows += [json.loads(line) for line in shard]
+    return rows
+
+
+def test_second_run_appends_to_the_same_folder(tmp_path):
+    folder = str(tmp_path / "articles")
+    sink = FileSink(folder, "jsonl", shard_rows=2)
+    sink.open()
+    assert sink.write_batch([make_article(f"10.1/{n}") for n in range(3)]) == [1, 2, 3]
+    sink.close()
+
+    sink = FileSink(folder, "jsonl", shard_rows=2)
+    sink.open()
+    assert sink.load_duplicate_index().contains(doi="10.1/0")
+    assert sink.write_batch([make_article("10.1/1"), make_article("10.1/9")]) == [-1, 4]
+    sink.close()
+
+    assert sorted(os.listdir(folder)) == ["articles-00001.jsonl", "articles-00002.jsonl", "articles-00003.jsonl"]
+    assert [row["ArticlesID"] for row in stored_rows(folder)] == [1, 2, 3, 4]
+
+
+def test_interrupted_part_is_kept_up_to_its_last_line(tmp_path):
+    folder = tmp_path / "chunks"
+    folder.mkdir()
+    (folder / "chunks-00001.jsonl.part").write_text('{"text": "a"}\n{"text": "b"}\n{"te', encoding="utf-8")
+    writer = ShardWriter(str(folder), "chunks", [("text", "string")])
+    assert list(writer.read_existing(["text"])) == [{"text": "a"}, {"text": "b"}]
+    writer.write({"text": "c"})
+    writer.close()
+    assert writer.shards == 1
+    assert sorted(os.listdir(folder)) == ["chunks-00001.jsonl", "chunks-00002.jsonl"]
+
+
+def test_shards_rotate_and_drop_the_part_suffix_when_full(tmp_path):
+    writer = ShardWriter(str(tmp_path), "rows", [("n", "int64")], shard_rows=2)
+    for n in range(3):
+        writer.write({"n": n})
+    # the first shard is complete, the second one is still being written
+    assert sorted(os.listdir(tmp_path)) == ["rows-00001.jsonl", "rows-00002.jsonl.part"]
+    writer.close()
+    assert sorted(os.listdir(tmp_path)) == ["rows-00001.jsonl", "rows-00002.jsonl"]
+    assert writer.shards == 2 and writer.total_rows == 3
+    assert [row["n"] for row in stored_rows(tmp_path)] == [0, 1, 2]
+
+
+def test_unknown_shard_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="csv"):
+        ShardWriter(str(tmp_path), "rows", [("n", "int64")], file_format="csv")
+
+
+def test_file_sink_writes_references_and_dates(tmp_path):
+    folder = str(tmp_path / "out")
+    sink = FileSink(folder, "jsonl")
+    sink.open()
+    article = make_article("10.1/a")
+    article.PubDate = datetime(2020, 5, 17)
+    assert sink.write_batch([article, make_article("10.1/a")]) == [1, -1]
+    sink.write_references([(1, ReferenceModel(Seq=1, RefText="A ref. 2020", RefYear=2020))])
+    sink.close()
+    assert sorted(os.listdir(folder)) == ["articles-00001.jsonl", "references-00001.jsonl"]
+    articles, references = stored_rows(folder)
+    assert articles["PubDate"] == "2020-05-17T00:00:00"
+    assert references == {"ArticlesID": 1, "Seq": 1, "RefText": "A ref. 2020", "Doi": None, "Pmid": None,
+                          "RefYear": 2020, "Source": None, "Title": None}
+
+
+def test_sqlite_sink_follows_the_duplicate_doi_rule(tmp_path):
+    sink = SqliteSink(str(tmp_path / "db" / "articles.sqlite"))
+    sink.open()
+    assert sink.write_batch([make_article("10.1/a", 11), make_article(""), make_article("10.1/a")]) == [1, 2, -1]
+    # an empty DOI is never a duplicate
+    assert sink.write_batch([make_article("")]) == [3]
+    index = sink.load_duplicate_index()
+    assert index.contains(doi="10.1/A") and index.contains(pmid=11) and not index.contains(doi="10.1/b")
+    sink.close()
+
+
+def count_rows(sink, table):
+    return sink.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_sqlite_sink_deletes_articles_with_their_references(tmp_path):
+    sink = SqliteSink(str(tmp_path / "articles.sqlite"), hashes_table="Hashes")
+    sink.open()
+    assert sink.write_batch([make_article("10.1/a"), make_article("10.1/b")]) == [1, 2]
+    sink.write_references([(1, ReferenceModel(Seq=1, RefText="r1")), (2, ReferenceModel(Seq=1, RefText="r2"))])
+    sink.write_field_hashes([(1, {"ArtBody": "h1"}), (2, {"ArtBody": "h2"})])
+    assert sink.load_field_hashes(["10.1/a", "10.1/c"]) == {"10.1/a": (1, {"ArtBody": "h1"})}
+    sink.delete_articles([1])
+    assert [count_rows(sink, table) for table in ("Articles", "ArticleReferences", "Hashes")] == [1, 1, 1]
+    # the DOI of a deleted article can be written again
+    assert sink.write_batch([make_article("10.1/a")]) == [3]
+    sink.close()
@@ -0,0 +1,69 @@
+from ArticleModel import ArticleModel
+from ManifestSrv import ManifestSrv
+from PipelineSrv import IngestPipeline, _read_file
+
+
+def test_budget_keeps_a_prefix_but_hashes_the_whole_file(tmp_path):
+    path = tmp_path / "huge.xml"
+    path.write_bytes(b"<article>" + b"x" * (3 * 1024 * 1024) + b"</article>")
+    data, content_hash, _ = _read_file(str(path), limit=1000)
+    assert len(data) == 1001
+    assert content_hash == ManifestSrv.file_digest(str(path))
+
+
+def test_small_file_is_read_whole(tmp_path):
+    path = tmp_path / "small.xml"
+    path.write_bytes(b"<article/>")
+    data, content_hash, _ = _read_file(str(path), limit=1000)
+    assert data == b"<article/>"
+    assert content_hash == ManifestSrv.file_digest(str(path))
+
+
+def write_articles(folder, count):
+    paths = []
+    for n in range(count):
+        path = folder / f"{n}.xml"
+        title = "Breast cancer in women" if n % 2 == 0 else "Soil bacteria"
+        path.write_bytes((f"<article><front><article-meta><article-id pub-id-type='doi'>10.1/{n}</article-id>"
+                          f"<title-group><article-title>{title}</article-title></title-group>"
+                          f"<abstract><p>{title} were studied.</p></abstract></article-meta></front>"
+                          f"<body><p>{'text ' * (1 + 500 * (n % 3))}</p></body></article>").encode("utf-8"))
+        paths.append(str(path))
+    return paths
+
+
+def test_results_come_back_in_input_order(tmp_path):
+    paths = write_articles(tmp_path, 9)
+    paths.insert(4, str(tmp_path / "missing.xml"))
+    results = list(IngestPipeline(paths, readers=3, read_ahead=2))
+    assert [r.path for r in results] == paths
+    assert [r.index for r in results] == list(range(1, len(paths) + 1))
+    # a read error is reported in its place and does not stop the rest
+    assert isinstance(results[4].error, FileNotFoundError) and results[4].article is None
+    assert all(r.error is None and r.content_hash and "read" in r.timings for r in results if r is not results[4])
+
+
+def test_worker_processes_give_the_same_results(tmp_path):
+    paths = write_articles(tmp_path, 6)
+    inline = list(IngestPipeline(paths))
+    pooled = list(IngestPipeline(paths, workers=2, max_in_flight=2))
+    assert [r.path for r in pooled] == paths
+    assert [type(r.article) for r in pooled] == [type(r.article) for r in inline]
+    assert [r.article.ArtDoi for r in pooled if isinstance(r.article, ArticleModel)] == ["10.1/0", "10.1/2", "10.1/4"]
+    assert all("parse_front" in r.timings for r in pooled)
+
+
+def test_skipped_files_are_not_read(tmp_path):
+    paths = write_articles(tmp_path, 4)
+    pipeline = IngestPipeline(paths, skip_file=lambda path: path.endswith(("1.xml", "2.xml")))
+    assert [r.path for r in pipeline] == [paths[0], paths[3]]
+    assert pipeline.skipped_files == 2
+
+
+def test_queues_are_bounded():
+    pipeline = IngestPipeline([], workers=3, read_ahead=5)
+    assert pipeline.max_in_flight == 12
+    assert pipeline.read_queue.maxsize == 5 and pipeline.result_queue.maxsize == 12
+    assert IngestPipeline([]).max_in_flight == 4
+    assert IngestPipeline([], workers=3, max_in_flight=7).max_in_flight == 7
+    assert pipeline.queue_depths() == {"reading": 0, "read_queue": 0, "parsing": 0, "write_queue": 0}
@@ -0,0 +1,141 @@
+import pytest
+from lxml import etree
+from ArticleVerdict import ArticleVerdict
+from ProcessDataSrv import ProcessDataSrv
+
+BODY = b"""<article><front><article-meta>
+<title-group><article-title>Breast cancer in women</article-title></title-group>
+<abstract><p>Breast cancer patients.</p></abstract>
+</article-meta></front>
+<body>
+<p>Loose paragraph outside any section.</p>
+<sec id="s1"><title>Introduction</title>
+<p>First paragraph of the introduction.</p>
+<sec id="s1a"><title>Background</title>
+<p>Nested paragraph with a formula <inline-formula>x+y</inline-formula> inside it.</p>
+<sec id="s1a1"><p>Deeply nested paragraph.</p></sec>
+</sec>
+<p>Last paragraph of the introduction.</p>
+</sec>
+<sec sec-type="supplementary-material"><p>Supplementary paragraph.</p></sec>
+<sec id="ack1"><p>Acknowledgement paragraph.</p></sec>
+<sec id="s2"><title>Methods</title><p>Methods paragraph with <italic>italic</italic> text.</p>
+<table-wrap><p>Table paragraph.</p></table-wrap></sec>
+</body></article>"""
+
+
+def test_each_body_paragraph_is_taken_once():
+    article = ProcessDataSrv.process_bytes(BODY, "PMC1.xml")
+    # nested sections yield their paragraphs once, in document order; paragraphs outside a
+    # <sec>, excluded sections (supplementary material, acknowledgements) and table contents
+    # are left out, and an excluded inline node goes with its tail, as a removed node did
+    assert article.ArtBody.split("\r\n\r\n") == [
+        "First paragraph of the introduction.",
+        "Nested paragraph with a formula",
+        "Deeply nested paragraph.",
+        "Last paragraph of the introduction.",
+        "Methods paragraph with italic text.",
+    ]
+
+
+def test_body_walk_does_not_modify_the_tree():
+    root = etree.fromstring(BODY)
+    before = etree.tostring(root)
+    texts = []
+    ProcessDataSrv._collect_body_paragraphs(root.find(".//body"), False, texts)
+    assert len(texts) == 5
+    assert etree.tostring(root) == before
+
+
+def test_section_paths_follow_nesting():
+    root = etree.fromstring(BODY)
+    texts, sections = [], []
+    ProcessDataSrv._collect_body_paragraphs(root.find(".//body"), False, texts, sections)
+    assert sections == [("Introduction",), ("Introduction", "Background"), ("Introduction", "Background", ""),
+                        ("Introduction",), ("Methods",)]
+
+
+def test_references_inside_excluded_body_sections_are_kept():
+    data = BODY.replace(b"</body>", b"""<sec sec-type="ref-list"><title>References</title>
+<ref-list><ref id="b9"><mixed-citation>Body ref 9. J Test. 2020.</mixed-citation></ref></ref-list></sec>
+<notes><ref id="n1"><mixed-citation>Notes ref 1. 2019.</mixed-citation></ref></notes></body>
+<back><ref-list><ref id="r1"><mixed-citation>Back ref 1. 2018.</mixed-citation></ref></ref-list></back>""")
+    article = ProcessDataSrv.process_bytes(data, "PMC1.xml")
+    assert [ref.RefText for ref in article.References] == [
+        "Body ref 9. J Test. 2020.", "Notes ref 1. 2019.", "Back ref 1. 2018."]
+    assert "Body ref 9" not in article.ArtBody
+
+
+@pytest.fixture
+def budget():
+    yield
+    ProcessDataSrv.configure({"max_file_bytes": 0, "oversize_mode": "skip", "huge_tree": False})
+
+
+def test_file_over_the_budget_is_skipped(budget):
+    ProcessDataSrv.configure({"max_file_bytes": 200})
+    verdict = ProcessDataSrv.process_bytes(BODY, "PMC1.xml")
+    assert isinstance(verdict, ArticleVerdict) and verdict.Skipped
+    assert verdict.Reason == ArticleVerdict.TOO_LARGE
+
+
+def test_file_over_the_budget_is_truncated(budget):
+    cut = BODY.index(b"Last paragraph")
+    ProcessDataSrv.configure({"max_file_bytes": cut, "oversize_mode": "truncate"})
+    article = ProcessDataSrv.process_bytes(BODY, "PMC1.xml")
+    assert article.Truncated == ArticleVerdict.TOO_LARGE
+    assert article.ArtAbstract == "Breast cancer patients."
+    assert article.ArtBody.split("\r\n\r\n")[-1] == "Deeply nested paragraph."
+
+
+def test_nesting_over_the_parser_limit_marks_the_article(budget):
+    deep = b"<b>" * 300 + b"deep" + b"</b>" * 300
+    data = BODY.replace(b"<p>Last paragraph", b"<p>" + deep + b"</p><p>Last paragraph")
+    article = ProcessDataSrv.process_bytes(data, "PMC1.xml")
+    assert article.Truncated == ArticleVerdict.PARSER_LIMIT
+    ProcessDataSrv.configure({"huge_tree": True})
+    assert ProcessDataSrv.process_bytes(data, "PMC1.xml").Truncated == ""
+
+
+def test_metadata_is_scoped_to_front_inside_an_articleset():
+    data = BODY.replace(b"<article-meta>", b"<journal-meta><journal-title>J Front</journal-title></journal-meta>"
+                                           b"<article-meta>")
+    data = data.replace(b"</body>", b"</body><back><ref-list><ref><element-citation><source>J Ref</source>"
+                                    b"<volume>9</volume></element-citation></ref></ref-list></back>")
+    wrapped = b"<pmc-articleset>" + data + b"</pmc-articleset>"
+    for document in (data, wrapped):
+        article = ProcessDataSrv.process_bytes(document, "PMC1.xml")
+        assert article.JournalTitle == "J Front"
+        # the reference list is not searched for front matter
+        assert article.ArtVolume == ""
+
+
+class CountingReader:
+    def __init__(self, data):
+        self.data = data
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        chunk = self.data[self.read_bytes:self.read_bytes + size] if size >= 0 else self.data[self.read_bytes:]
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+def test_non_target_is_rejected_from_the_front_alone():
+    data = BODY.replace(b"Breast cancer", b"Soil bacteria").replace(
+        b"</body>", b"<sec><p>" + b"long body text " * 200000 + b"</p></sec></body>")
+    source, timings = CountingReader(data), {}
+    verdict = ProcessDataSrv._process_source(source, "PMC1.xml", timings)
+    assert isinstance(verdict, ArticleVerdict) and verdict.NonTarget
+    # the parse stopped at </front>: the body was neither read nor built
+    assert source.read_bytes < len(data) // 10
+    assert "parse_front" in timings and "parse_rest" not in timings
+
+
+def test_target_article_finishes_the_parse():
+    data = BODY.replace(b"</body>", b"<sec><p>" + b"long body text " * 200000 + b"</p></sec></body>")
+    source, timings = CountingReader(data), {}
+    article = ProcessDataSrv._process_source(source, "PMC1.xml", timings)
+    assert not isinstance(article, ArticleVerdict) and article.ArtBody.endswith("long body text")
+    assert source.read_bytes == len(data)
+    assert "parse_front" in timings and "parse_rest" in timings
@@ -0,0 +1,96 @@
+from decimal import Decimal
+from ArticleModel import ArticleModel
+from SqlServerSrv import SqlServerSrv
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_single_insert_returns_int_id():
+    db = SqlServerSrv()
+    db.conn = FakeConnection([(Decimal(42),)])
+    new_id = db.insert_with_stored_procedure("InsertData", ArticleModel())
+    assert new_id == 42 and type(new_id) is int
+
+
+def test_batch_insert_returns_int_ids():
+    db = SqlServerSrv()
+    db.conn = FakeConnection([(0, Decimal(7), None), (1, Decimal(-1), None), (2, None, "boom")])
+    results = db.insert_batch_with_stored_procedure("InsertData", [ArticleModel(), ArticleModel(), ArticleModel()])
+    assert results[:2] == [7, -1] and all(type(result) is int for result in results[:2])
+    assert isinstance(results[2], RuntimeError)
+
+
+class RecordingCursor(FakeCursor):
+    def __init__(self, rows, fail=False):
+        super().__init__(rows)
+        self.fail = fail
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        if self.fail and len(self.statements) == 1:
+            raise RuntimeError("Transaction is doomed")
+
+
+class RecordingConnection(FakeConnection):
+    def __init__(self, rows, fail=False):
+        super().__init__(rows)
+        self.cursors = []
+        self.fail = fail
+        self.rollbacks = 0
+
+    def cursor(self):
+        cursor = RecordingCursor(self.rows, self.fail and not self.cursors)
+        self.cursors.append(cursor)
+        return cursor
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_batch_rolls_each_failed_article_back_to_its_savepoint():
+    db = SqlServerSrv()
+    db.conn = RecordingConnection([(0, 1, None), (1, 2, None)])
+    db.insert_batch_with_stored_procedure("InsertData", [ArticleModel(), ArticleModel()])
+    sql = db.conn.cursors[0].statements[0]
+    for seq in (0, 1):
+        assert sql.index(f"SAVE TRANSACTION s{seq};") < sql.index(f"ROLLBACK TRANSACTION s{seq};")
+    # an uncommittable transaction aborts the batch instead of committing partial writes
+    assert "IF XACT_STATE() <> 1 THROW;" in sql
+
+
+def test_aborted_batch_is_retried_one_by_one():
+    db = SqlServerSrv()
+    db.conn = RecordingConnection([(Decimal(5),)], fail=True)
+    results = db.insert_batch_with_stored_procedure("InsertData", [ArticleModel(), ArticleModel()])
+    assert db.conn.rollbacks == 1
+    assert results == [5, 5] and len(db.conn.cursors) == 3
@@ -0,0 +1,176 @@
+from TextCleaner import TextCleaner
+
+# (text, unstructured clean(extra_whitespace=True, dashes=True, bullets=False), clean_extra_whitespace)
+UNSTRUCTURED = [
+    ('', '', ''),
+    ('   ', '', ''),
+    (
+        'Plain sentence without anything special.',
+        'Plain sentence without anything special.',
+        'Plain sentence without anything special.',
+    ),
+    (
+        'Tumour–stroma cross-talk in  ductal\xa0carcinoma\nin situ.',
+        'Tumour stroma cross talk in ductal carcinoma in situ.',
+        'Tumour–stroma cross-talk in ductal carcinoma in situ.',
+    ),
+    (
+        'Cells were counted (Fig. 2). Expression rose in all groups over the study period and stayed high.',
+        'Cells were counted (Fig. 2). Expression rose in all groups over the study period and stayed high.',
+        'Cells were counted (Fig. 2). Expression rose in all groups over the study period and stayed high.',
+    ),
+    (
+        'See Table 1. Results in Tbl 3 are long enough to be kept because this sentence '
+        'has more than sixty-five characters.',
+        'See Table 1. Results in Tbl 3 are long enough to be kept because this sentence '
+        'has more than sixty five characters.',
+        'See Table 1. Results in Tbl 3 are long enough to be kept because this sentence '
+        'has more than sixty-five characters.',
+    ),
+    (
+        'Prior work [ 1 , 2 ] and [3 - 5] and ( 7 9 ) and (Smith et al. , 2010).',
+        'Prior work [ 1 , 2 ] and [3 5] and ( 7 9 ) and (Smith et al. , 2010).',
+        'Prior work [ 1 , 2 ] and [3 - 5] and ( 7 9 ) and (Smith et al. , 2010).',
+    ),
+    (
+        'Control\x00chars\x07 are\x1f dropped\tbut\ttabs collapse.',
+        'Control\x00chars\x07 are\x1f dropped\tbut\ttabs collapse.',
+        'Control\x00chars\x07 are\x1f dropped\tbut\ttabs collapse.',
+    ),
+    (
+        'Line one\nKeywords: breast, cancer',
+        'Line one Keywords: breast, cancer',
+        'Line one Keywords: breast, cancer',
+    ),
+    (
+        'Summary text\r\n Key words : tumour',
+        'Summary text\r Key words : tumour',
+        'Summary text\r Key words : tumour',
+    ),
+    (
+        'Trailing spaces and dashes - - at the end -',
+        'Trailing spaces and dashes at the end',
+        'Trailing spaces and dashes - - at the end -',
+    ),
+    (
+        'Unicode \u3000 ideographic space and \u2028 line separator.',
+        'Unicode \u3000 ideographic space and \u2028 line separator.',
+        'Unicode \u3000 ideographic space and \u2028 line separator.',
+    ),
+    (
+        'Numbers 1 - 2 – 3 and ranges [10 12] stay readable!',
+        'Numbers 1 2 3 and ranges [10 12] stay readable!',
+        'Numbers 1 - 2 – 3 and ranges [10 12] stay readable!',
+    ),
+    (
+        'Question? Answer. Exclamation! Fig 4 shows it.',
+        'Question? Answer. Exclamation! Fig 4 shows it.',
+        'Question? Answer. Exclamation! Fig 4 shows it.',
+    ),
+    (
+        '(no spaces) [nospace] ( spaced ) [ also , spaced ]',
+        '(no spaces) [nospace] ( spaced ) [ also , spaced ]',
+        '(no spaces) [nospace] ( spaced ) [ also , spaced ]',
+    ),
+    ('\t- bullet like -\t', 'bullet like', '- bullet like -'),
+    ('a  \n\n  b', 'a b', 'a b'),
+    ('Mixed: [1,2, 3] (a & b) [x.y]', 'Mixed: [1,2, 3] (a & b) [x.y]', 'Mixed: [1,2, 3] (a & b) [x.y]'),
+]
+
+# (paragraph, body cleaning of the original ProcessDataSrv: clean, figure filter, sanitize,
+# tab/space collapse, citation normalization)
+BODY = [
+    ('', ''),
+    ('   ', ''),
+    ('Plain sentence without anything special.', 'Plain sentence without anything special.'),
+    (
+        'Tumour–stroma cross-talk in  ductal\xa0carcinoma\nin situ.',
+        'Tumour stroma cross talk in ductal carcinoma in situ.',
+    ),
+    (
+        'Cells were counted (Fig. 2). Expression rose in all groups over the study period and stayed high.',
+        'Cells were counted (Fig. 2). Expression rose in all groups over the study period and stayed high.',
+    ),
+    (
+        'See Table 1. Results in Tbl 3 are long enough to be kept because this sentence '
+        'has more than sixty-five characters.',
+        'Results in Tbl 3 are long enough to be kept because this sentence has more than sixty five characters.',
+    ),
+    (
+        'Prior work [ 1 , 2 ] and [3 - 5] and ( 7 9 ) and (Smith et al. , 2010).',
+        'Prior work [1,2] and [3-5] and (7-9) and (Smith et al.,2010).',
+    ),
+    ('Control\x00chars\x07 are\x1f dropped\tbut\ttabs collapse.', 'Controlchars are dropped but tabs collapse.'),
+    ('Line one\nKeywords: breast, cancer', 'Line one Keywords: breast, cancer'),
+    ('Summary text\r\n Key words : tumour', 'Summary text\r Key words : tumour'),
+    ('Trailing spaces and dashes - - at the end -', 'Trailing spaces and dashes at the end'),
+    (
+        'Unicode \u3000 ideographic space and \u2028 line separator.',
+        'Unicode \u3000 ideographic space and \u2028 line separator.',
+    ),
+    ('Numbers 1 - 2 – 3 and ranges [10 12] stay readable!', 'Numbers 1 2 3 and ranges [10-12] stay readable!'),
+    ('Question? Answer. Exclamation! Fig 4 shows it.', 'Question? Answer. Exclamation!'),
+    ('(no spaces) [nospace] ( spaced ) [ also , spaced ]', '(no spaces) [nospace] (spaced) [also,spaced]'),
+    ('\t- bullet like -\t', 'bullet like'),
+    ('a  \n\n  b', 'a b'),
+    ('Mixed: [1,2, 3] (a & b) [x.y]', 'Mixed: [1,2,3] (a & b) [x.y]'),
+]
+
+# (paragraph, abstract cleaning of the original ProcessDataSrv: as BODY, but cut at a
+# "Keywords:" line instead of normalizing citations)
+ABSTRACT = [
+    ('', ''),
+    ('   ', ''),
+    ('Plain sentence without anything special.', 'Plain sentence without anything special.'),
+    (
+        'Tumour–stroma cross-talk in  ductal\xa0carcinoma\nin situ.',
+        'Tumour stroma cross talk in ductal carcinoma in situ.',
+    ),
+    (
+        'Cells were counted (Fig. 2). Expression rose in all groups over the study period and stayed high.',
+        'Cells were counted (Fig. 2). Expression rose in all groups over the study period and stayed high.',
+    ),
+    (
+        'See Table 1. Results in Tbl 3 are long enough to be kept because this sentence '
+        'has more than sixty-five characters.',
+        'Results in Tbl 3 are long enough to be kept because this sentence has more than sixty five characters.',
+    ),
+    (
+        'Prior work [ 1 , 2 ] and [3 - 5] and ( 7 9 ) and (Smith et al. , 2010).',
+        'Prior work [ 1 , 2 ] and [3 5] and ( 7 9 ) and (Smith et al. , 2010).',
+    ),
+    ('Control\x00chars\x07 are\x1f dropped\tbut\ttabs collapse.', 'Controlchars are dropped but tabs collapse.'),
+    ('Line one\nKeywords: breast, cancer', 'Line one Keywords: breast, cancer'),
+    ('Summary text\r\n Key words : tumour', 'Summary text\r Key words : tumour'),
+    ('Trailing spaces and dashes - - at the end -', 'Trailing spaces and dashes at the end'),
+    (
+        'Unicode \u3000 ideographic space and \u2028 line separator.',
+        'Unicode \u3000 ideographic space and \u2028 line separator.',
+    ),
+    ('Numbers 1 - 2 – 3 and ranges [10 12] stay readable!', 'Numbers 1 2 3 and ranges [10 12] stay readable!'),
+    ('Question? Answer. Exclamation! Fig 4 shows it.', 'Question? Answer. Exclamation!'),
+    ('(no spaces) [nospace] ( spaced ) [ also , spaced ]', '(no spaces) [nospace] ( spaced ) [ also , spaced ]'),
+    ('\t- bullet like -\t', 'bullet like'),
+    ('a  \n\n  b', 'a b'),
+    ('Mixed: [1,2, 3] (a & b) [x.y]', 'Mixed: [1,2, 3] (a & b) [x.y]'),
+]
+
+
+def test_clean_matches_unstructured():
+    for text, cleaned, extra_whitespace in UNSTRUCTURED:
+        assert TextCleaner.clean(text, extra_whitespace=True, dashes=True) == cleaned
+        assert TextCleaner.clean_extra_whitespace(text) == extra_whitespace
+
+
+def test_body_paragraphs_match_the_original_cleaning():
+    for text, expected in BODY:
+        assert TextCleaner.clean_paragraph(text, references=True) == expected
+    assert TextCleaner.clean_paragraphs([text for text, _ in BODY], references=True) == \
+        [expected for _, expected in BODY if expected]
+
+
+def test_abstract_paragraphs_match_the_original_cleaning():
+    for text, expected in ABSTRACT:
+        assert TextCleaner.clean_paragraph(text, keywords=True) == expected
+    assert TextCleaner.clean_paragraphs([text for text, _ in ABSTRACT], keywords=True) == \
+        [expected for _, expected in ABSTRACT if expected]